@@ -2,3 +2,5 @@ CREATE DATABASE default_db;
 
 CREATE USER ai;
 GRANT pg_read_all_data TO ai;
+
+CREATE EXTENSION IF NOT EXISTS pg_stat_statements;
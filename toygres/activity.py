@@ -0,0 +1,284 @@
+import re
+import time
+from contextlib import closing
+
+import psycopg2
+import questionary
+from rich import box
+from rich.console import Console, Group
+from rich.live import Live
+from rich.markup import escape
+from rich.table import Table
+from rich.tree import Tree
+
+from . import db
+from .constants import (
+    LOCK_MONITOR_MAX_ACTIONS,
+    LOCK_MONITOR_REFRESH_SECONDS,
+    RESET,
+    YELLOW,
+)
+from .utils import one_line
+
+console = Console()
+
+# Read from the internal database, so the monitor itself never keeps the
+# database being dropped or cloned busy
+MONITOR_DBNAME = "postgres"
+
+_ACTIVITY_SQL = """
+    SELECT a.pid, a.datname, a.usename, a.application_name, a.state,
+           a.wait_event_type, a.wait_event,
+           EXTRACT(EPOCH FROM now() - a.xact_start),
+           EXTRACT(EPOCH FROM now() - a.state_change),
+           pg_blocking_pids(a.pid), a.query,
+           (SELECT l.mode || ' on ' || l.locktype
+                   || coalesce(' ' || l.relation::text, '')
+            FROM pg_locks l WHERE l.pid = a.pid AND NOT l.granted LIMIT 1),
+           (SELECT l.relation FROM pg_locks l
+            WHERE l.pid = a.pid AND NOT l.granted LIMIT 1)
+    FROM pg_stat_activity a
+    WHERE a.backend_type = 'client backend'
+      AND a.pid <> pg_backend_pid()
+      AND (%(dbname)s IS NULL OR a.datname = %(dbname)s
+           OR a.pid IN (SELECT unnest(pg_blocking_pids(b.pid))
+                        FROM pg_stat_activity b WHERE b.datname = %(dbname)s))
+    ORDER BY a.xact_start NULLS LAST
+"""
+
+_FIELDS = (
+    "pid", "datname", "user", "application", "state", "wait_type", "wait_event",
+    "xact_age", "state_age", "blocked_by", "query", "waiting_for", "relation",
+)  # fmt: skip
+
+LOCK_ERRORS = (psycopg2.errors.LockNotAvailable, psycopg2.errors.ObjectInUse)
+
+
+def _own_pids() -> set[int]:
+    """Backends of toygres' own connections, which shouldn't be killed from here."""
+    pids = set()
+    for connection in (db.conn, db.read_only_conn, db.observer_conn):
+        try:
+            if connection is not None and not connection.closed:
+                pids.add(connection.get_backend_pid())
+        except psycopg2.Error:
+            pass
+    return pids
+
+
+def _relation_names(oids: set[int], dbname: str | None) -> dict[int, str]:
+    """Name locked relations; their oids only mean something inside their
+    own database, which is where the main connection usually is."""
+    if not oids or dbname != db.DBNAME:
+        return {}
+    try:
+        cur = db.conn.cursor()
+        cur.execute(
+            "SELECT oid, oid::regclass::text FROM pg_class WHERE oid = ANY(%s)",
+            (list(oids),),
+        )
+        return dict(cur.fetchall())
+    except psycopg2.Error:
+        return {}
+
+
+def fetch_sessions(cur, dbname: str | None) -> list[dict]:
+    """Client sessions on `dbname` (all databases if None), plus whoever blocks them."""
+    cur.execute(_ACTIVITY_SQL, {"dbname": dbname})
+    sessions = [dict(zip(_FIELDS, row)) for row in cur.fetchall()]
+    names = _relation_names({s["relation"] for s in sessions if s["relation"]}, dbname)
+    own = _own_pids()
+    for s in sessions:
+        if s["relation"] in names:
+            s["waiting_for"] = s["waiting_for"].replace(
+                str(s["relation"]), names[s["relation"]]
+            )
+        s["own"] = s["pid"] in own
+    return sessions
+
+
+def blockers(sessions: list[dict]) -> list[dict]:
+    """Sessions holding up others, head of the chains first."""
+    blocking = {pid for s in sessions for pid in s["blocked_by"]}
+    heads = [s for s in sessions if s["pid"] in blocking and not s["blocked_by"]]
+    rest = [s for s in sessions if s["pid"] in blocking and s["blocked_by"]]
+    return heads + rest
+
+
+def _age(seconds) -> str:
+    if seconds is None:
+        return "-"
+    seconds = float(seconds)
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    if seconds < 3600:
+        return f"{seconds // 60:.0f}m{seconds % 60:02.0f}s"
+    return f"{seconds // 3600:.0f}h{seconds % 3600 // 60:02.0f}m"
+
+
+def describe(s: dict, width: int = 60) -> str:
+    """Short one line summary used in chains and action menus."""
+    who = s["application"] or s["user"]
+    text = f"{s['pid']} {who} ({s['state'] or '?'}"
+    if s["xact_age"] is not None:
+        text += f", xact {_age(s['xact_age'])}"
+    return text + f"): {one_line(s['query'], width)}"
+
+
+def render(sessions: list[dict], dbname: str | None) -> Group:
+    table = Table(
+        box=box.ROUNDED,
+        title=f"Sessions on {dbname or 'all databases'}",
+        header_style="bold #ECE7D1",
+    )
+    for column in ("pid", "application", "state", "wait", "xact age", "in state"):
+        table.add_column(column, no_wrap=True)
+    table.add_column("query", no_wrap=True)
+    width = max(20, min(80, console.width - 90))
+    blocking = {pid for s in sessions for pid in s["blocked_by"]}
+    for s in sessions:
+        # Waiting for the client to send something is what idle means
+        if s["wait_type"] and s["wait_type"] != "Client":
+            wait = f"{s['wait_type']}:{s['wait_event']}"
+        else:
+            wait = ""
+        if s["own"]:
+            style = "dim"
+        elif s["pid"] in blocking:
+            style = "bold red"
+        elif s["blocked_by"]:
+            style = "yellow"
+        else:
+            style = None
+        table.add_row(
+            str(s["pid"]) + (" (toygres)" if s["own"] else ""),
+            one_line(s["application"] or s["user"] or "", 20),
+            s["state"] or "",
+            wait,
+            _age(s["xact_age"]),
+            _age(s["state_age"]),
+            one_line(s["query"], width),
+            style=style,
+        )
+
+    parts = [table]
+    heads = [s for s in blockers(sessions) if not s["blocked_by"]]
+    if heads:
+        tree = Tree("[bold]Blocking chains[/bold]")
+
+        def add(parent, s: dict, seen: set) -> None:
+            label = f"[bold red]{escape(describe(s))}[/bold red]"
+            if s["blocked_by"]:
+                label = f"[yellow]{escape(describe(s))}[/yellow]"
+                if s["waiting_for"]:
+                    label += f"\n[dim]waits for {escape(s['waiting_for'])}[/dim]"
+            branch = parent.add(label)
+            for other in sessions:
+                if s["pid"] in other["blocked_by"] and other["pid"] not in seen:
+                    add(branch, other, seen | {other["pid"]})
+
+        for head in heads:
+            add(tree, head, {head["pid"]})
+        parts.append(tree)
+    elif not sessions:
+        parts.append("[green]No other sessions.[/green]")
+
+    parts.append(
+        f"[dim]Refreshing every {LOCK_MONITOR_REFRESH_SECONDS}s, "
+        "Ctrl+C to cancel or terminate sessions[/dim]"
+    )
+    return Group(*parts)
+
+
+def _choose_action(sessions: list[dict]) -> tuple[str, list[int]] | None:
+    """One-key menu of cancel/terminate actions, blockers listed first.
+
+    Returns ("resume"|"done"|function name, pids) or None when closed.
+    """
+    killable = [s for s in sessions if not s["own"]]
+    heads = [s for s in blockers(killable) if not s["blocked_by"]]
+    ordered = heads + [s for s in killable if s not in heads]
+    choices = []
+    if heads:
+        choices.append(
+            questionary.Choice(
+                f"Terminate all {len(heads)} blocking session(s)",
+                value=("pg_terminate_backend", [s["pid"] for s in heads]),
+            )
+        )
+    for s in ordered[:LOCK_MONITOR_MAX_ACTIONS]:
+        label = describe(s, 40)
+        choices.append(
+            questionary.Choice(
+                f"Cancel query   {label}", value=("pg_cancel_backend", [s["pid"]])
+            )
+        )
+        choices.append(
+            questionary.Choice(
+                f"Terminate      {label}", value=("pg_terminate_backend", [s["pid"]])
+            )
+        )
+    choices.append(questionary.Choice("Resume monitoring", value=("resume", [])))
+    choices.append(questionary.Choice("Done", value=("done", [])))
+    # Shortcut keys only go up to 36 entries
+    return questionary.select(
+        "Lock monitor:", choices=choices, use_shortcuts=len(choices) <= 36
+    ).ask()
+
+
+def monitor(dbname: str | None) -> None:
+    """Live view of sessions, their waits and blocking chains on `dbname`."""
+    with closing(db.open_connection(MONITOR_DBNAME)) as monitor_conn:
+        cur = monitor_conn.cursor()
+        while True:
+            sessions = []
+            try:
+                with Live(console=console, auto_refresh=False) as live:
+                    while True:
+                        sessions = fetch_sessions(cur, dbname)
+                        live.update(render(sessions, dbname), refresh=True)
+                        time.sleep(LOCK_MONITOR_REFRESH_SECONDS)
+            except KeyboardInterrupt:
+                pass
+
+            action = _choose_action(sessions)
+            if action is None or action[0] == "done":
+                return
+            function, pids = action
+            if function == "resume":
+                continue
+            for pid in pids:
+                # The function name comes from our own fixed choices
+                cur.execute(f"SELECT {function}(%s)", (pid,))
+                ok = cur.fetchone()[0]
+                verb = "Cancelled" if function == "pg_cancel_backend" else "Terminated"
+                print(f"{YELLOW}{verb if ok else 'Could not signal'} {pid}.{RESET}")
+
+
+def _blocked_dbname(error: Exception, default: str) -> str:
+    """The database named in "database "x" is being accessed by other users"."""
+    match = re.search(r'database "([^"]+)"', str(error))
+    return match.group(1) if match else default
+
+
+def run_with_lock_monitor(action, dbname: str):
+    """Run `action()`; when it fails on a lock wait or a database in use,
+    open the monitor on the blocked database and offer to retry."""
+    while True:
+        try:
+            return action()
+        except LOCK_ERRORS as e:
+            blocked = _blocked_dbname(e, dbname)
+            print(f"{YELLOW}{str(e).strip()}{RESET}")
+            print(f"{YELLOW}Opening the lock monitor for '{blocked}'...{RESET}")
+            monitor(blocked)
+            if not questionary.confirm("Retry?").ask():
+                raise
+
+
+def run_locks_command(command: str) -> None:
+    """Handle ``\\locks [all]``."""
+    parts = command.rstrip(";").split()
+    if len(parts) > 1 and parts[1].lower() != "all":
+        raise ValueError("Usage: \\locks [all]")
+    monitor(None if len(parts) > 1 else db.DBNAME)
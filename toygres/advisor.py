@@ -0,0 +1,368 @@
+import re
+import statistics
+import time
+from contextlib import closing
+from dataclasses import dataclass, field
+
+from psycopg2 import sql
+from rich import box
+from rich.console import Console
+from rich.markup import escape
+from rich.table import Table
+
+from . import db
+from .constants import (
+    ADVISOR_MAX_QUERIES,
+    ADVISOR_MIN_GAIN,
+    ADVISOR_TIMING_RUNS,
+)
+from .script import split_statements
+from .utils import human_bytes
+
+console = Console()
+
+_WORKLOAD_PREFIXES = ("select", "with", "update", "delete")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_CLAUSE = re.compile(
+    r"\b(where|on|order\s+by|group\s+by|having|limit|offset|set|from|join"
+    r"|select|returning|union|except|intersect|window|for)\b",
+    re.I,
+)
+_NOT_ALIAS = {
+    "where", "join", "on", "inner", "left", "right", "full", "cross", "group",
+    "order", "limit", "set", "using", "natural", "lateral", "having", "union",
+    "offset", "fetch", "for", "window", "returning", "except", "intersect",
+}  # fmt: skip
+_TABLE_REF = re.compile(
+    r"\b(?:from|join|update)\s+(?:only\s+)?"
+    r'(?:"?\w+"?\.)?"?(\w+)"?(?:\s+(?:as\s+)?(\w+))?',
+    re.I,
+)
+_COLUMN = r'(?:(\w+)\.)?"?([A-Za-z_]\w*)"?'
+_EQUALITY = re.compile(_COLUMN + r"\s*(?:=|\bin\b|\bis\s+null\b)", re.I)
+_EQUALITY_RIGHT = re.compile(r"(?<![<>!])=\s*" + _COLUMN, re.I)
+_RANGE = re.compile(
+    _COLUMN + r"\s*(?:<=|>=|<(?!>)|>|\bbetween\b|\blike\b|\bilike\b)", re.I
+)
+_ORDER_ITEM = re.compile(r"^\s*" + _COLUMN + r"(?:\s+(?:asc|desc))?\s*$", re.I)
+
+
+@dataclass
+class Candidate:
+    """A possible index and the workload queries it could help."""
+
+    table: str
+    columns: tuple[str, ...]
+    queries: set[int] = field(default_factory=set)
+    cost_before: float = 0.0
+    cost_after: float = 0.0
+    ms_before: float = 0.0
+    ms_after: float = 0.0
+    size: int = 0
+    # Why the candidate couldn't be evaluated, if it couldn't
+    skipped: str = ""
+
+    @property
+    def name(self) -> str:
+        return f"toygres_advise_{self.table}_{'_'.join(self.columns)}"[:63]
+
+    @property
+    def ddl(self) -> str:
+        return f"CREATE INDEX ON {self.table} ({', '.join(self.columns)})"
+
+    @property
+    def gain(self) -> float:
+        """Fraction of the helped queries' planner cost the index saves."""
+        return 1 - self.cost_after / self.cost_before if self.cost_before else 0.0
+
+    @property
+    def score(self) -> float:
+        """Milliseconds saved per workload run, per MB of index."""
+        return max(0.0, self.ms_before - self.ms_after) / max(self.size / 2**20, 0.01)
+
+
+def collect_workload(*sources) -> list[str]:
+    """Distinct SELECT/UPDATE/DELETE statements from the given query lists."""
+    seen = {}
+    for source in sources:
+        for entry in source:
+            if entry.lstrip().startswith("\\"):
+                continue
+            for stmt in split_statements(entry):
+                first = stmt.split(None, 1)[0].lower().lstrip("(")
+                if first in _WORKLOAD_PREFIXES:
+                    seen.setdefault(" ".join(stmt.split()), stmt)
+    return list(seen.values())[-ADVISOR_MAX_QUERIES:]
+
+
+def _catalog(cur) -> tuple[dict[str, set[str]], dict[str, list[tuple[str, ...]]]]:
+    """Columns of every public table that a plain btree index can be built
+    on, and the column lists of its indexes.
+
+    json, xml, point and the like have no default btree operator class, so
+    filtering on them never makes a candidate.
+    """
+    cur.execute("""
+        SELECT c.relname, a.attname
+        FROM pg_attribute a
+        JOIN pg_class c ON c.oid = a.attrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_type t ON t.oid = a.atttypid
+        WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+          AND a.attnum > 0 AND NOT a.attisdropped
+          AND EXISTS (
+              SELECT 1 FROM pg_opclass o
+              JOIN pg_am m ON m.oid = o.opcmethod
+              WHERE m.amname = 'btree' AND o.opcdefault
+                AND (o.opcintype IN (t.oid, t.typbasetype)
+                     OR (t.typcategory = 'A' AND o.opcintype = 'anyarray'::regtype)
+                     OR (t.typtype = 'e' AND o.opcintype = 'anyenum'::regtype)
+                     OR EXISTS (SELECT 1 FROM pg_cast pc
+                                WHERE pc.castsource = t.oid
+                                  AND pc.casttarget = o.opcintype
+                                  AND pc.castmethod = 'b'))
+          )
+        """)
+    columns: dict[str, set[str]] = {}
+    for table, column in cur.fetchall():
+        columns.setdefault(table, set()).add(column)
+
+    cur.execute("""
+        SELECT c.relname, ARRAY(
+            SELECT a.attname
+            FROM unnest(i.indkey) WITH ORDINALITY k(attnum, ord)
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+            ORDER BY k.ord
+        )
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public'
+        """)
+    indexes: dict[str, list[tuple[str, ...]]] = {}
+    for table, cols in cur.fetchall():
+        indexes.setdefault(table, []).append(tuple(cols))
+    return columns, indexes
+
+
+def _clauses(query: str) -> dict[str, str]:
+    """Text of the WHERE/ON and ORDER BY clauses, concatenated per kind."""
+    parts = _CLAUSE.split(query)
+    found = {"where": "", "order": ""}
+    for keyword, text in zip(parts[1::2], parts[2::2]):
+        keyword = keyword.lower().split()[0]
+        if keyword in ("where", "on", "having"):
+            found["where"] += f" {text}"
+        elif keyword == "order":
+            found["order"] += f",{text}"
+    return found
+
+
+def candidate_columns(
+    query: str, columns: dict[str, set[str]]
+) -> dict[str, tuple[list[str], list[str], list[str]]]:
+    """Equality, range and ORDER BY columns per table referenced by `query`."""
+    text = _COMMENT.sub(" ", _STRING.sub("?", query))
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(text):
+        if table in columns:
+            aliases[table] = table
+            if alias and alias.lower() not in _NOT_ALIAS:
+                aliases[alias] = table
+
+    def resolve(qualifier: str, column: str) -> str | None:
+        if qualifier:
+            table = aliases.get(qualifier)
+            return table if table and column in columns[table] else None
+        owners = {t for t in aliases.values() if column in columns[t]}
+        return owners.pop() if len(owners) == 1 else None
+
+    found: dict[str, tuple[list[str], list[str], list[str]]] = {}
+
+    def add(kind: int, qualifier: str, column: str) -> None:
+        table = resolve(qualifier, column)
+        if table:
+            bucket = found.setdefault(table, ([], [], []))[kind]
+            if column not in bucket:
+                bucket.append(column)
+
+    clauses = _clauses(text)
+    for pattern in (_EQUALITY, _EQUALITY_RIGHT):
+        for qualifier, column in pattern.findall(clauses["where"]):
+            add(0, qualifier, column)
+    for qualifier, column in _RANGE.findall(clauses["where"]):
+        add(1, qualifier, column)
+    for item in clauses["order"].split(","):
+        match = _ORDER_ITEM.match(item)
+        if match:
+            add(2, *match.groups())
+    return found
+
+
+def _covered(cols: tuple[str, ...], existing: list[tuple[str, ...]]) -> bool:
+    return any(index[: len(cols)] == cols for index in existing)
+
+
+def build_candidates(
+    workload: list[str], columns: dict, indexes: dict
+) -> list[Candidate]:
+    """Single column indexes, plus per query composites of its equality
+    columns followed by one range or sort column, minus existing indexes."""
+    candidates: dict[tuple, Candidate] = {}
+    for i, query in enumerate(workload):
+        for table, (equal, ranged, order) in candidate_columns(query, columns).items():
+            options = [(c,) for c in equal + ranged + order]
+            tail = (ranged + order)[:1]
+            composite = tuple(dict.fromkeys(equal[:3] + tail))
+            if len(composite) > 1:
+                options.append(composite)
+            for cols in options:
+                if _covered(cols, indexes.get(table, [])):
+                    continue
+                candidate = candidates.setdefault((table, cols), Candidate(table, cols))
+                candidate.queries.add(i)
+    return list(candidates.values())
+
+
+def _measure(query: str, connection) -> tuple[float, float]:
+    """Planner cost and median execution time (rolled back) of `query`."""
+    cost = db.explain_read_only(query, connection)["Plan"]["Total Cost"]
+    timings = [
+        db.explain_analyze(query, connection)["Execution Time"]
+        for _ in range(ADVISOR_TIMING_RUNS)
+    ]
+    return cost, statistics.median(timings)
+
+
+def evaluate(workload: list[str], candidates: list[Candidate], connection, status):
+    """Create each candidate in the scratch database, re-measure the queries
+    it could help, then drop it again. A candidate that fails is skipped
+    with the reason in `skipped`."""
+    cur = connection.cursor()
+    before = {}
+    for i in sorted({i for c in candidates for i in c.queries}):
+        status.update(f"Measuring workload query {i + 1}/{len(workload)}...")
+        try:
+            before[i] = _measure(workload[i], connection)
+        except Exception:
+            # e.g. parameter placeholders, or tables dropped since
+            connection.rollback()
+
+    for n, candidate in enumerate(candidates, start=1):
+        candidate.queries &= before.keys()
+        if not candidate.queries:
+            continue
+        status.update(f"Trying index {n}/{len(candidates)}: {candidate.ddl}")
+        try:
+            cur.execute(
+                sql.SQL("CREATE INDEX {} ON {} ({})").format(
+                    sql.Identifier(candidate.name),
+                    sql.Identifier(candidate.table),
+                    sql.SQL(", ").join(map(sql.Identifier, candidate.columns)),
+                )
+            )
+            cur.execute(
+                "SELECT pg_relation_size(%s::regclass)", (f'"{candidate.name}"',)
+            )
+            size = cur.fetchone()[0]
+            measured = [
+                (before[i], _measure(workload[i], connection))
+                for i in candidate.queries
+            ]
+        except Exception as e:
+            # One candidate failing must not cost the measurements of the others
+            connection.rollback()
+            candidate.skipped = str(e).strip().splitlines()[0]
+            continue
+        finally:
+            cur.execute(
+                sql.SQL("DROP INDEX IF EXISTS {}").format(
+                    sql.Identifier(candidate.name)
+                )
+            )
+        candidate.size = size
+        for (cost_before, ms_before), (cost, ms) in measured:
+            candidate.cost_before += cost_before
+            candidate.ms_before += ms_before
+            candidate.cost_after += cost
+            candidate.ms_after += ms
+
+
+def print_advice(candidates: list[Candidate], workload_size: int) -> None:
+    for c in candidates:
+        if c.skipped:
+            console.print(f"[dim]Skipped {escape(c.ddl)}: {escape(c.skipped)}[/dim]")
+    useful = [c for c in candidates if c.gain >= ADVISOR_MIN_GAIN]
+    if not useful:
+        console.print(
+            f"[yellow]No candidate index improves the {workload_size} "
+            f"workload queries by {ADVISOR_MIN_GAIN:.0%} or more.[/yellow]"
+        )
+        return
+    useful.sort(key=lambda c: (c.score, c.gain), reverse=True)
+
+    table = Table(box=box.ROUNDED, title="Index advice", header_style="bold #ECE7D1")
+    table.add_column("#", justify="right", no_wrap=True)
+    table.add_column("index")
+    table.add_column("queries", justify="right", no_wrap=True)
+    table.add_column("cost", justify="right", no_wrap=True)
+    table.add_column("time", justify="right", no_wrap=True)
+    table.add_column("size", justify="right", no_wrap=True)
+    for rank, c in enumerate(useful, start=1):
+        table.add_row(
+            str(rank),
+            c.ddl,
+            str(len(c.queries)),
+            f"{c.cost_before:,.0f} → {c.cost_after:,.0f} (-{c.gain:.0%})",
+            f"{c.ms_before:,.1f} → {c.ms_after:,.1f}ms",
+            human_bytes(c.size),
+            style="bold green" if rank == 1 else None,
+        )
+    table.caption = (
+        f"{workload_size} workload queries, ranked by time saved per MB of index"
+    )
+    console.print(table)
+
+
+def advise(workload: list[str]) -> None:
+    """Evaluate index candidates for `workload` in a scratch clone of the DB."""
+    if not workload:
+        console.print("[yellow]No SELECT/UPDATE/DELETE statements to analyse.[/yellow]")
+        return
+
+    with closing(db.open_connection(db.DBNAME)) as connection:
+        columns, indexes = _catalog(connection.cursor())
+    candidates = build_candidates(workload, columns, indexes)
+    if not candidates:
+        console.print(
+            "[yellow]No unindexed filter, join or sort columns found "
+            "in the workload.[/yellow]"
+        )
+        return
+
+    source = db.DBNAME
+    scratch = f"toygres_advise_{int(time.time())}"
+    with console.status(f"Cloning {source} into a scratch database...") as status:
+        db.clone_database(source, scratch)
+        try:
+            with closing(db.open_connection(scratch)) as connection:
+                evaluate(workload, candidates, connection, status)
+        finally:
+            db.drop_database(scratch)
+    print_advice(candidates, len(workload))
+
+
+def run_advise_command(command: str, session_queries, history_queries) -> None:
+    """Handle ``\\advise [history]``.
+
+    The workload is the queries run in this session; with ``history`` the
+    saved prompt history (.toygres_history) is added too.
+    """
+    parts = command.rstrip(";").split()
+    if len(parts) > 1 and parts[1].lower() != "history":
+        raise ValueError("Usage: \\advise [history]")
+    sources = [session_queries]
+    if len(parts) > 1:
+        sources.insert(0, history_queries)
+    advise(collect_workload(*sources))
@@ -4,15 +4,40 @@ from toygres.constants import (
     MATRIX_GREEN,
     MAX_TOOL_RESULT_LENGTH,
     TRUNCATED_TOOL_RESULT_MESSAGE,
+    DEFAULT_AI_MAX_QUERY_COST,
+    DEFAULT_AI_MAX_QUERY_ROWS,
+    EXPLAINABLE_PREFIXES,
+    DEFAULT_HISTORY_TOKEN_BUDGET,
+    SUMMARY_TOKEN_BUDGET,
+    MAX_HISTORY_QUERY_LENGTH,
+    DEFAULT_SCHEMA_TOP_K,
+    DEFAULT_SCHEMA_TOKEN_BUDGET,
+    MAX_LISTED_TABLES,
+    MAX_TOOL_ROUNDS,
+    ROUTE_MAX_QUESTION_LENGTH,
+    ROUTE_MAX_SCHEMA_TABLES,
+    ROUTE_MAX_TABLES,
+    VALIDATABLE_PREFIXES,
+    SQL_STATEMENT_KEYWORDS,
 )
-from rapidfuzz.fuzz import ratio as fuzz_ratio
 from openai import OpenAI
+import hashlib
 import json
 import os
+import re
+import time
 import dotenv
-from toygres.costs import session_costs
+import psycopg2
+from pydantic import ValidationError
+from toygres.costs import TokenCosts, session_costs
 from . import db
+from . import ledger
+from .ledger import BudgetExceededError
 from .models import AiResponse, OutputData
+from .profiler import tracer
+from .schema_index import SchemaIndex, get_schema_index
+from .script import split_statements
+from .utils import estimate_tokens
 
 SYSTEM_PROMPT = """
 ## SYSTEM PROMPT
@@ -56,16 +81,24 @@ If you want the user to execute a query, you must output it with type being ```s
 
 ### If user asks about user info
 If user asks like which user/role am i in, understand that you have access to 'ai' role only, and give them the sql command for themselves to run.
+
+---
+
+### Database context
+
+Public tables: {tables}
+
+{schemas}
 """
-# Score threshold for a table name to be considered "referenced" in the conversation
-_FUZZY_THRESHOLD = 70
+# History entries written by record_query, e.g. "Ran the query #1a2b3c4d: SELECT ..."
+_QUERY_MESSAGE = re.compile(r"^Ran the query (#[0-9a-f]{8})")
 
 
 tools = [
     {
         "type": "function",
         "name": "execute_read_only_sql",
-        "description": "Execute a read only SQL query. Should try to return focused and small data, output that will be easy for you to analyse.",
+        "description": "Execute a read only SQL query. Should try to return focused and small data, output that will be easy for you to analyse. Queries the planner estimates as too expensive are rejected without running.",
         "parameters": {
             "type": "object",
             "properties": {
@@ -95,10 +128,98 @@ tools = [
 ]
 
 
-def _execute_read_only_sql(sql: str) -> str:
+def _query_limits() -> tuple[float, float]:
+    """Return the (max total cost, max estimated rows) allowed for AI queries."""
+    try:
+        max_cost = float(os.getenv("AI_MAX_QUERY_COST", DEFAULT_AI_MAX_QUERY_COST))
+        max_rows = float(os.getenv("AI_MAX_QUERY_ROWS", DEFAULT_AI_MAX_QUERY_ROWS))
+    except ValueError:
+        max_cost, max_rows = DEFAULT_AI_MAX_QUERY_COST, DEFAULT_AI_MAX_QUERY_ROWS
+    return max_cost, max_rows
+
+
+# EXPLAIN with its options, either parenthesized or the legacy keywords
+_EXPLAIN_PREFIX = re.compile(
+    r"^\s*explain\s*(?:\((?P<options>[^)]*)\)\s*)?"
+    r"(?P<legacy>(?:(?:analy[sz]e|verbose)\s+)*)",
+    re.IGNORECASE,
+)
+
+
+def _executed_statement(sql: str) -> str | None:
+    """The statement `sql` actually runs: the inner statement of an EXPLAIN
+    ANALYZE, None for a plain EXPLAIN, which only plans."""
+    match = _EXPLAIN_PREFIX.match(sql)
+    if not match:
+        return sql
+    options = [o.strip().lower() for o in (match["options"] or "").split(",")]
+    analyze = "analy" in match["legacy"].lower() or any(
+        o.split()[0] in ("analyze", "analyse")
+        and (len(o.split()) == 1 or o.split()[1] in ("true", "on", "1"))
+        for o in options
+        if o
+    )
+    return sql[match.end() :] if analyze else None
+
+
+def _check_query_cost(sql: str, connection=None) -> str | None:
+    """EXPLAIN a query before running it.
+
+    Returns None if the plan is within the configured limits, otherwise a
+    JSON tool result telling the model why the query was rejected. Syntax and
+    planning errors surface here too, without executing anything. For
+    EXPLAIN ANALYZE, the statement it executes is checked.
+
+    Several statements are rejected outright: sent together, the ones after
+    the first would run while the first is being explained.
+    """
+    statements = split_statements(sql)
+    if len(statements) > 1:
+        return json.dumps(
+            {
+                "error": "more than one statement, not executed",
+                "statements": len(statements),
+                "hint": "send one statement per call",
+            }
+        )
+    sql = _executed_statement(statements[0]) if statements else None
+    words = (sql or "").strip().lower().split()
+    if not words or words[0].lstrip("(") not in EXPLAINABLE_PREFIXES:
+        return None
+
+    plan = db.explain_read_only(sql, connection)["Plan"]
+    total_cost = plan["Total Cost"]
+    estimated_rows = plan["Plan Rows"]
+    max_cost, max_rows = _query_limits()
+
+    if total_cost <= max_cost and estimated_rows <= max_rows:
+        return None
+
+    return json.dumps(
+        {
+            "error": "query too expensive, not executed",
+            "total_cost": total_cost,
+            "max_cost": max_cost,
+            "estimated_rows": estimated_rows,
+            "max_rows": max_rows,
+            "top_plan_node": plan["Node Type"],
+            "hint": "add selective WHERE filters, aggregate, or add a LIMIT and retry",
+        }
+    )
+
+
+def _execute_read_only_sql(sql: str, connection=None) -> str:
     """Run a read-only SQL query and return the result as a plain string."""
     try:
-        _, rows, status = db.executeSQLReadOnly(sql)
+        rejection = _check_query_cost(sql, connection)
+        if rejection:
+            return rejection
+
+        # Exactly the one statement that was checked
+        statements = split_statements(sql)
+        if not statements:
+            return "(no statement to run)"
+        _, rows, status = db.executeSQLReadOnly(statements[0], connection)
         if rows:
             return "\n".join(str(row) for row in rows)
         return status or "(no rows returned)"
@@ -115,19 +236,53 @@ def _execute_meta_commands(command: str) -> str:
         return f"Error: {e}"
 
 
+def _invalid_sql_reason(sql: str, connection=None) -> str | None:
+    """Return why suggested SQL is invalid according to EXPLAIN, or None.
+
+    Only statements EXPLAIN accepts are checked, and failing on the ai
+    role's missing write privileges does not count as invalid. Several
+    statements are refused before anything is sent, EXPLAIN would only
+    cover the first and run the rest.
+    """
+    statements = split_statements(sql)
+    if not statements:
+        return "suggested empty SQL"
+    if len(statements) > 1:
+        return f"suggested {len(statements)} statements, suggest one at a time"
+    sql = statements[0]
+    words = sql.strip().lower().split()
+    first_word = words[0].lstrip("(").rstrip(";")
+    if first_word not in SQL_STATEMENT_KEYWORDS:
+        return f"suggested invalid SQL (unknown statement {first_word!r})"
+    if first_word not in VALIDATABLE_PREFIXES:
+        return None
+    try:
+        db.explain_read_only(sql, connection)
+    except psycopg2.Error as e:
+        if e.pgcode and e.pgcode.startswith("42") and e.pgcode != "42501":
+            return f"suggested invalid SQL ({str(e).splitlines()[0]})"
+    return None
+
+
 _TOOL_DISPATCH: dict[str, callable] = {
-    "execute_read_only_sql": lambda args: _execute_read_only_sql(args["sql"]),
-    "execute_meta_commands": lambda args: _execute_meta_commands(args["command"]),
+    "execute_read_only_sql": lambda args, conn: _execute_read_only_sql(
+        args["sql"], conn
+    ),
+    # psql subprocess, always logs in as the ai role
+    "execute_meta_commands": lambda args, conn: _execute_meta_commands(args["command"]),
 }
 
 
-def _dispatch_tool(name: str, arguments_json: str) -> str:
-    """Parse tool arguments and call the matching local function."""
+def _dispatch_tool(name: str, arguments_json: str, connection=None) -> str:
+    """Parse tool arguments and call the matching local function.
+
+    `connection` is the read only connection to use, db.read_only_conn if None.
+    """
     args = json.loads(arguments_json)
     handler = _TOOL_DISPATCH.get(name)
     if handler is None:
         return f"Unknown tool: {name}"
-    return handler(args)
+    return handler(args, connection)
 
 
 class ChatSession:
@@ -135,39 +290,129 @@ class ChatSession:
         self,
         system_prompt: str = SYSTEM_PROMPT,
         model: str | None = None,
+        fast_model: str | None = None,
         api_key: str | None = None,
         history_length: int = 5,
+        history_token_budget: int | None = None,
+        read_only_conn=None,
+        verbose: bool = True,
+        feature: str = "chat",
     ):
         self.client = OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
         self.model = model or os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
+        # Cheap model tried first for simple questions, routing is off if unset
+        self.fast_model = fast_model or os.getenv("OPENAI_FAST_MODEL")
         self.history_length = history_length
+        self.history_token_budget = history_token_budget or int(
+            os.getenv("AI_HISTORY_TOKEN_BUDGET", DEFAULT_HISTORY_TOKEN_BUDGET)
+        )
         self.messages = [AiMessage(role="system", content=system_prompt, id=0)]
+        # One line per turn that fell out of the token budget, oldest first
+        self.summary: list[str] = []
+        # Full text of every executed query, keyed by the hash used in history
+        self.queries: dict[str, str] = {}
+        # Tables injected into the last system prompt by refresh_system_prompt
+        self.referenced_tables: list[str] = []
+        self.schema_index: SchemaIndex | None = None
+        # Own read only connection (e.g. batch workers), db.read_only_conn if None
+        self.read_only_conn = read_only_conn
+        # Print tool calls as they happen; batch workers run quietly
+        self.verbose = verbose
+        # Tokens spent by this session alone, session_costs holds the grand total
+        self.costs = TokenCosts()
+        # Label for the calls in the persistent ledger
+        self.feature = feature
 
     def ask(self, user_text: str) -> AiResponse:
-        """Send a message, run the tool-call loop, and return a structured AiResponse."""
+        """Send a message, run the tool-call loop, and return a structured AiResponse.
+
+        With a fast model configured, simple questions are tried on it first
+        and escalated to the main model only if the answer fails validation.
+        Over the ledger budget the question is refused, or downgraded to the
+        fast model when TOYGRES_BUDGET_ACTION=downgrade.
+        """
+        over_budget = ledger.budget_exceeded()
+        if over_budget and (ledger.budget_action() == "refuse" or not self.fast_model):
+            raise BudgetExceededError(over_budget)
+
         self._add_message_to_history(AiMessage(role="user", content=user_text))
         self.refresh_system_prompt()
 
+        if over_budget:
+            # Downgrade: answer on the fast model only, never escalate
+            self._log(f"{MATRIX_GREEN}{over_budget}, using {self.fast_model}{RESET}")
+            model = self.fast_model
+        else:
+            model = self._route(user_text)
+        ai_response, problem = self._complete(model)
+        if problem and model != self.model and not over_budget:
+            self._log(
+                f"{MATRIX_GREEN}↑ {model} {problem}, escalating to {self.model}{RESET}"
+            )
+            ai_response, problem = self._complete(self.model)
+        if ai_response is None:
+            raise RuntimeError(f"AI did not produce an answer: {problem}")
+
+        self._add_message_to_history(
+            message=AiMessage(role="assistant", content=ai_response.content)
+        )
+        return ai_response
+
+    def _route(self, user_text: str) -> str:
+        """Pick the model for a question using cheap local heuristics."""
+        if not self.fast_model or self.fast_model == self.model:
+            return self.model
+        if len(user_text) > ROUTE_MAX_QUESTION_LENGTH:
+            return self.model
+        if len(self.schema_index.tables) > ROUTE_MAX_SCHEMA_TABLES:
+            return self.model
+        terms = self.schema_index.query_terms([(user_text, 1.0)])
+        if len(self.schema_index.mentioned_tables(terms)) > ROUTE_MAX_TABLES:
+            return self.model
+        return self.fast_model
+
+    def _complete(self, model: str) -> tuple[AiResponse | None, str | None]:
+        """Run the tool-call loop on `model` for the current history.
+
+        Returns the parsed response and None, or the (possibly missing)
+        response and the reason it failed validation.
+        """
         input_messages: list = [
             {"role": m.role, "content": m.content} for m in self.messages
         ]
 
-        while True:
-            resp = self.client.responses.create(
-                model=self.model,
-                input=input_messages,
-                text={
-                    "format": {
-                        "type": "json_schema",
-                        "name": "AiResponse",
-                        "schema": AiResponse.model_json_schema(),
-                        "strict": True,
-                    }
-                },
-                tools=tools,
-                max_tool_calls=5,
+        for round_number in range(MAX_TOOL_ROUNDS):
+            started = time.perf_counter()
+            with tracer.span(f"ai.openai[{model}]"):
+                resp = self.client.responses.create(
+                    model=model,
+                    input=input_messages,
+                    text={
+                        "format": {
+                            "type": "json_schema",
+                            "name": "AiResponse",
+                            "schema": AiResponse.model_json_schema(),
+                            "strict": True,
+                        }
+                    },
+                    tools=tools,
+                    max_tool_calls=5,
+                )
+            latency = time.perf_counter() - started
+            for costs in (session_costs, self.costs):
+                costs.add_tokens(
+                    resp.usage.input_tokens,
+                    resp.usage.output_tokens,
+                    model=model,
+                    latency=latency,
+                )
+            ledger.record_usage(
+                self.feature if round_number == 0 else f"{self.feature}.tool_round",
+                model,
+                db.DBNAME,
+                resp.usage,
+                latency,
             )
-            session_costs.add_tokens(resp.usage.input_tokens, resp.usage.output_tokens)
 
             tool_calls = [item for item in resp.output if item.type == "function_call"]
 
@@ -179,15 +424,16 @@ class ChatSession:
             # So we will forget it once this task is done. (Can change later, but doesn't seem useful right now)
             input_messages.extend(resp.output)
 
-            print(f"{MATRIX_GREEN}┌{'-' * 78}┐{RESET}")
+            self._log(f"{MATRIX_GREEN}┌{'-' * 78}┐{RESET}")
             for tc in tool_calls:
-                print(
+                self._log(
                     f"{MATRIX_GREEN}│ \033[1m⚙️  [tool] \033[0m{MATRIX_GREEN}{tc.name}({tc.arguments}){RESET}"
                 )
-                result = _dispatch_tool(tc.name, tc.arguments)
+                with tracer.span(f"ai.tool.{tc.name}"):
+                    result = _dispatch_tool(tc.name, tc.arguments, self.read_only_conn)
                 if len(result) > MAX_TOOL_RESULT_LENGTH:
                     result = TRUNCATED_TOOL_RESULT_MESSAGE
-                print(
+                self._log(
                     f"{MATRIX_GREEN}│ \033[1m✅ [tool result] \033[0m{MATRIX_GREEN}{result[:200]}{RESET}"
                 )
                 input_messages.append(
@@ -197,118 +443,174 @@ class ChatSession:
                         "output": result,
                     }
                 )
-            print(f"{MATRIX_GREEN}└{'-' * 78}┘{RESET}")
-
-        ai_response = AiResponse.model_validate_json(resp.output_text)
-        self._add_message_to_history(
-            message=AiMessage(role="assistant", content=ai_response.content)
-        )
-        return ai_response
+            self._log(f"{MATRIX_GREEN}└{'-' * 78}┘{RESET}")
+        else:
+            return None, "ran out of tool rounds"
+
+        try:
+            ai_response = AiResponse.model_validate_json(resp.output_text)
+        except ValidationError:
+            return None, "returned a malformed response"
+
+        if ai_response.type == "sql":
+            with tracer.span("ai.validate_sql"):
+                problem = _invalid_sql_reason(ai_response.content, self.read_only_conn)
+            if problem:
+                return ai_response, problem
+        return ai_response, None
+
+    def _log(self, line: str) -> None:
+        if self.verbose:
+            print(line)
+
+    def clear_history(self) -> None:
+        """Forget the conversation, keeping only the system prompt."""
+        del self.messages[1:]
+        self.summary.clear()
+        self.queries.clear()
 
     # ------------------------------------------------------------------
     # System prompt refresh
     # ------------------------------------------------------------------
 
-    def _history_text(self) -> str:
-        """Return all non-system message content concatenated for fuzzy matching."""
-        return " ".join(
-            msg.content
-            for msg in self.messages[1:]  # skip system prompt
-        ).lower()
+    def _retrieval_texts(self) -> list[tuple[str, float]]:
+        """Return conversation text weighted for schema retrieval.
 
-    def _referenced_tables(self, table_names: list[str]) -> list[str]:
-        """Return tables whose names fuzzy-match text in the conversation history.
-
-        For a table name like ``user_metadata`` (1 underscore → 2 parts) we
-        slide a 2-word window over the history and score each chunk with
-        fuzz.ratio, which avoids the token-set logic smearing scores across
-        individual words.
+        The newest message matters most, older turns and the rolling summary
+        only nudge the ranking.
         """
-        history = self._history_text()
-        if not history.strip():
+        conversation = [msg.content for msg in self.messages[1:]]  # skip system prompt
+        if not conversation:
             return []
-
-        history_words = history.split()
-        matched = []
-
-        for t in table_names:
-            parts = t.split("_")
-            window_size = len(parts)  # e.g. "user_metadata" → 2
-            t_normalised = t.replace("_", " ")
-
-            best_score = 0
-            for i in range(max(1, len(history_words) - window_size + 1)):
-                chunk = " ".join(history_words[i : i + window_size])
-                score = fuzz_ratio(t_normalised, chunk)
-                if score > best_score:
-                    best_score = score
-
-            if best_score >= _FUZZY_THRESHOLD:
-                matched.append(t)
-
-        return matched
-
-    def _fetch_schema(self, table_name: str) -> str:
-        """Fetch column names and types for a single table."""
-        _, rows, _ = db.executeSQL(
-            "SELECT column_name, data_type "
-            "FROM information_schema.columns "
-            f"WHERE table_schema = 'public' AND table_name = '{table_name}' "
-            "ORDER BY ordinal_position;"
-        )
-        if not rows:
-            return ""
-        cols = ", ".join(f"{row[0]} ({row[1]})" for row in rows)
-        return f"  {table_name}: {cols}"
+        texts = [(conversation[-1], 1.0)]
+        texts += [(content, 0.5) for content in conversation[:-1]]
+        texts += [(line, 0.25) for line in self.summary]
+        return texts
 
     def refresh_system_prompt(self) -> None:
         """
         Rebuild the system prompt with:
-        - the current list of all public tables
-        - schemas of tables that appear in the conversation history (via fuzzy match)
+        - the list of public tables (or just their count on very large schemas)
+        - the tables and columns most relevant to the conversation, ranked by
+          the schema index and capped at AI_SCHEMA_TOP_K / AI_SCHEMA_TOKEN_BUDGET
         """
-        _, rows, _ = db.executeSQL(
-            "SELECT tablename FROM pg_tables WHERE schemaname = 'public';"
-        )
-        table_names = [row[0] for row in rows] if rows else []
-        tables_str = ", ".join(table_names) if table_names else "(none)"
-
-        # Fuzzy match the table names with the conversation history, to find which table's schema can be included in the prompt.
-        referenced = self._referenced_tables(table_names)
-        if referenced:
-            schema_lines = ["\nSchemas of referenced tables:"]
-            for t in referenced:
-                schema = self._fetch_schema(t)
-                if schema:
-                    schema_lines.append(schema)
+        with tracer.span("ai.schema_index"):
+            if self.read_only_conn is None:
+                index = get_schema_index()
+            else:
+                index = get_schema_index(
+                    lambda q: db.executeSQLReadOnly(q, self.read_only_conn)
+                )
+        self.schema_index = index
+        table_names = list(index.tables)
+        if not table_names:
+            tables_str = "(none)"
+        elif len(table_names) <= MAX_LISTED_TABLES:
+            tables_str = ", ".join(table_names)
+        else:
+            tables_str = (
+                f"{len(table_names)} tables, too many to list. Only the most "
+                "relevant ones are described below, use meta commands to find others."
+            )
+
+        top_k = int(os.getenv("AI_SCHEMA_TOP_K", DEFAULT_SCHEMA_TOP_K))
+        budget = int(os.getenv("AI_SCHEMA_TOKEN_BUDGET", DEFAULT_SCHEMA_TOKEN_BUDGET))
+        terms = index.query_terms(self._retrieval_texts())
+        relevant = index.render(terms, top_k, budget) if terms else []
+        self.referenced_tables = [name for name, _ in relevant]
+        if relevant:
+            schema_lines = ["Schemas of relevant tables:"]
+            schema_lines += [line for _, line in relevant]
             schemas_str = "\n".join(schema_lines)
         else:
             schemas_str = ""
 
-        self.messages[0].content = SYSTEM_PROMPT.format(
-            tables=tables_str,
-            schemas=schemas_str,
+        self.messages[0].content = (
+            SYSTEM_PROMPT.format(
+                tables=tables_str,
+                schemas=schemas_str,
+            )
+            + self._summary_text()
         )
 
+    # ------------------------------------------------------------------
+    # Conversation memory
+    # ------------------------------------------------------------------
+
+    def _summary_text(self) -> str:
+        """Render the rolling summary of compacted turns for the system prompt."""
+        if not self.summary:
+            return ""
+        return "\n### Summary of earlier conversation\n" + "\n".join(self.summary)
+
+    def _compact(self, message: AiMessage) -> None:
+        """Fold a message that no longer fits the budget into the rolling summary."""
+        query_ref = _QUERY_MESSAGE.match(message.content)
+        if query_ref:
+            # The query text itself stays retrievable through self.queries
+            line = f"- {message.role}: ran query {query_ref.group(1)}"
+        else:
+            content = " ".join(message.content.split())
+            if len(content) > 160:
+                content = content[:157] + "..."
+            line = f"- {message.role}: {content}"
+        self.summary.append(line)
+
+        while (
+            len(self.summary) > 1
+            and estimate_tokens("\n".join(self.summary)) > SUMMARY_TOKEN_BUDGET
+        ):
+            self.summary.pop(0)
+
     def _trim_history_if_needed(self) -> None:
-        messages = self.messages
-        max_length = self.history_length
-        """Trim conversation history to max_length turns, always keeping messages[0] (system prompt)."""
-        conversation = messages[1:]  # everything except the system prompt
-        if len(conversation) > max_length:
-            messages[1:] = conversation[
-                -max_length:
-            ]  # in-place — mutates the real list
+        """Compact the oldest turns until history fits the token budget.
 
-    def _add_message_to_history(self, message: AiMessage):
-        self._trim_history_if_needed()
+        messages[0] (system prompt) and the newest message are always kept.
+        """
+        conversation = self.messages[1:]
+        tokens = sum(estimate_tokens(m.content) for m in conversation)
+        while len(conversation) > 1 and (
+            len(conversation) > self.history_length
+            or tokens > self.history_token_budget
+        ):
+            oldest = conversation.pop(0)
+            tokens -= estimate_tokens(oldest.content)
+            self._compact(oldest)
+        self.messages[1:] = conversation  # in-place — mutates the real list
 
+    def _add_message_to_history(self, message: AiMessage):
         # Get and append next id
         next_id = self.messages[-1].id + 1
         message.id = next_id
 
         # append
         self.messages.append(message)
+        self._trim_history_if_needed()
+
+    def record_query(self, query: str) -> str:
+        """Log a user-executed query into history, deduplicated by content hash.
+
+        Re-running a query moves it to the end of the history instead of
+        storing it twice, and long queries are only kept as an excerpt; the
+        full text stays in ``self.queries``. Returns the hash reference.
+        """
+        ref = "#" + hashlib.sha1(query.encode()).hexdigest()[:8]
+        self.queries[ref] = query
+
+        prefix = f"Ran the query {ref}"
+        self.messages[1:] = [
+            m for m in self.messages[1:] if not m.content.startswith(prefix)
+        ]
+
+        if len(query) > MAX_HISTORY_QUERY_LENGTH:
+            half = MAX_HISTORY_QUERY_LENGTH // 2
+            excerpt = f"{query[:half]} ... ({len(query)} chars) ... {query[-half:]}"
+        else:
+            excerpt = query
+        self._add_message_to_history(
+            AiMessage(role="user", content=f"{prefix}: {excerpt}")
+        )
+        return ref
 
 
 def run(session: ChatSession, question: str) -> OutputData:
@@ -32,6 +32,26 @@ def print_shortcuts(is_baseline=False):
     table.add_row("Esc + Enter", "Submit query / command")
     table.add_row("?? <question>", "Ask AI a question")
     table.add_row("\\<cmd>", "Execute psql meta-commands")
+    table.add_row("\\timing", "Toggle per-action timing breakdown")
+    table.add_row(
+        "\\export <file> <query>", "Stream a query to .csv/.tsv/.jsonl/.parquet"
+    )
+    table.add_row("\\seed <file|dir>", "Bulk load CSV/JSONL seed files with COPY")
+    table.add_row("\\synth <rows> [hints.json]", "Fill every table with generated rows")
+    table.add_row(
+        "\\i <file.sql> [batch]", "Run a SQL script with per-statement timing"
+    )
+    table.add_row("\\plan <query>", "EXPLAIN ANALYZE tree with hot nodes flagged")
+    table.add_row(
+        "\\plandiff [-n runs] <query|file.sql>",
+        "Compare plans and timings with the baseline",
+    )
+    table.add_row("\\advise [history]", "Suggest indexes for the queries run so far")
+    table.add_row("\\locks [all]", "Live sessions, lock waits and blocking chains")
+    table.add_row("\\find <value>", "Search every table for a value")
+    table.add_row("\\diff [table ...]", "Schema and data changes since the baseline")
+    table.add_row("\\compact", "Toggle server-side cutting of wide values")
+    table.add_row("\\full <row> <column>", "Full value from the last compacted result")
     table.add_row("menu", "Return to database selection")
 
     if is_baseline:
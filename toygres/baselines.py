@@ -0,0 +1,11 @@
+import questionary
+
+from . import db
+
+
+def pick_baseline(dbname: str) -> str | None:
+    """The ``_baseline_for_`` sibling of `dbname`, asking when there are several."""
+    baselines = [d for d in db.get_databases() if d.endswith(f"_baseline_for_{dbname}")]
+    if len(baselines) > 1:
+        return questionary.select("Compare against:", choices=baselines).ask()
+    return baselines[0] if baselines else None
@@ -0,0 +1,182 @@
+import json
+import queue
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from openai import APIConnectionError, InternalServerError, RateLimitError
+from rich.console import Console
+from rich.progress import Progress
+
+from . import db
+from .ai import ChatSession
+from .constants import (
+    BATCH_BACKOFF_BASE_SECONDS,
+    BATCH_BACKOFF_MAX_SECONDS,
+    BATCH_MAX_ATTEMPTS,
+)
+
+console = Console()
+
+# Transient API failures worth retrying; anything else is recorded as an error
+_RETRYABLE = (RateLimitError, APIConnectionError, InternalServerError)
+
+
+class RateLimitGate:
+    """Backoff shared by all workers.
+
+    When any worker is rate limited, every worker pauses until the cooldown
+    has passed, instead of each one hammering the API on its own schedule
+    and turning one 429 into a storm of them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+
+    def wait(self) -> None:
+        while True:
+            with self._lock:
+                delay = self._resume_at - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def penalize(self, attempt: int, error: Exception) -> None:
+        """Push the shared cooldown out after a failed attempt."""
+        delay = _retry_after(error)
+        if delay is None:
+            delay = min(
+                BATCH_BACKOFF_MAX_SECONDS, BATCH_BACKOFF_BASE_SECONDS * 2**attempt
+            )
+            # Full jitter, so paused workers don't all resume on the same tick
+            delay = random.uniform(delay / 2, delay)
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+
+
+def _retry_after(error: Exception) -> float | None:
+    """Return the server-suggested retry delay in seconds, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def read_questions(path: str) -> list[str]:
+    """One question per line; blank lines and # comments are skipped."""
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("??"):
+                line = line[2:].strip()
+            if line and not line.startswith("#"):
+                questions.append(line)
+    return questions
+
+
+def _answer(
+    sessions: queue.Queue, gate: RateLimitGate, index: int, question: str
+) -> dict:
+    """Answer one question on a pooled session, retrying transient API errors."""
+    session = sessions.get()
+    try:
+        session.clear_history()
+        start_in = session.costs.input_tokens
+        start_out = session.costs.output_tokens
+        started = time.perf_counter()
+        record = {"index": index, "question": question}
+
+        for attempt in range(BATCH_MAX_ATTEMPTS):
+            gate.wait()
+            try:
+                response = session.ask(question)
+                record.update(type=response.type, content=response.content)
+                break
+            except _RETRYABLE as e:
+                # Also a 429, but no amount of waiting tops the account up
+                out_of_quota = getattr(e, "code", None) == "insufficient_quota"
+                if out_of_quota or attempt == BATCH_MAX_ATTEMPTS - 1:
+                    record["error"] = str(e)
+                    break
+                gate.penalize(attempt, e)
+                session.clear_history()
+            except Exception as e:
+                record["error"] = str(e)
+                break
+
+        record.update(
+            attempts=attempt + 1,
+            input_tokens=session.costs.input_tokens - start_in,
+            output_tokens=session.costs.output_tokens - start_out,
+            latency_s=round(time.perf_counter() - started, 3),
+        )
+        return record
+    finally:
+        sessions.put(session)
+
+
+def run_batch(questions_path: str, output_path: str, workers: int = 4) -> None:
+    """Answer every question in `questions_path` concurrently, writing JSONL results.
+
+    Each worker is a ChatSession with its own read only connection to the
+    currently connected database. Records are written as they complete and
+    carry the question's index in the input file.
+    """
+    questions = read_questions(questions_path)
+    if not questions:
+        console.print(f"[yellow]No questions found in {questions_path}.[/yellow]")
+        return
+
+    workers = max(1, min(workers, len(questions)))
+    connections = [
+        db.open_connection(db.DBNAME, read_only=True) for _ in range(workers)
+    ]
+    sessions = queue.Queue()
+    for conn in connections:
+        session = ChatSession(read_only_conn=conn, verbose=False, feature="batch")
+        # Retries are coordinated by the gate, not per client
+        session.client = session.client.with_options(max_retries=0)
+        sessions.put(session)
+
+    gate = RateLimitGate()
+    records = []
+    try:
+        with (
+            open(output_path, "w", encoding="utf-8") as out,
+            Progress(console=console) as progress,
+            ThreadPoolExecutor(max_workers=workers) as pool,
+        ):
+            task = progress.add_task(
+                f"Answering {len(questions)} questions", total=len(questions)
+            )
+            futures = [
+                pool.submit(_answer, sessions, gate, i, q)
+                for i, q in enumerate(questions)
+            ]
+            for future in as_completed(futures):
+                record = future.result()
+                records.append(record)
+                out.write(json.dumps(record, default=str) + "\n")
+                out.flush()
+                progress.advance(task)
+    finally:
+        for conn in connections:
+            conn.close()
+
+    failed = sum(1 for r in records if "error" in r)
+    latencies = sorted(r["latency_s"] for r in records)
+    console.print(
+        f"[green]✓[/green] {len(records) - failed}/{len(records)} answered, "
+        f"{failed} failed, median latency {statistics.median(latencies):.2f}s, "
+        f"{sum(r['input_tokens'] for r in records)} input / "
+        f"{sum(r['output_tokens'] for r in records)} output tokens. "
+        f"Results written to {output_path}"
+    )
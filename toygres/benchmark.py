@@ -0,0 +1,115 @@
+import time
+from contextlib import closing
+
+import psycopg2
+from rich import box
+from rich.console import Console
+from rich.table import Table
+
+from . import db
+from .constants import BENCH_COMMITS, BENCH_ROWS
+
+console = Console()
+
+# The foreign key is added afterwards: in an ephemeral database accounts is
+# already unlogged when events is created, still logged
+_SCHEMA = """
+CREATE TABLE accounts (id serial PRIMARY KEY, name text NOT NULL);
+CREATE TABLE events (
+    id bigserial PRIMARY KEY,
+    account_id int NOT NULL,
+    payload text NOT NULL,
+    created_at timestamptz NOT NULL DEFAULT now()
+);
+ALTER TABLE events ADD FOREIGN KEY (account_id) REFERENCES accounts;
+CREATE INDEX ON events (account_id);
+INSERT INTO accounts (name) SELECT 'account ' || g FROM generate_series(1, 100) g;
+"""
+
+
+def _timed(fn) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def _connect(dbname: str):
+    bench_conn = psycopg2.connect(
+        host=db.HOST, user=db.USER, port=db.PORT, dbname=dbname
+    )
+    bench_conn.autocommit = True
+    return bench_conn
+
+
+def _measure(dbname: str, ephemeral: bool) -> dict[str, float]:
+    clone = f"{dbname}_clone"
+    db.create_database(dbname, ephemeral=ephemeral)
+    try:
+        with closing(_connect(dbname)) as bench_conn, bench_conn.cursor() as cur:
+            cur.execute(_SCHEMA)
+
+            def small_commits():
+                for i in range(BENCH_COMMITS):
+                    cur.execute(
+                        "INSERT INTO events (account_id, payload) VALUES (%s, 'x')",
+                        (i % 100 + 1,),
+                    )
+
+            def bulk_insert():
+                cur.execute(
+                    "INSERT INTO events (account_id, payload) "
+                    "SELECT g %% 100 + 1, md5(g::text) FROM generate_series(1, %s) g",
+                    (BENCH_ROWS,),
+                )
+
+            results = {
+                "commits": BENCH_COMMITS / _timed(small_commits),
+                "rows": BENCH_ROWS / _timed(bulk_insert),
+            }
+
+        # The two ways toygres resets a database: recreate from a (filled)
+        # baseline, and truncate every table
+        results["recreate"] = _timed(
+            lambda: db.create_database(clone, ephemeral=ephemeral, template=dbname)
+        )
+        with closing(_connect(clone)) as clone_conn, clone_conn.cursor() as cur:
+            results["truncate"] = _timed(
+                lambda: cur.execute("TRUNCATE events, accounts")
+            )
+        return results
+    finally:
+        db.drop_database(clone)
+        db.drop_database(dbname)
+
+
+def benchmark_ephemeral() -> None:
+    """Compare write throughput and reset time of durable and ephemeral databases."""
+    with console.status("Benchmarking a durable database..."):
+        durable = _measure("toygres_bench_durable", ephemeral=False)
+    with console.status("Benchmarking an ephemeral database..."):
+        ephemeral = _measure("toygres_bench_ephemeral", ephemeral=True)
+
+    table = Table(
+        box=box.ROUNDED, title="Ephemeral vs durable", header_style="bold #ECE7D1"
+    )
+    for col in ("metric", "durable", "ephemeral", "speedup"):
+        table.add_column(col, justify="left" if col == "metric" else "right")
+
+    for key, label in (("commits", "single row commits/s"), ("rows", "bulk rows/s")):
+        table.add_row(
+            label,
+            f"{durable[key]:,.0f}",
+            f"{ephemeral[key]:,.0f}",
+            f"{ephemeral[key] / durable[key]:.1f}x",
+        )
+    for key, label in (
+        ("recreate", "recreate from baseline"),
+        ("truncate", "reset db (truncate)"),
+    ):
+        table.add_row(
+            label,
+            f"{durable[key] * 1000:,.0f}ms",
+            f"{ephemeral[key] * 1000:,.0f}ms",
+            f"{durable[key] / ephemeral[key]:.1f}x",
+        )
+    console.print(table)
@@ -38,3 +38,138 @@ PG_TYPES = {
 MAX_EXPLORE_COLUMNS_BEFORE_WARNING = 8
 MAX_TOOL_RESULT_LENGTH = 8000
 TRUNCATED_TOOL_RESULT_MESSAGE = "extremely long response, either execute a shorter query or give the sql output to user"
+
+# Planner thresholds above which a query issued by the AI is rejected before running.
+# Overridable through AI_MAX_QUERY_COST / AI_MAX_QUERY_ROWS in the environment.
+DEFAULT_AI_MAX_QUERY_COST = 100_000.0
+DEFAULT_AI_MAX_QUERY_ROWS = 100_000
+# Statements that EXPLAIN accepts and the AI is allowed to run
+EXPLAINABLE_PREFIXES = {"select", "with", "values", "table"}
+
+# Conversation memory for the AI chat, measured with utils.estimate_tokens.
+# Overridable through AI_HISTORY_TOKEN_BUDGET in the environment.
+DEFAULT_HISTORY_TOKEN_BUDGET = 2000
+# Older turns are compacted into a rolling summary capped at this many tokens
+SUMMARY_TOKEN_BUDGET = 400
+# Executed queries longer than this are stored in history by hash + excerpt
+MAX_HISTORY_QUERY_LENGTH = 400
+
+# Relevance-ranked schema injection into the AI system prompt.
+# Overridable through AI_SCHEMA_TOP_K / AI_SCHEMA_TOKEN_BUDGET in the environment.
+DEFAULT_SCHEMA_TOP_K = 8
+DEFAULT_SCHEMA_TOKEN_BUDGET = 1500
+# Above this many tables only the count is put in the prompt, not every name
+MAX_LISTED_TABLES = 150
+
+# Batch question mode: retries and shared exponential backoff on rate limits
+BATCH_MAX_ATTEMPTS = 6
+BATCH_BACKOFF_BASE_SECONDS = 1.0
+BATCH_BACKOFF_MAX_SECONDS = 60.0
+
+# Tiered model routing: questions beyond any of these limits skip the fast model
+ROUTE_MAX_QUESTION_LENGTH = 300
+ROUTE_MAX_TABLES = 2
+ROUTE_MAX_SCHEMA_TABLES = 200
+# Tool-call rounds per answer before the model is considered stuck
+MAX_TOOL_ROUNDS = 8
+# Statements EXPLAIN can plan, used to validate SQL the AI suggests to the user
+VALIDATABLE_PREFIXES = EXPLAINABLE_PREFIXES | {"insert", "update", "delete", "merge"}
+# Every keyword a PostgreSQL statement can start with
+SQL_STATEMENT_KEYWORDS = VALIDATABLE_PREFIXES | set(
+    "abort alter analyze begin call checkpoint close cluster comment commit copy"
+    " create deallocate declare discard do drop end execute explain fetch grant"
+    " import listen load lock move notify prepare reassign refresh reindex release"
+    " reset revoke rollback savepoint security select set show start truncate"
+    " unlisten vacuum".split()
+)
+
+# Session timing histogram written at exit when profiling was enabled
+PROFILE_EXPORT_PATH = ".toygres_profile.json"
+
+# Results with more rows than this skip Rich and use the fast renderer / pager
+FAST_RENDER_ROW_THRESHOLD = 1000
+# Rows sampled to size the pager's columns
+PAGER_WIDTH_SAMPLE_SIZE = 500
+# Rows formatted together, and how many formatted batches stay cached
+PAGER_BATCH_SIZE = 2000
+PAGER_CACHED_BATCHES = 8
+# Leading columns that stay on screen while scrolling sideways
+PAGER_FROZEN_COLUMNS = 1
+
+# Rows converted per Parquet row group by \export
+EXPORT_PARQUET_BATCH_ROWS = 50_000
+
+# Tables loaded concurrently by \seed, each on its own connection
+SEED_WORKERS = 4
+
+# \synth: rows per COPY batch, concurrent connections, parent keys sampled
+# for foreign key columns and pre-generated values per column
+SYNTH_BATCH_ROWS = 50_000
+SYNTH_WORKERS = 4
+SYNTH_FK_SAMPLE_SIZE = 100_000
+SYNTH_POOL_SIZE = 10_000
+
+# Workload of --bench-ephemeral: single row commits and one bulk insert
+BENCH_COMMITS = 2000
+BENCH_ROWS = 200_000
+
+# Cached migration states are template databases named prefix + hash; only
+# the newest few are kept
+MIGRATION_CACHE_PREFIX = "toygres_mig_"
+MIGRATION_CACHE_KEEP = 5
+
+# Script timing table: statements highlighted as slowest, and rows listed
+SCRIPT_HIGHLIGHT_SLOWEST = 3
+SCRIPT_TIMING_MAX_ROWS = 20
+
+# \plan: nodes highlighted as hottest (by self time), and the thresholds for
+# flagging big seq scans, nested loops and row misestimates
+PLAN_HOT_NODES = 3
+PLAN_LARGE_SEQ_SCAN_ROWS = 100_000
+PLAN_HUGE_LOOPS = 10_000
+PLAN_MISESTIMATE_FACTOR = 10
+
+# \plandiff: timed runs per query on each side, and the slowdown counted as a
+# regression (when it is also beyond the run to run noise)
+PLAN_DIFF_RUNS = 5
+PLAN_REGRESSION_THRESHOLD = 0.2
+
+# \advise: most recent workload queries considered, timed runs per query and
+# the minimum planner cost reduction for an index to be suggested
+ADVISOR_MAX_QUERIES = 50
+ADVISOR_TIMING_RUNS = 3
+ADVISOR_MIN_GAIN = 0.05
+
+# Performance Dashboard: seconds between refreshes and statements listed
+DASHBOARD_REFRESH_SECONDS = 2
+DASHBOARD_TOP_QUERIES = 15
+
+# Resets give up waiting for a table lock after this long and open the lock
+# monitor; the monitor lists at most this many sessions as one-key actions
+LOCK_WAIT_TIMEOUT = "3s"
+LOCK_MONITOR_REFRESH_SECONDS = 1
+LOCK_MONITOR_MAX_ACTIONS = 8
+
+# Explore mode: parallel connections for the opt-in exact row counts
+EXPLORE_COUNT_WORKERS = 4
+
+# Explore random previews: rows sampled for the column profile, and the table
+# size up to which BERNOULLI (a full scan) is used instead of SYSTEM pages
+EXPLORE_SAMPLE_ROWS = 10_000
+EXPLORE_BERNOULLI_MAX_ROWS = 100_000
+
+# Compact output (\compact and explore): characters of a wide text, JSON,
+# array or bytea value sent by the server before it is cut
+COMPACT_VALUE_CHARS = 120
+
+# \find: read-only connections searching tables in parallel, the statement
+# timeout of each table's search and the matches printed per table
+FIND_WORKERS = 4
+FIND_TABLE_TIMEOUT = "5s"
+FIND_MAX_ROWS_PER_TABLE = 20
+
+# \diff: parallel connections per database, rows per hash bucket for tables
+# chunked by hash (key ranges come from pg_stats), and keys listed per change
+DIFF_WORKERS = 4
+DIFF_CHUNK_ROWS = 10_000
+DIFF_MAX_KEYS = 10
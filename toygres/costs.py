@@ -1,19 +1,94 @@
 from toygres.constants import MATRIX_GREEN, RESET
 import os
+import threading
+
+
+def model_prices(model: str | None) -> tuple[float, float] | None:
+    """Return (input, output) USD per million tokens for `model`, if configured.
+
+    MODEL_PRICES holds per-model overrides like
+    ``gpt-4.1-nano=0.10/0.40,gpt-4.1-mini=0.40/1.60``; models not listed
+    there fall back to INPUT_/OUTPUT_COST_PER_MILLION_TOKEN.
+    """
+    for entry in os.getenv("MODEL_PRICES", "").split(","):
+        name, _, prices = entry.strip().partition("=")
+        if model and name == model:
+            try:
+                in_cost, out_cost = prices.split("/")
+                return float(in_cost), float(out_cost)
+            except ValueError:
+                break
+
+    in_cost_env = os.getenv("INPUT_COST_PER_MILLION_TOKEN")
+    out_cost_env = os.getenv("OUTPUT_COST_PER_MILLION_TOKEN")
+    if in_cost_env and out_cost_env:
+        try:
+            return float(in_cost_env), float(out_cost_env)
+        except ValueError:
+            pass
+    return None
+
+
+class ModelUsage:
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latency = 0.0
 
 
 class TokenCosts:
     def __init__(self):
         self.input_tokens = 0
         self.output_tokens = 0
+        # Per model breakdown, filled when callers pass the model name
+        self.models: dict[str, ModelUsage] = {}
+        # Batch mode adds tokens from several worker threads
+        self._lock = threading.Lock()
 
-    def add_tokens(self, input_tokens: int, output_tokens: int):
-        self.input_tokens += input_tokens
-        self.output_tokens += output_tokens
+    def add_tokens(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        model: str | None = None,
+        latency: float | None = None,
+    ):
+        with self._lock:
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            if model:
+                usage = self.models.setdefault(model, ModelUsage())
+                usage.calls += 1
+                usage.input_tokens += input_tokens
+                usage.output_tokens += output_tokens
+                usage.latency += latency or 0.0
 
     def get_total_tokens(self) -> int:
         return self.input_tokens + self.output_tokens
 
+    def get_cost(self) -> float | None:
+        """Estimated USD spent, pricing each model separately where known."""
+        total = 0.0
+        priced_input = priced_output = 0
+        for model, usage in self.models.items():
+            prices = model_prices(model)
+            if prices is None:
+                return None
+            total += (usage.input_tokens * prices[0]) / 1_000_000
+            total += (usage.output_tokens * prices[1]) / 1_000_000
+            priced_input += usage.input_tokens
+            priced_output += usage.output_tokens
+
+        # Tokens recorded without a model name use the default prices
+        remaining_in = self.input_tokens - priced_input
+        remaining_out = self.output_tokens - priced_output
+        if remaining_in or remaining_out:
+            prices = model_prices(None)
+            if prices is None:
+                return None
+            total += (remaining_in * prices[0] + remaining_out * prices[1]) / 1_000_000
+        return total
+
     def print_costs(self):
 
         print(f"\n{MATRIX_GREEN}--- Session Token Usage ---{RESET}")
@@ -21,19 +96,17 @@ class TokenCosts:
         print(f"{MATRIX_GREEN}Output Tokens: {self.output_tokens}{RESET}")
         print(f"{MATRIX_GREEN}Total Tokens: {self.get_total_tokens()}{RESET}")
 
-        in_cost_env = os.getenv("INPUT_COST_PER_MILLION_TOKEN")
-        out_cost_env = os.getenv("OUTPUT_COST_PER_MILLION_TOKEN")
+        for model, usage in self.models.items():
+            avg_latency = usage.latency / usage.calls if usage.calls else 0.0
+            print(
+                f"{MATRIX_GREEN}  {model}: {usage.calls} calls, "
+                f"{usage.input_tokens} in / {usage.output_tokens} out, "
+                f"avg {avg_latency:.2f}s{RESET}"
+            )
 
-        if in_cost_env and out_cost_env:
-            try:
-                in_cost = float(in_cost_env)
-                out_cost = float(out_cost_env)
-                total_cost = (self.input_tokens / 1_000_000) * in_cost + (
-                    self.output_tokens / 1_000_000
-                ) * out_cost
-                print(f"{MATRIX_GREEN}Estimated Cost: ${total_cost:.6f}{RESET}")
-            except ValueError:
-                pass
+        total_cost = self.get_cost()
+        if total_cost is not None:
+            print(f"{MATRIX_GREEN}Estimated Cost: ${total_cost:.6f}{RESET}")
 
         print(f"{MATRIX_GREEN}---------------------------{RESET}\n")
 
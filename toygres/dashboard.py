@@ -0,0 +1,190 @@
+import time
+from contextlib import closing
+
+import questionary
+from rich import box
+from rich.console import Console
+from rich.live import Live
+from rich.table import Table
+
+from . import db
+from .constants import DASHBOARD_REFRESH_SECONDS, DASHBOARD_TOP_QUERIES, RESET, YELLOW
+from .utils import one_line
+
+console = Console()
+
+# pg_stat_statements is installed in the internal postgres database (see
+# init.sql) and read from there, so the user's databases stay untouched
+STATS_DBNAME = "postgres"
+
+SORT_KEYS = {
+    "total time": "total_ms",
+    "mean time": "mean_ms",
+    "calls": "calls",
+    "rows": "rows",
+}
+
+# One entry per queryid: pg_stat_statements keeps a row per role and per
+# top level/nested execution of the same statement
+_STATS_SQL = """
+    SELECT queryid, min(query), sum(calls)::int8, sum(total_exec_time),
+           sum(rows)::int8, sum(shared_blks_hit)::int8, sum(shared_blks_read)::int8
+    FROM pg_stat_statements
+    WHERE dbid = (SELECT oid FROM pg_database WHERE datname = %s)
+      AND queryid IS NOT NULL
+    GROUP BY queryid
+"""
+
+
+def _unavailable_reason(cur) -> str | None:
+    """Why the dashboard can't run, or None once the extension is usable."""
+    cur.execute(
+        "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_stat_statements'"
+    )
+    if not cur.fetchone():
+        return "pg_stat_statements is not available in this Postgres build."
+    cur.execute("SHOW shared_preload_libraries")
+    if "pg_stat_statements" not in cur.fetchone()[0]:
+        return (
+            "pg_stat_statements is not loaded. Recreate the container with the "
+            "bundled docker-compose.yml (docker compose up -d --force-recreate), "
+            "which sets shared_preload_libraries."
+        )
+    # Volumes created before init.sql installed it don't have the extension yet
+    cur.execute("CREATE EXTENSION IF NOT EXISTS pg_stat_statements")
+    return None
+
+
+def fetch_stats(cur, dbname: str) -> dict[int, dict]:
+    """Cumulative statistics of every statement run against `dbname`."""
+    cur.execute(_STATS_SQL, (dbname,))
+    stats = {}
+    for queryid, query, calls, total_ms, rows, hit, read in cur.fetchall():
+        stats[queryid] = {
+            "query": query,
+            "calls": calls,
+            "total_ms": total_ms,
+            "rows": rows,
+            "hit": hit,
+            "read": read,
+        }
+    return stats
+
+
+def diff_stats(current: dict[int, dict], snapshot: dict[int, dict]) -> dict[int, dict]:
+    """What happened since `snapshot`: counters subtracted, idle statements dropped."""
+    changed = {}
+    for queryid, now in current.items():
+        before = snapshot.get(queryid)
+        if before is None:
+            changed[queryid] = now
+            continue
+        if now["calls"] < before["calls"]:
+            # Reset in between, the counters started over
+            changed[queryid] = now
+            continue
+        if now["calls"] == before["calls"]:
+            continue
+        changed[queryid] = {
+            "query": now["query"],
+            **{
+                key: now[key] - before[key]
+                for key in ("calls", "total_ms", "rows", "hit", "read")
+            },
+        }
+    return changed
+
+
+def render(
+    stats: dict[int, dict], sort_key: str, dbname: str, since: float | None
+) -> Table:
+    for entry in stats.values():
+        entry["mean_ms"] = entry["total_ms"] / entry["calls"] if entry["calls"] else 0
+    top = sorted(stats.values(), key=lambda e: e[SORT_KEYS[sort_key]], reverse=True)
+    total_ms = sum(e["total_ms"] for e in stats.values()) or 1e-9
+
+    if since is None:
+        title = f"Top queries on {dbname} by {sort_key}"
+    else:
+        taken = time.strftime("%H:%M:%S", time.localtime(since))
+        title = f"Top queries on {dbname} by {sort_key}, since snapshot {taken}"
+    table = Table(box=box.ROUNDED, title=title, header_style="bold #ECE7D1")
+    table.add_column("query", no_wrap=True)
+    for column in ("calls", "total ms", "mean ms", "rows", "time %", "cache hit"):
+        table.add_column(column, justify="right", no_wrap=True)
+
+    width = max(20, min(80, console.width - 75))
+    for entry in top[:DASHBOARD_TOP_QUERIES]:
+        blocks = entry["hit"] + entry["read"]
+        table.add_row(
+            one_line(entry["query"], width),
+            f"{entry['calls']:,}",
+            f"{entry['total_ms']:,.1f}",
+            f"{entry['mean_ms']:,.2f}",
+            f"{entry['rows']:,}",
+            f"{entry['total_ms'] / total_ms:.0%}",
+            f"{entry['hit'] / blocks:.0%}" if blocks else "-",
+        )
+    table.caption = (
+        f"{len(stats)} statements, {sum(e['calls'] for e in stats.values()):,} calls, "
+        f"{total_ms / 1000:,.2f}s total · refreshing every {DASHBOARD_REFRESH_SECONDS}s, "
+        "Ctrl+C for options"
+    )
+    return table
+
+
+def run_dashboard() -> None:
+    """Live pg_stat_statements view of the connected database.
+
+    Ctrl+C pauses the view to change the sort order, reset the statistics
+    or take a snapshot, after which only what ran since then is shown.
+    """
+    dbname = db.DBNAME
+    sort_key = "total time"
+    snapshot, since = None, None
+
+    with closing(db.open_connection(STATS_DBNAME)) as stats_conn:
+        cur = stats_conn.cursor()
+        reason = _unavailable_reason(cur)
+        if reason:
+            print(f"{YELLOW}{reason}{RESET}")
+            return
+
+        while True:
+            try:
+                with Live(console=console, auto_refresh=False) as live:
+                    while True:
+                        stats = fetch_stats(cur, dbname)
+                        if snapshot is not None:
+                            stats = diff_stats(stats, snapshot)
+                        live.update(
+                            render(stats, sort_key, dbname, since), refresh=True
+                        )
+                        time.sleep(DASHBOARD_REFRESH_SECONDS)
+            except KeyboardInterrupt:
+                pass
+
+            choices = [f"Sort by {key}" for key in SORT_KEYS if key != sort_key]
+            choices += [
+                "Take snapshot (show only what runs from now on)",
+                *(["Clear snapshot"] if snapshot is not None else []),
+                "Reset statistics",
+                "Resume",
+                "Back to menu",
+            ]
+            action = questionary.select("Dashboard:", choices=choices).ask()
+            if action is None or action == "Back to menu":
+                return
+            if action.startswith("Sort by "):
+                sort_key = action.removeprefix("Sort by ")
+            elif action.startswith("Take snapshot"):
+                snapshot, since = fetch_stats(cur, dbname), time.time()
+            elif action == "Clear snapshot":
+                snapshot, since = None, None
+            elif action == "Reset statistics":
+                cur.execute(
+                    "SELECT pg_stat_statements_reset(0, oid, 0) "
+                    "FROM pg_database WHERE datname = %s",
+                    (dbname,),
+                )
+                snapshot, since = None, None
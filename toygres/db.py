@@ -1,9 +1,13 @@
+import json
 import psycopg2
 import os
 import psycopg2
 from psycopg2 import sql
 import subprocess
 
+from .constants import LOCK_WAIT_TIMEOUT
+from .profiler import tracer
+
 conn = None
 read_only_conn = None
 observer_conn = None
@@ -37,16 +41,150 @@ def get_databases():
     return dbs
 
 
-def create_database(new_dbname):
+# Installed into ephemeral databases, in its own schema so nuking public keeps
+# it: every table created is made UNLOGGED at the end of the statement that
+# created it. Other tables are never touched, ALTER TABLE ... SET LOGGED sticks.
+# Logged tables may not reference unlogged ones, so a table stays logged while
+# a logged table references it, and CREATE TABLE with an inline REFERENCES to
+# an existing (unlogged) table fails; create such tables UNLOGGED, or add the
+# foreign key with ALTER TABLE afterwards.
+_EPHEMERAL_SQL = """
+CREATE SCHEMA IF NOT EXISTS toygres;
+
+CREATE OR REPLACE FUNCTION toygres.can_unlog(rel regclass) RETURNS boolean
+LANGUAGE sql STABLE AS $$
+    SELECT c.relkind = 'r' AND c.relpersistence = 'p'
+       AND c.relnamespace = 'public'::regnamespace
+       AND NOT EXISTS (
+           SELECT 1 FROM pg_constraint f
+           JOIN pg_class child ON child.oid = f.conrelid
+           WHERE f.contype = 'f' AND f.confrelid = c.oid
+             AND f.conrelid <> c.oid AND child.relpersistence = 'p'
+       )
+    FROM pg_class c WHERE c.oid = rel
+$$;
+
+-- Every table of the database, when it is made ephemeral
+CREATE OR REPLACE FUNCTION toygres.unlog_tables() RETURNS void
+LANGUAGE plpgsql AS $$
+DECLARE
+    rel regclass;
+    changed boolean := true;
+BEGIN
+    -- Children before parents: a table can only become unlogged once no
+    -- logged table references it
+    WHILE changed LOOP
+        changed := false;
+        FOR rel IN
+            SELECT c.oid::regclass FROM pg_class c
+            WHERE c.relnamespace = 'public'::regnamespace
+              AND toygres.can_unlog(c.oid)
+        LOOP
+            EXECUTE format('ALTER TABLE %s SET UNLOGGED', rel);
+            changed := true;
+        END LOOP;
+    END LOOP;
+END $$;
+
+CREATE OR REPLACE FUNCTION toygres.ephemeral_ddl_end() RETURNS event_trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    rel regclass;
+BEGIN
+    -- Only the tables the statement created, while they are still empty
+    -- (or just filled by CREATE TABLE AS)
+    FOR rel IN
+        SELECT DISTINCT objid::regclass FROM pg_event_trigger_ddl_commands()
+        WHERE object_type = 'table' AND toygres.can_unlog(objid)
+    LOOP
+        EXECUTE format('ALTER TABLE %s SET UNLOGGED', rel);
+    END LOOP;
+END $$;
+
+DROP EVENT TRIGGER IF EXISTS toygres_ephemeral_start;
+DROP FUNCTION IF EXISTS toygres.ephemeral_ddl_start();
+
+DROP EVENT TRIGGER IF EXISTS toygres_ephemeral_end;
+CREATE EVENT TRIGGER toygres_ephemeral_end ON ddl_command_end
+    WHEN TAG IN ('CREATE TABLE', 'CREATE TABLE AS', 'SELECT INTO')
+    EXECUTE FUNCTION toygres.ephemeral_ddl_end();
+"""
+
+EPHEMERAL_TABLESPACE = "toygres_ephemeral"
+
+
+def _ephemeral_tablespace(cur):
+    """Tablespace for ephemeral databases, created on first use.
+
+    Only used when TOYGRES_EPHEMERAL_TABLESPACE_DIR points at a directory on
+    the server, e.g. the tmpfs mount from docker-compose.yml.
+    """
+    location = os.getenv("TOYGRES_EPHEMERAL_TABLESPACE_DIR")
+    if not location:
+        return None
+    cur.execute(
+        "SELECT 1 FROM pg_tablespace WHERE spcname = %s", (EPHEMERAL_TABLESPACE,)
+    )
+    if cur.fetchone() is None:
+        cur.execute(
+            sql.SQL("CREATE TABLESPACE {} LOCATION {}").format(
+                sql.Identifier(EPHEMERAL_TABLESPACE), sql.Literal(location)
+            )
+        )
+    return EPHEMERAL_TABLESPACE
+
+
+def create_database(new_dbname, ephemeral=False, template=None):
+    """Create a database, optionally as a copy of `template`.
+
+    Ephemeral databases trade crash safety for speed: asynchronous commit,
+    UNLOGGED tables and, if configured, a tmpfs tablespace.
+    """
     # Create database shall be done our created internal db, since it cannot be deleted by normal user
     # So we have a fallback even if user deletes all the other dbs
     temp_conn = psycopg2.connect(host=HOST, user=USER, port=PORT, dbname=DBNAME)
     temp_conn.autocommit = True
     with temp_conn.cursor() as cur:
         query = sql.SQL("CREATE DATABASE {}").format(sql.Identifier(new_dbname))
+        if template:
+            query += sql.SQL(" TEMPLATE {}").format(sql.Identifier(template))
+        tablespace = _ephemeral_tablespace(cur) if ephemeral else None
+        if tablespace:
+            query += sql.SQL(" TABLESPACE {}").format(sql.Identifier(tablespace))
         cur.execute(query)
     temp_conn.close()
 
+    if ephemeral:
+        make_ephemeral(new_dbname)
+
+
+def make_ephemeral(dbname):
+    """Relax durability for `dbname` and make its tables UNLOGGED."""
+    temp_conn = psycopg2.connect(host=HOST, user=USER, port=PORT, dbname=dbname)
+    temp_conn.autocommit = True
+    with temp_conn.cursor() as cur:
+        cur.execute(
+            sql.SQL("ALTER DATABASE {} SET synchronous_commit = off").format(
+                sql.Identifier(dbname)
+            )
+        )
+        cur.execute(_EPHEMERAL_SQL)
+        cur.execute("SELECT toygres.unlog_tables()")
+    temp_conn.close()
+
+
+def is_ephemeral(dbname):
+    """Ephemeral databases are recognised by their synchronous_commit=off setting."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT 1 FROM pg_db_role_setting s "
+            "JOIN pg_database d ON d.oid = s.setdatabase "
+            "WHERE d.datname = %s AND s.setrole = 0 "
+            "AND 'synchronous_commit=off' = ANY(s.setconfig)",
+            (dbname,),
+        )
+        return cur.fetchone() is not None
+
 
 def get_existing_triggers(dbname):
     temp_conn = psycopg2.connect(host=HOST, user=USER, port=PORT, dbname=dbname)
@@ -110,6 +248,19 @@ def connect_to_observer_db(dbname):
     return observer_conn
 
 
+def open_connection(dbname, read_only=False):
+    """Open a fresh connection that is not tracked by this module's globals.
+
+    Used by workers that need their own connection, e.g. concurrent AI sessions.
+    Read only connections log in as the ai role, like read_only_conn.
+    """
+    user = "ai" if read_only else USER
+    new_conn = psycopg2.connect(host=HOST, user=user, port=PORT, dbname=dbname)
+    if not read_only:
+        new_conn.autocommit = True
+    return new_conn
+
+
 def establish_all_connections(dbname):
     """
     Establishes all the appropriate connections required
@@ -120,21 +271,24 @@ def establish_all_connections(dbname):
     Returns:
         Only the details of normal connection, since the other 2 will be required only when user explicitly asks for it(Either while using ai or using observer)
     """
-    host, user, port, target_dbname = connect_db(dbname)
-    connect_to_read_only_db(dbname)
-    connect_to_observer_db(dbname)
+    with tracer.span("db.connect"):
+        host, user, port, target_dbname = connect_db(dbname)
+        connect_to_read_only_db(dbname)
+        connect_to_observer_db(dbname)
     return host, user, port, target_dbname
 
 
 def executeSQL(sql):
     try:
         cur = conn.cursor()
-        cur.execute(sql)
+        with tracer.span("db.execute"):
+            cur.execute(sql)
 
         description = cur.description  # column metadata, None for non-SELECT
         status = cur.statusmessage  # e.g. "SELECT 5", "INSERT 0 1", "CREATE TABLE"
         try:
-            rows = cur.fetchall()
+            with tracer.span("db.fetch"):
+                rows = cur.fetchall()
         except Exception:
             rows = []
 
@@ -145,28 +299,93 @@ def executeSQL(sql):
         raise
 
 
-def executeSQLReadOnly(sql):
+def executeSQLReadOnly(sql, connection=None):
+    connection = connection or read_only_conn
     try:
-        cur = read_only_conn.cursor()
-        cur.execute(sql)
+        cur = connection.cursor()
+        with tracer.span("db.execute"):
+            cur.execute(sql)
 
         description = cur.description
         status = cur.statusmessage
         try:
-            rows = cur.fetchall()
+            with tracer.span("db.fetch"):
+                rows = cur.fetchall()
         except Exception:
             rows = []
 
-        read_only_conn.commit()
+        connection.commit()
         return description, rows, status
     except Exception:
-        read_only_conn.rollback()
+        connection.rollback()
+        raise
+
+
+def explain_read_only(sql, connection=None):
+    """Plan (without executing) a query on the read only connection.
+
+    Returns the top level node of the ``EXPLAIN (FORMAT JSON)`` output,
+    i.e. a dict holding ``Plan`` with ``Total Cost`` and ``Plan Rows``.
+    """
+    connection = connection or read_only_conn
+    try:
+        cur = connection.cursor()
+        with tracer.span("db.explain"):
+            cur.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+        plan = cur.fetchone()[0]
+        connection.commit()
+        # psycopg2 decodes json columns, but be defensive about plain text
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]
+    except Exception:
+        connection.rollback()
+        raise
+
+
+def explain_analyze(sql, connection=None):
+    """Run ``EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)`` inside a rolled back transaction.
+
+    The query really executes, so writes are undone afterwards. Returns the
+    top level node holding ``Plan``, ``Planning Time`` and ``Execution Time``.
+    """
+    connection = connection or conn
+    cur = connection.cursor()
+    try:
+        if connection.autocommit:
+            cur.execute("BEGIN")
+        with tracer.span("db.explain_analyze"):
+            cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+        plan = cur.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]
+    finally:
+        if connection.autocommit:
+            cur.execute("ROLLBACK")
+        else:
+            connection.rollback()
+
+
+def copy_to(copy_sql, file):
+    """Stream a ``COPY ... TO STDOUT`` into a file-like object; returns rows copied."""
+    try:
+        cur = conn.cursor()
+        with tracer.span("db.copy_to"):
+            cur.copy_expert(copy_sql, file)
+        conn.commit()
+        return cur.rowcount
+    except BaseException:
+        # Also on Ctrl+C, so the session isn't left inside an aborted COPY
+        conn.rollback()
         raise
 
 
 def reset_db():
     try:
         cur = conn.cursor()
+        # Fail with LockNotAvailable instead of hanging behind another session
+        cur.execute("SET lock_timeout = %s", (LOCK_WAIT_TIMEOUT,))
         cur.execute("SELECT tablename FROM pg_tables WHERE schemaname = 'public';")
         tables = [row[0] for row in cur.fetchall()]
         if not tables:
@@ -181,11 +400,14 @@ def reset_db():
     except Exception:
         conn.rollback()
         raise
+    finally:
+        conn.cursor().execute("RESET lock_timeout")
 
 
 def reset_public_schema():
     try:
         cur = conn.cursor()
+        cur.execute("SET lock_timeout = %s", (LOCK_WAIT_TIMEOUT,))
         cur.execute("DROP SCHEMA public CASCADE;")
         cur.execute("CREATE SCHEMA public;")
         cur.execute("GRANT ALL ON SCHEMA public TO postgres;")
@@ -195,15 +417,18 @@ def reset_public_schema():
     except Exception:
         conn.rollback()
         raise
+    finally:
+        conn.cursor().execute("RESET lock_timeout")
 
 
 def execute_meta_command(command):
     command = command.rstrip().rstrip(";")
-    result = subprocess.run(
-        ["psql", "-U", USER, "-d", DBNAME, "-h", HOST, "-p", PORT, "-c", command],
-        capture_output=True,
-        text=True,
-    )
+    with tracer.span("db.psql"):
+        result = subprocess.run(
+            ["psql", "-U", USER, "-d", DBNAME, "-h", HOST, "-p", PORT, "-c", command],
+            capture_output=True,
+            text=True,
+        )
     output = result.stdout.strip()
     error = result.stderr.strip()
     if error:
@@ -213,11 +438,12 @@ def execute_meta_command(command):
 
 def execute_read_only_meta_command(command):
     command = command.rstrip().rstrip(";")
-    result = subprocess.run(
-        ["psql", "-U", "ai", "-d", DBNAME, "-h", HOST, "-p", PORT, "-c", command],
-        capture_output=True,
-        text=True,
-    )
+    with tracer.span("db.psql"):
+        result = subprocess.run(
+            ["psql", "-U", "ai", "-d", DBNAME, "-h", HOST, "-p", PORT, "-c", command],
+            capture_output=True,
+            text=True,
+        )
     output = result.stdout.strip()
     error = result.stderr.strip()
     if error:
@@ -225,6 +451,44 @@ def execute_read_only_meta_command(command):
     return output
 
 
+def run_sql_file(dbname, path):
+    """Run a .sql file with psql, stopping at the first error.
+
+    Not wrapped in a transaction: CREATE INDEX CONCURRENTLY, VACUUM and the
+    like can't run in one. A migration that wants one can BEGIN/COMMIT itself.
+    """
+    with tracer.span("db.psql_file"):
+        result = subprocess.run(
+            ["psql", "-U", USER, "-d", dbname, "-h", HOST, "-p", PORT]
+            + ["-X", "-q", "-v", "ON_ERROR_STOP=1", "-f", path],
+            capture_output=True,
+            text=True,
+        )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"psql failed on {path}")
+
+
+def get_template_databases(prefix):
+    """Template databases whose name starts with `prefix`, oldest first."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT datname FROM pg_database WHERE datistemplate AND datname LIKE %s "
+            "ORDER BY oid",
+            (prefix.replace("_", "\\_") + "%",),
+        )
+        return [row[0] for row in cur.fetchall()]
+
+
+def set_template(dbname, is_template=True):
+    """Template databases are hidden from the menu and can't be dropped until unmarked."""
+    conn.autocommit = True
+    executeSQL(
+        sql.SQL("ALTER DATABASE {} IS_TEMPLATE {}").format(
+            sql.Identifier(dbname), sql.SQL("true" if is_template else "false")
+        )
+    )
+
+
 def create_baseline(user_name, target_dbname, schema_only=True):
     baseline_name = f"{user_name}_baseline_for_{target_dbname}"
     conn.autocommit = True
@@ -238,6 +502,10 @@ def create_baseline(user_name, target_dbname, schema_only=True):
     os.system(
         f"{dump_cmd} | psql -U {USER} -h {HOST} -p {PORT} -d {baseline_name} > /dev/null 2>&1"
     )
+    # The dump brings the unlogged tables and event triggers along, but not
+    # the database level settings
+    if is_ephemeral(target_dbname):
+        make_ephemeral(baseline_name)
     return baseline_name
 
 
@@ -266,13 +534,42 @@ def recreate_from_baseline(target_dbname, baseline_dbname):
     establish_all_connections(hop_db)
 
     print("Dropping target database...")
-    drop_database(target_dbname)
+    try:
+        drop_database(target_dbname)
+    except Exception:
+        # Still there (e.g. in use), so go back to it rather than the hop db
+        establish_all_connections(target_dbname)
+        raise
 
     print("Recreating database from baseline...")
-    conn.autocommit = True
-    executeSQL(f"CREATE DATABASE {target_dbname} TEMPLATE {baseline_dbname};")
+    create_database(
+        target_dbname,
+        ephemeral=is_ephemeral(baseline_dbname),
+        template=baseline_dbname,
+    )
 
     print(f"Reconnecting to freshly made {target_dbname}...")
     establish_all_connections(target_dbname)
 
     return f"NUKED and recreated from baseline: {baseline_dbname}"
+
+
+def clone_database(source_dbname, clone_dbname):
+    """Copy `source_dbname` (the connected database) via CREATE DATABASE ... TEMPLATE.
+
+    The template must have no other sessions, so like recreate_from_baseline
+    this hops the connections to another database and back.
+    """
+    dbs = get_databases()
+    other_dbs = [d for d in dbs if d != source_dbname and d != clone_dbname]
+    hop_db = other_dbs[0] if other_dbs else "template1"
+
+    establish_all_connections(hop_db)
+    try:
+        create_database(
+            clone_dbname,
+            ephemeral=is_ephemeral(source_dbname),
+            template=source_dbname,
+        )
+    finally:
+        establish_all_connections(source_dbname)
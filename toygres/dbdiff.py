@@ -0,0 +1,468 @@
+import math
+import queue
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import closing
+
+import psycopg2
+from psycopg2 import sql
+from rich import box
+from rich.console import Console
+from rich.markup import escape
+from rich.table import Table
+
+from . import db
+from .constants import (
+    COMPACT_VALUE_CHARS,
+    DIFF_CHUNK_ROWS,
+    DIFF_MAX_KEYS,
+    DIFF_WORKERS,
+    RESET,
+    YELLOW,
+)
+from .baselines import pick_baseline
+
+console = Console()
+
+# One (kind, name, definition) row per schema object of the public schema
+_SCHEMA_OBJECTS_SQL = """
+    SELECT 'table', c.relname,
+           CASE c.relkind WHEN 'r' THEN 'table' WHEN 'p' THEN 'partitioned table'
+                WHEN 'v' THEN 'view' WHEN 'm' THEN 'materialized view'
+                WHEN 'S' THEN 'sequence' ELSE c.relkind::text END
+    FROM pg_class c
+    WHERE c.relnamespace = 'public'::regnamespace AND c.relkind IN ('r', 'p', 'v', 'm', 'S')
+    UNION ALL
+    SELECT 'column', c.relname || '.' || a.attname,
+           format_type(a.atttypid, a.atttypmod)
+           || CASE WHEN a.attnotnull THEN ' NOT NULL' ELSE '' END
+           || coalesce(' DEFAULT ' || pg_get_expr(d.adbin, d.adrelid), '')
+    FROM pg_class c
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    LEFT JOIN pg_attrdef d ON d.adrelid = c.oid AND d.adnum = a.attnum
+    WHERE c.relnamespace = 'public'::regnamespace AND c.relkind IN ('r', 'p', 'v', 'm')
+    UNION ALL
+    SELECT 'index', c.relname, pg_get_indexdef(c.oid)
+    FROM pg_class c
+    WHERE c.relnamespace = 'public'::regnamespace AND c.relkind IN ('i', 'I')
+    UNION ALL
+    SELECT 'constraint', t.relname || '.' || con.conname, pg_get_constraintdef(con.oid)
+    FROM pg_constraint con
+    JOIN pg_class t ON t.oid = con.conrelid
+    WHERE con.connamespace = 'public'::regnamespace
+    UNION ALL
+    SELECT 'view', c.relname, pg_get_viewdef(c.oid)
+    FROM pg_class c
+    WHERE c.relnamespace = 'public'::regnamespace AND c.relkind IN ('v', 'm')
+    UNION ALL
+    SELECT 'trigger', t.relname || '.' || tg.tgname, pg_get_triggerdef(tg.oid)
+    FROM pg_trigger tg
+    JOIN pg_class t ON t.oid = tg.tgrelid
+    WHERE t.relnamespace = 'public'::regnamespace AND NOT tg.tgisinternal
+    UNION ALL
+    SELECT 'function', p.oid::regprocedure::text, md5(pg_get_functiondef(p.oid))
+    FROM pg_proc p
+    WHERE p.pronamespace = 'public'::regnamespace AND p.prokind IN ('f', 'p')
+    UNION ALL
+    SELECT 'enum', t.typname, string_agg(e.enumlabel, ', ' ORDER BY e.enumsortorder)
+    FROM pg_type t
+    JOIN pg_enum e ON e.enumtypid = t.oid
+    WHERE t.typnamespace = 'public'::regnamespace
+    GROUP BY t.typname
+"""
+
+# Columns of the tables to compare data of, with their primary key position
+# and the table's estimated size
+_TABLE_COLUMNS_SQL = """
+    SELECT c.relname, a.attname, format_type(a.atttypid, a.atttypmod),
+           array_position(i.indkey::int2[], a.attnum), c.reltuples
+    FROM pg_class c
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    LEFT JOIN pg_index i ON i.indrelid = c.oid AND i.indisprimary
+    WHERE c.relnamespace = 'public'::regnamespace
+      AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+    ORDER BY c.relname, a.attnum
+"""
+
+
+def schema_fingerprint(cur) -> str:
+    """md5 of the whole public schema, equal for identical schemas."""
+    cur.execute(
+        f"SELECT md5(coalesce(string_agg(o::text, E'\\n' ORDER BY o::text), '')) "
+        f"FROM ({_SCHEMA_OBJECTS_SQL}) o"
+    )
+    return cur.fetchone()[0]
+
+
+def schema_objects(cur) -> dict[tuple[str, str], str]:
+    cur.execute(_SCHEMA_OBJECTS_SQL)
+    return {(kind, name): definition for kind, name, definition in cur.fetchall()}
+
+
+def diff_schema(current_cur, baseline_cur) -> list[tuple[str, str, str, str, str]]:
+    """(kind, name, change, baseline definition, current definition) for every
+    object that was added, removed or changed; empty when the fingerprints match."""
+    if schema_fingerprint(current_cur) == schema_fingerprint(baseline_cur):
+        return []
+    current, baseline = schema_objects(current_cur), schema_objects(baseline_cur)
+    changes = []
+    for key in sorted(current.keys() | baseline.keys()):
+        before, after = baseline.get(key), current.get(key)
+        if before == after:
+            continue
+        change = (
+            "added" if before is None else "removed" if after is None else "changed"
+        )
+        changes.append((*key, change, before or "", after or ""))
+    return changes
+
+
+def print_schema_diff(changes, baseline: str) -> None:
+    if not changes:
+        console.print(f"[green]Schema is identical to {escape(baseline)}.[/green]")
+        return
+    table = Table(
+        box=box.ROUNDED,
+        title=f"Schema changes since {baseline}",
+        header_style="bold #ECE7D1",
+    )
+    for column in ("kind", "object", "change", "baseline", "now"):
+        table.add_column(column, overflow="fold")
+    styles = {"added": "green", "removed": "red", "changed": "yellow"}
+    for kind, name, change, before, after in changes:
+        table.add_row(
+            kind,
+            escape(name),
+            f"[{styles[change]}]{change}[/{styles[change]}]",
+            escape(before),
+            escape(after),
+        )
+    console.print(table)
+
+
+def table_layouts(cur) -> dict[str, dict]:
+    """Per table: its columns and types, primary key columns and size estimate."""
+    cur.execute(_TABLE_COLUMNS_SQL)
+    tables = {}
+    for table, column, typname, pk_position, estimate in cur.fetchall():
+        entry = tables.setdefault(
+            table, {"columns": {}, "primary_key": {}, "estimate": estimate}
+        )
+        entry["columns"][column] = typname
+        if pk_position is not None:
+            entry["primary_key"][pk_position] = column
+    for entry in tables.values():
+        entry["primary_key"] = [
+            entry["primary_key"][p] for p in sorted(entry["primary_key"])
+        ]
+    return tables
+
+
+def _histogram_bounds(cur, table: str, column: str) -> str | None:
+    cur.execute(
+        "SELECT histogram_bounds::text FROM pg_stats "
+        "WHERE schemaname = 'public' AND tablename = %s AND attname = %s",
+        (table, column),
+    )
+    found = cur.fetchone()
+    return found[0] if found else None
+
+
+def plan_table(table: str, current: dict, baseline: dict, cur) -> dict:
+    """How to chunk and hash `table` the same way on both sides.
+
+    Rows are compared on the columns both sides have with the same type. A
+    single column primary key with a histogram in pg_stats is cut into key
+    ranges at the histogram bounds, so a differing chunk is read back through
+    the key's index; other tables are cut into buckets by a hash of their key
+    (the whole row when there is no primary key).
+    """
+    columns = [
+        c
+        for c, typname in current["columns"].items()
+        if baseline["columns"].get(c) == typname
+    ]
+    primary_key = current["primary_key"]
+    if primary_key != baseline["primary_key"] or not set(primary_key) <= set(columns):
+        primary_key = []
+    estimate = max(current["estimate"], baseline["estimate"], 0)
+    plan = {
+        "table": table,
+        "columns": columns,
+        "primary_key": primary_key,
+        "buckets": max(1, math.ceil(estimate / DIFF_CHUNK_ROWS)),
+        "bounds": None,
+        "bounds_type": None,
+    }
+    if len(primary_key) == 1:
+        plan["bounds"] = _histogram_bounds(cur, table, primary_key[0])
+        plan["bounds_type"] = current["columns"][primary_key[0]]
+    return plan
+
+
+def _row_text(plan: dict) -> sql.Composable:
+    return sql.SQL("ROW({})::text").format(
+        sql.SQL(", ").join(sql.Identifier("_t", c) for c in plan["columns"])
+    )
+
+
+def _key_text(plan: dict) -> sql.Composable:
+    if not plan["primary_key"]:
+        return _row_text(plan)
+    return sql.SQL("ROW({})::text").format(
+        sql.SQL(", ").join(sql.Identifier("_t", c) for c in plan["primary_key"])
+    )
+
+
+def _bounds(plan: dict) -> sql.Composable:
+    # The type comes from the catalog, not from the user
+    return sql.SQL("%(bounds)s::{}[]").format(sql.SQL(plan["bounds_type"]))
+
+
+def _chunk_expression(plan: dict) -> sql.Composable:
+    if plan["bounds"]:
+        return sql.SQL("width_bucket({}, {})").format(
+            sql.Identifier("_t", plan["primary_key"][0]), _bounds(plan)
+        )
+    return sql.SQL("mod(abs(hashtext({})::bigint), {})").format(
+        _key_text(plan), sql.Literal(plan["buckets"])
+    )
+
+
+def chunk_hashes_query(plan: dict) -> sql.Composed:
+    """Row count and md5 of every chunk, rows hashed in key order."""
+    order = (
+        sql.SQL(", ").join(sql.Identifier("_t", c) for c in plan["primary_key"])
+        if plan["primary_key"]
+        else sql.SQL("md5({})").format(_row_text(plan))
+    )
+    return sql.SQL(
+        "SELECT {chunk}, count(*), md5(string_agg(md5({row}), '' ORDER BY {order})) "
+        "FROM {table} _t GROUP BY 1"
+    ).format(
+        chunk=_chunk_expression(plan),
+        row=_row_text(plan),
+        order=order,
+        table=sql.Identifier(plan["table"]),
+    )
+
+
+def chunk_rows_query(plan: dict, chunks: list[int]) -> sql.Composed:
+    """Key (or a preview of keyless rows) and md5 of every row in `chunks`."""
+    if plan["bounds"]:
+        key = sql.Identifier("_t", plan["primary_key"][0])
+        ranges = []
+        for chunk in chunks:
+            # width_bucket puts b[k] <= key < b[k + 1] in chunk k; past either
+            # end the subscript is NULL, which the planner folds away, so each
+            # range stays an index range
+            lower, upper = (
+                sql.SQL("({})[{}]").format(_bounds(plan), sql.Literal(k))
+                for k in (chunk, chunk + 1)
+            )
+            ranges.append(
+                sql.SQL(
+                    "(({k} >= {lo} OR {lo} IS NULL) AND ({k} < {hi} OR {hi} IS NULL))"
+                ).format(k=key, lo=lower, hi=upper)
+            )
+        where = sql.SQL(" OR ").join(ranges)
+    else:
+        where = sql.SQL("{} = ANY(%(chunks)s)").format(_chunk_expression(plan))
+    key_text = (
+        _key_text(plan)
+        if plan["primary_key"]
+        else sql.SQL("left({}, {})").format(
+            _row_text(plan), sql.Literal(COMPACT_VALUE_CHARS)
+        )
+    )
+    return sql.SQL("SELECT {}, md5({}) FROM {} _t WHERE {}").format(
+        key_text, _row_text(plan), sql.Identifier(plan["table"]), where
+    )
+
+
+def compare_rows(plan: dict, current_rows, baseline_rows) -> dict[str, list[str]]:
+    """Inserted, updated and deleted rows of the drilled down chunks."""
+    if plan["primary_key"]:
+        now, before = dict(current_rows), dict(baseline_rows)
+        return {
+            "inserted": sorted(now.keys() - before.keys()),
+            "updated": sorted(
+                k for k in now.keys() & before.keys() if now[k] != before[k]
+            ),
+            "deleted": sorted(before.keys() - now.keys()),
+        }
+    # Without a key a changed row is one row removed and one added
+    previews = {h: preview for preview, h in [*baseline_rows, *current_rows]}
+    added = Counter(h for _, h in current_rows) - Counter(h for _, h in baseline_rows)
+    removed = Counter(h for _, h in baseline_rows) - Counter(h for _, h in current_rows)
+    return {
+        "inserted": [previews[h] for h in added.elements()],
+        "updated": [],
+        "deleted": [previews[h] for h in removed.elements()],
+    }
+
+
+def print_table_diff(plan: dict, changes: dict, chunks: int, differing: int) -> None:
+    counts = ", ".join(
+        f"{len(rows):,} {kind}" for kind, rows in changes.items() if rows
+    )
+    key = ", ".join(plan["primary_key"]) or "row"
+    console.print(
+        f"[bold]{escape(plan['table'])}[/bold]: {counts or 'no row changes'} "
+        f"[dim]({differing}/{chunks} chunks differed)[/dim]"
+    )
+    styles = {"inserted": "green", "updated": "yellow", "deleted": "red"}
+    for kind, rows in changes.items():
+        if not rows:
+            continue
+        shown = ", ".join(rows[:DIFF_MAX_KEYS])
+        more = (
+            f" and {len(rows) - DIFF_MAX_KEYS:,} more"
+            if len(rows) > DIFF_MAX_KEYS
+            else ""
+        )
+        console.print(
+            f"  [{styles[kind]}]{kind}[/{styles[kind]}] {escape(key)} "
+            f"{escape(shown)}{more}",
+            no_wrap=True,
+            overflow="ellipsis",
+        )
+
+
+def diff_data(
+    plans: list[dict], current_db: str, baseline_db: str, workers: int
+) -> None:
+    """Hash every table's chunks on both sides in parallel, then read back the
+    rows of the chunks that differ. Results are printed table by table."""
+    sides = {"current": current_db, "baseline": baseline_db}
+    idle = {side: queue.Queue() for side in sides}
+    size = min(workers, len(plans))
+    # Opened inside the try below, so a failed open still closes the others
+    connections = []
+
+    def run(side, query, params):
+        connection = idle[side].get()
+        try:
+            with connection.cursor() as cur:
+                cur.execute(query, params)
+                return cur.fetchall()
+        finally:
+            idle[side].put(connection)
+
+    def submit(stage, plan, query, params):
+        for side in sides:
+            futures[pool.submit(run, side, query, params)] = (
+                stage,
+                plan["table"],
+                side,
+            )
+
+    results, futures = {}, {}
+    identical, finished, started = 0, 0, time.monotonic()
+    pool = ThreadPoolExecutor(max_workers=size * len(sides))
+    try:
+        for side, dbname in sides.items():
+            for _ in range(size):
+                connection = db.open_connection(dbname, read_only=True)
+                connections.append(connection)
+                connection.set_session(readonly=True, autocommit=True)
+                idle[side].put(connection)
+        with console.status(f"Hashing {len(plans)} tables...") as status:
+            by_table = {plan["table"]: plan for plan in plans}
+            for plan in plans:
+                submit(
+                    "chunks", plan, chunk_hashes_query(plan), {"bounds": plan["bounds"]}
+                )
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, table, side = futures.pop(future)
+                    plan = by_table[table]
+                    try:
+                        results[stage, table, side] = future.result()
+                    except psycopg2.Error as e:
+                        results[stage, table, side] = None
+                        print(f"{YELLOW}Diffing {table} failed: {e}{RESET}")
+                    other = "baseline" if side == "current" else "current"
+                    if (stage, table, other) not in results:
+                        continue
+                    current = results[stage, table, "current"]
+                    baseline = results[stage, table, "baseline"]
+                    if current is None or baseline is None:
+                        finished += 1
+                        continue
+                    if stage == "chunks":
+                        now = {c: (n, h) for c, n, h in current}
+                        before = {c: (n, h) for c, n, h in baseline}
+                        differing = sorted(
+                            c
+                            for c in now.keys() | before.keys()
+                            if now.get(c) != before.get(c)
+                        )
+                        plan["chunk_count"] = len(now.keys() | before.keys())
+                        plan["differing"] = len(differing)
+                        if not differing:
+                            identical += 1
+                            finished += 1
+                            continue
+                        submit(
+                            "rows",
+                            plan,
+                            chunk_rows_query(plan, differing),
+                            {"bounds": plan["bounds"], "chunks": differing},
+                        )
+                    else:
+                        finished += 1
+                        print_table_diff(
+                            plan,
+                            compare_rows(plan, current, baseline),
+                            plan["chunk_count"],
+                            plan["differing"],
+                        )
+                status.update(
+                    f"Diffing... {finished}/{len(plans)} tables, "
+                    f"{time.monotonic() - started:.1f}s"
+                )
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        for connection in connections:
+            connection.cancel()
+        print(f"{YELLOW}Diff cancelled.{RESET}")
+        return
+    finally:
+        pool.shutdown(wait=True)
+        for connection in connections:
+            connection.close()
+    print(
+        f"{YELLOW}{identical} of {len(plans)} tables identical "
+        f"({time.monotonic() - started:.2f}s).{RESET}"
+    )
+
+
+def run_diff_command(command: str, workers: int = DIFF_WORKERS) -> None:
+    """Handle ``\\diff [table ...]``: schema and data changes since the baseline."""
+    names = command.rstrip(";").split()[1:]
+    baseline = pick_baseline(db.DBNAME)
+    if not baseline:
+        raise ValueError(
+            f"'{db.DBNAME}' has no baseline, create one from the database menu"
+        )
+
+    with closing(db.open_connection(baseline, read_only=True)) as baseline_conn:
+        baseline_conn.set_session(readonly=True, autocommit=True)
+        current_cur, baseline_cur = db.conn.cursor(), baseline_conn.cursor()
+        if not names:
+            print_schema_diff(diff_schema(current_cur, baseline_cur), baseline)
+        current, before = table_layouts(current_cur), table_layouts(baseline_cur)
+
+    tables = sorted(current.keys() & before.keys())
+    if names:
+        missing = set(names) - set(tables)
+        if missing:
+            raise ValueError(f"Not in both databases: {', '.join(sorted(missing))}")
+        tables = names
+    plans = [plan_table(t, current[t], before[t], db.conn.cursor()) for t in tables]
+    plans = [plan for plan in plans if plan["columns"]]
+    if plans:
+        diff_data(plans, db.DBNAME, baseline, workers)
@@ -2,6 +2,7 @@ from rich.console import Console
 
 from . import db
 from .models import OutputData
+from .profiler import tracer
 
 console = Console()
 
@@ -15,4 +16,5 @@ def run(command) -> OutputData:
 def parse_meta_output(data: OutputData) -> None:
     """Render a meta-command OutputData model to the terminal."""
     if data.output:
-        console.print(data.output)
+        with tracer.span("render.meta"):
+            console.print(data.output)
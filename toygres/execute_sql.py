@@ -3,11 +3,20 @@ from rich.table import Table
 from rich import box
 
 from . import db
-from .constants import PG_TYPES
-from .models import ColumnMeta, OutputData
+from . import projection
+from .constants import FAST_RENDER_ROW_THRESHOLD, PG_TYPES
+from .models import OutputData, SqlResult
+from .pager import render_fast
+from .profiler import tracer
 
 console = Console()
 
+# \compact: wide columns are cut server-side before they are transferred
+compact = False
+# Last query run() compacted, for \full <row> <column>; only those are
+# row returning queries that were wrapped in a subquery successfully
+last_query = ""
+
 
 def truncate(value, max_len: int | None = 45) -> tuple[str, bool]:
     """Middle-truncate a string.
@@ -50,46 +59,52 @@ def _pretty_status(status: str) -> str | None:
             return status.lower()
 
 
-def run_read_only(sql) -> OutputData:
-    """Execute SQL and return a structured SqlOutputData model."""
+def run_read_only(sql) -> SqlResult:
+    """Execute SQL and return a SqlResult."""
+    description, rows, status = db.executeSQL(sql)
+    return SqlResult.from_cursor(description, rows, status)
+
+
+def run(sql) -> SqlResult:
+    """Execute SQL and return a SqlResult (OutputData interface, no validation)."""
+    global last_query
+    last_query = ""
+    original = None
+    if compact:
+        with tracer.span("execute_sql.compact"):
+            rewritten = projection.compact_query(sql)
+        if rewritten:
+            last_query = sql
+            sql, original = rewritten
     description, rows, status = db.executeSQL(sql)
 
-    col_meta = []
-    if description:
-        for col in description:
-            col_meta.append(ColumnMeta(name=col.name, type_code=col.type_code))
-
-    serialised_rows = [list(row) for row in rows] if rows else []
-
-    return OutputData(
-        type="sql",
-        description=col_meta,
-        rows=serialised_rows,
-        status=status or "",
-    )
-
+    with tracer.span("execute_sql.build_output"):
+        result = SqlResult.from_cursor(description, rows, status)
+    if original:
+        # Compacted columns come back as text, show their real types
+        for col, orig in zip(result.description, original):
+            col.type_code = orig.type_code
+    return result
 
-def run(sql) -> OutputData:
-    """Execute SQL and return a structured SqlOutputData model."""
-    description, rows, status = db.executeSQL(sql)
 
-    col_meta = []
-    if description:
-        for col in description:
-            col_meta.append(ColumnMeta(name=col.name, type_code=col.type_code))
+def show_full_value(command: str) -> None:
+    """Handle ``\\full <row> <column>``: one cell of the last result, uncut."""
+    parts = command.rstrip(";").split(None, 2)
+    if len(parts) < 3 or not parts[1].isdigit() or int(parts[1]) < 1:
+        raise ValueError("Usage: \\full <row number> <column>")
+    if not last_query:
+        raise ValueError("The last result wasn't compacted, nothing to fetch")
+    value = projection.fetch_full_value(last_query, int(parts[1]), parts[2].strip('"'))
+    console.print(projection.format_full_value(value), markup=False, highlight=False)
 
-    serialised_rows = [list(row) for row in rows] if rows else []
 
-    return OutputData(
-        type="sql",
-        description=col_meta,
-        rows=serialised_rows,
-        status=status or "",
-    )
+def parse_sql_output(data: OutputData | SqlResult) -> None:
+    """Render a SQL result to the terminal using Rich."""
+    with tracer.span("render.sql"):
+        _render_sql_output(data)
 
 
-def parse_sql_output(data: OutputData) -> None:
-    """Render a SqlOutputData model to the terminal using Rich."""
+def _render_sql_output(data: OutputData | SqlResult) -> None:
     msg = _pretty_status(data.status)
     if msg:
         console.print(f"[green]✓[/green] {msg}")
@@ -100,6 +115,11 @@ def parse_sql_output(data: OutputData) -> None:
         # Otherwise, don't truncate
         max_len = None if num_cols <= 2 else 45
 
+        if len(data.rows) > FAST_RENDER_ROW_THRESHOLD:
+            # Building a Rich table for tens of thousands of rows takes ages
+            render_fast(data, max_len, title=msg or "")
+            return
+
         table = Table(box=box.ROUNDED, show_header=True, header_style="bold #ECE7D1")
         for col in data.description:
             type_name = PG_TYPES.get(col.type_code, f"oid:{col.type_code}")
@@ -1,13 +1,51 @@
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import psycopg2
 import questionary
+from psycopg2 import sql
 from rich.console import Console
 from rich.table import Table
 from rich import box
 
-from . import db
-from .constants import YELLOW, RESET, PG_TYPES, MAX_EXPLORE_COLUMNS_BEFORE_WARNING
+from . import db, projection
+from .constants import (
+    YELLOW,
+    RESET,
+    PG_TYPES,
+    MAX_EXPLORE_COLUMNS_BEFORE_WARNING,
+    EXPLORE_COUNT_WORKERS,
+    EXPLORE_SAMPLE_ROWS,
+    EXPLORE_BERNOULLI_MAX_ROWS,
+    COMPACT_VALUE_CHARS,
+)
+from .utils import human_bytes
 
 console = Console()
 
+COUNT_ROWS = "≡ Count rows exactly"
+
+# Sizes, estimates and maintenance info of every table in one catalog query
+TABLE_STATS_QUERY = """
+    SELECT c.relname,
+           c.reltuples,
+           pg_total_relation_size(c.oid),
+           pg_relation_size(c.oid),
+           pg_indexes_size(c.oid),
+           coalesce(pg_total_relation_size(nullif(c.reltoastrelid, 0)), 0),
+           s.n_live_tup,
+           s.n_dead_tup,
+           greatest(s.last_vacuum, s.last_autovacuum),
+           greatest(s.last_analyze, s.last_autoanalyze)
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+"""
+
 
 def get_tables():
     query = "SELECT table_name FROM information_schema.tables WHERE table_schema = 'public' AND table_type = 'BASE TABLE';"
@@ -46,6 +84,227 @@ def get_primary_keys(table_name):
         return []
 
 
+def get_table_stats():
+    keys = (
+        "estimate", "total", "heap", "indexes", "toast",
+        "live", "dead", "vacuumed", "analyzed",
+    )  # fmt: skip
+    try:
+        _, rows, _ = db.executeSQL(TABLE_STATS_QUERY)
+    except Exception:
+        return {}
+    stats = {}
+    for name, *values in rows or []:
+        entry = dict(zip(keys, values))
+        # reltuples is -1 until the first VACUUM/ANALYZE, fall back to the
+        # live tuple counter
+        if entry["estimate"] < 0:
+            entry["estimate"] = entry["live"]
+        stats[name] = entry
+    return stats
+
+
+def _ago(when) -> str:
+    if when is None:
+        return "never"
+    seconds = (datetime.now(timezone.utc) - when).total_seconds()
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= size:
+            return f"{seconds // size:.0f}{unit} ago"
+    return "just now"
+
+
+def _rows(stats: dict, exact: dict, name: str) -> str:
+    if name in exact:
+        return f"{exact[name]:,}"
+    estimate = stats.get(name, {}).get("estimate")
+    return "?" if estimate is None else f"~{estimate:,.0f}"
+
+
+def print_table_stats(stats: dict, exact: dict) -> None:
+    table = Table(
+        box=box.ROUNDED,
+        header_style="bold #ECE7D1",
+        title="Tables (~ catalog estimate)",
+    )
+    table.add_column("table")
+    for column in ("rows", "total", "heap", "indexes", "toast", "dead"):
+        table.add_column(column, justify="right", no_wrap=True)
+    table.add_column("vacuumed", no_wrap=True)
+    table.add_column("analyzed", no_wrap=True)
+
+    for name, entry in sorted(stats.items(), key=lambda kv: -kv[1]["total"]):
+        live, dead = entry["live"] or 0, entry["dead"] or 0
+        ratio = dead / (live + dead) if live + dead else 0
+        table.add_row(
+            name,
+            _rows(stats, exact, name),
+            human_bytes(entry["total"]),
+            human_bytes(entry["heap"]),
+            human_bytes(entry["indexes"]),
+            human_bytes(entry["toast"]),
+            f"[red]{ratio:.0%}[/red]" if ratio >= 0.2 else f"{ratio:.0%}",
+            _ago(entry["vacuumed"]),
+            _ago(entry["analyzed"]),
+        )
+    console.print(table)
+
+
+def count_rows(tables, workers: int = EXPLORE_COUNT_WORKERS) -> dict:
+    """Exact ``count(*)`` of each table, several tables at a time.
+
+    Ctrl+C cancels the running counts on the server and returns what
+    finished so far.
+    """
+    size = min(workers, len(tables))
+    # Opened inside the try below, so a failed open still closes the others
+    connections, idle, counts = [], [], {}
+
+    def count(table):
+        connection = idle.pop()
+        try:
+            with connection.cursor() as cur:
+                cur.execute(
+                    sql.SQL("SELECT count(*) FROM {}").format(sql.Identifier(table))
+                )
+                return cur.fetchone()[0]
+        finally:
+            idle.append(connection)
+
+    started = time.monotonic()
+    pool = ThreadPoolExecutor(max_workers=size)
+    try:
+        for _ in range(size):
+            connections.append(db.open_connection(db.DBNAME))
+        idle.extend(connections)
+        with console.status(f"Counting rows of {len(tables)} tables...") as status:
+            futures = {pool.submit(count, t): t for t in tables}
+            for future in as_completed(futures):
+                try:
+                    counts[futures[future]] = future.result()
+                except psycopg2.Error as e:
+                    print(f"{YELLOW}Counting {futures[future]} failed: {e}{RESET}")
+                status.update(
+                    f"Counting rows... {len(counts)}/{len(tables)} tables, "
+                    f"{time.monotonic() - started:.1f}s"
+                )
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        for connection in connections:
+            connection.cancel()
+        print(f"{YELLOW}Counting cancelled, {len(counts)} table(s) counted.{RESET}")
+    finally:
+        pool.shutdown(wait=True)
+        for connection in connections:
+            connection.close()
+    return counts
+
+
+def fetch_sample(table: str, columns, estimate: float, seed: int):
+    """About EXPLORE_SAMPLE_ROWS random rows of `table`, the same ones for the same seed,
+    with their tableoid and ctid in front and wide `columns` compacted.
+
+    Small tables use BERNOULLI (every row has the same chance, but the whole
+    table is scanned); above EXPLORE_BERNOULLI_MAX_ROWS SYSTEM picks whole
+    random pages instead, so the cost stays the same however big the table is.
+    """
+    method = "BERNOULLI" if estimate <= EXPLORE_BERNOULLI_MAX_ROWS else "SYSTEM"
+    percent = min(100.0, EXPLORE_SAMPLE_ROWS * 100 / estimate) if estimate else 100.0
+    query = sql.SQL(
+        "SELECT tableoid, ctid::text, {} FROM {} TABLESAMPLE {} ({}) REPEATABLE ({}) LIMIT {}"
+    ).format(
+        projection.select_list(columns),
+        sql.Identifier(table),
+        sql.SQL(method),
+        sql.Literal(percent),
+        sql.Literal(seed),
+        # Only a safety net, cutting the sample short would favour early pages
+        sql.Literal(EXPLORE_SAMPLE_ROWS * 2),
+    )
+    description, rows, _ = db.executeSQL(query)
+    return description, rows, f"{method} {percent:.4g}%"
+
+
+def get_column_stats(table_name):
+    """n_distinct per column from pg_stats, as a count (negative means a
+    fraction of the rows there)."""
+    query = """
+        SELECT s.attname, s.n_distinct, c.reltuples
+        FROM pg_stats s
+        JOIN pg_class c ON c.relname = s.tablename
+        JOIN pg_namespace n ON n.oid = c.relnamespace AND n.nspname = s.schemaname
+        WHERE s.schemaname = 'public' AND s.tablename = %s
+    """
+    try:
+        cur = db.conn.cursor()
+        cur.execute(query, (table_name,))
+        return {
+            name: n_distinct if n_distinct >= 0 else -n_distinct * max(reltuples, 0)
+            for name, n_distinct, reltuples in cur.fetchall()
+        }
+    except Exception:
+        return {}
+
+
+def _profile_value(value) -> str:
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return truncate_value(value, is_pk=False, max_len=24)
+
+
+def print_column_profile(table_name, description, rows, method, catalog) -> None:
+    """Null fraction, min/max and top values of the sample, with pg_stats'
+    distinct estimate for the whole table.
+
+    `catalog` holds the table's column types; the sample's wide columns were
+    compacted, so values that were cut are left out of min/max.
+    """
+    types = {name: (typname, category) for name, typname, category in catalog}
+    distinct = get_column_stats(table_name)
+    table = Table(
+        box=box.ROUNDED,
+        header_style="bold #ECE7D1",
+        title=f"Column profile of {len(rows):,} sampled rows ({method})",
+    )
+    for column in ("column", "nulls", "distinct", "min", "max", "top values"):
+        table.add_column(column, no_wrap=column != "top values")
+
+    for j, col in enumerate(description):
+        values = [row[j] for row in rows if row[j] is not None]
+        nulls = 1 - len(values) / len(rows)
+        typname, category = types.get(col.name, ("", ""))
+        ordered = values
+        if projection.is_compacted(typname, category):
+            # Cut values can't be compared, only plain text that wasn't cut
+            # still keeps its order and identity
+            ordered = [
+                v for v in values if category == "S" and len(v) <= COMPACT_VALUE_CHARS
+            ]
+        try:
+            low, high = _profile_value(min(ordered)), _profile_value(max(ordered))
+        except (TypeError, ValueError):
+            # Empty, or a type without ordering (json, dicts, ...)
+            low = high = "-"
+        top = Counter(_profile_value(v) for v in ordered).most_common(3)
+        # A value seen once in the sample says nothing about the column
+        top = [(v, count) for v, count in top if count > 1]
+        n_distinct = distinct.get(col.name)
+        table.add_row(
+            f"{col.name}\n[dim]{typname or PG_TYPES.get(col.type_code, f'oid:{col.type_code}')}[/dim]",
+            f"[red]{nulls:.0%}[/red]" if nulls >= 0.5 else f"{nulls:.0%}",
+            "?" if n_distinct is None else f"~{n_distinct:,.0f}",
+            low,
+            high,
+            ", ".join(f"{v} [dim]({count / len(rows):.0%})[/dim]" for v, count in top)
+            or "[dim]no repeats[/dim]",
+        )
+    console.print(table)
+    if not distinct:
+        print(
+            f"{YELLOW}No pg_stats yet, run ANALYZE {table_name} for distinct estimates.{RESET}"
+        )
+
+
 def truncate_value(value, is_pk: bool, max_len: int = 30) -> str:
     s = str(value)
     if is_pk or len(s) <= max_len:
@@ -56,6 +315,10 @@ def truncate_value(value, is_pk: bool, max_len: int = 30) -> str:
 
 
 def explore_database():
+    # Exact counts asked for during this visit, shown instead of estimates
+    exact = {}
+    # Fixed for the visit, so reopening a table shows the same random sample
+    seed = random.randrange(1_000_000)
     while True:
         tables = get_tables()
         views = get_views()
@@ -64,13 +327,28 @@ def explore_database():
             print(f"{YELLOW}No tables or views found in this database.{RESET}")
             return
 
+        stats = get_table_stats()
+        if stats:
+            print_table_stats(stats, exact)
+
         choices = []
         if tables:
             choices.append(questionary.Separator("--- Tables ---"))
-            choices.extend(tables)
+            width = max(len(t) for t in tables)
+            for t in tables:
+                size = human_bytes(stats[t]["total"]) if t in stats else ""
+                choices.append(
+                    questionary.Choice(
+                        f"{t:<{width}}  {_rows(stats, exact, t):>14} rows  {size:>9}",
+                        value=t,
+                    )
+                )
         if views:
             choices.append(questionary.Separator("--- Views ---"))
             choices.extend(views)
+        if tables:
+            choices.append(questionary.Separator())
+            choices.append(COUNT_ROWS)
 
         print(
             f"\n{YELLOW}(Press Ctrl+C at any time to go back to the main menu){RESET}"
@@ -86,14 +364,56 @@ def explore_database():
         if not selected_table:
             return
 
-        # Fetch data up to 100 rows
-        query = f'SELECT * FROM "{selected_table}" LIMIT 100;'
+        if selected_table == COUNT_ROWS:
+            exact.update(count_rows(tables))
+            continue
+
+        is_view = selected_table in views
+        preview = "First 100 rows"
+        if not is_view:
+            preview = questionary.select(
+                "Preview:",
+                choices=["First 100 rows", "Random sample with column profile"],
+            ).ask()
+            if not preview:
+                continue
+
+        sample = None
         try:
-            description, rows, _ = db.executeSQL(query)
+            catalog = projection.table_columns(selected_table)
+            if preview == "First 100 rows":
+                # Wide values are cut server-side, views have no ctid to
+                # fetch them in full by; partitions of a parent can share a
+                # ctid, so the tableoid goes with it
+                query = sql.SQL("SELECT {}{} FROM {} LIMIT 100").format(
+                    sql.SQL("") if is_view else sql.SQL("tableoid, ctid::text, "),
+                    projection.select_list(catalog),
+                    sql.Identifier(selected_table),
+                )
+                description, rows, _ = db.executeSQL(query)
+                title = f"Table: {selected_table} (showing up to 100 rows)"
+            else:
+                estimate = stats.get(selected_table, {}).get("estimate") or 0
+                description, sample, method = fetch_sample(
+                    selected_table, catalog, estimate, seed
+                )
+                rows = random.Random(seed).sample(sample, min(100, len(sample)))
+                title = (
+                    f"Table: {selected_table} ({len(rows)} random rows, "
+                    f"{method}, seed {seed})"
+                )
         except Exception as e:
             print(f"Error fetching data for table {selected_table}: {e}")
             continue
 
+        ctids = []
+        if description and not is_view:
+            description = description[2:]
+            ctids = [row[:2] for row in rows]
+            rows = [row[2:] for row in rows]
+            if sample:
+                sample = [row[2:] for row in sample]
+
         if not description:
             print(f"{YELLOW}No columns found for {selected_table}.{RESET}")
             continue
@@ -129,20 +449,24 @@ def explore_database():
             box=box.ROUNDED,
             show_header=True,
             header_style="bold #ECE7D1",
-            title=f"Table: {selected_table} (showing up to 100 rows)",
+            title=title,
         )
 
+        # Compacted columns come back as text, show the table's own types
+        types = {name: typname for name, typname, _ in catalog}
+        if ctids:
+            table.add_column("#", style="dim", justify="right")
         for col in description:
-            type_name = PG_TYPES.get(col.type_code, f"oid:{col.type_code}")
+            type_name = types.get(col.name) or PG_TYPES.get(
+                col.type_code, f"oid:{col.type_code}"
+            )
             pk_marker = "🔑 " if col.name in pks else ""
             table.add_column(
                 f"{pk_marker}{col.name}\n[dim]{type_name}[/dim]", overflow="fold"
             )
 
-        is_view = selected_table in views
-
-        for row in rows:
-            cells = []
+        for i, row in enumerate(rows, 1):
+            cells = [str(i)] if ctids else []
             for j, val in enumerate(row):
                 if val is None:
                     cells.append("[bold red]NULL[/bold red]")
@@ -156,6 +480,8 @@ def explore_database():
             table.add_row(*cells)
 
         console.print(table)
+        if sample:
+            print_column_profile(selected_table, description, sample, method, catalog)
 
         if too_many_cols or too_many_rows:
             warnings = []
@@ -173,3 +499,45 @@ def explore_database():
             print(
                 f"{YELLOW}   Consider using SQL views with only the specific data you care about for concise information.{RESET}\n"
             )
+
+        wide = [
+            name
+            for name, typname, cat in catalog
+            if projection.is_compacted(typname, cat)
+        ]
+        if ctids and wide:
+            show_full_values(selected_table, ctids, wide)
+
+
+def show_full_values(table_name, ctids, columns) -> None:
+    """Fetch single cells of the preview in full, by row number and column."""
+    while True:
+        action = questionary.select(
+            "Next:", choices=["Show a full value", "Back to tables"]
+        ).ask()
+        if action != "Show a full value":
+            return
+        row = questionary.text(
+            f"Row # (1-{len(ctids)}):",
+            validate=lambda v: v.isdigit() and 1 <= int(v) <= len(ctids),
+        ).ask()
+        if row is None:
+            return
+        column = (
+            columns[0]
+            if len(columns) == 1
+            else questionary.select("Column:", choices=columns).ask()
+        )
+        if column is None:
+            return
+        try:
+            value = projection.fetch_cell_by_ctid(
+                table_name, *ctids[int(row) - 1], column
+            )
+        except Exception as e:
+            print(f"{YELLOW}Could not fetch the value: {e}{RESET}")
+            continue
+        if value is None:
+            console.print("[bold red]NULL[/bold red]")
+        else:
+            console.print(projection.format_full_value(value), markup=False)
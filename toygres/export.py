@@ -0,0 +1,267 @@
+import io
+import os
+import time
+from abc import ABC, abstractmethod
+
+from psycopg2 import sql as pgsql
+from rich.console import Console
+
+from . import db
+from .constants import EXPORT_PARQUET_BATCH_ROWS
+from .utils import human_bytes
+
+console = Console()
+
+
+class ExportWriter(ABC):
+    """Destination format for ``\\export``.
+
+    A writer decides which ``COPY (query) TO STDOUT`` statement to run and
+    receives the COPY stream chunk by chunk through ``write``, so nothing but
+    the current chunk is ever held in memory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = 0
+
+    @abstractmethod
+    def copy_sql(self, query: str) -> str:
+        """The ``COPY ... TO STDOUT`` statement exporting `query`."""
+
+    def open(self) -> None:
+        self.file = open(self.path, "wb")
+
+    def write(self, data: bytes) -> None:
+        self.file.write(data)
+        self.rows += data.count(b"\n")
+
+    def close(self) -> None:
+        self.file.close()
+
+    def abort(self) -> None:
+        """Close after a failed export, without writing anything still buffered."""
+        self.file.close()
+
+
+class CsvWriter(ExportWriter):
+    def copy_sql(self, query: str) -> str:
+        return f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+
+
+class TsvWriter(ExportWriter):
+    def copy_sql(self, query: str) -> str:
+        return (
+            f"COPY ({query}) TO STDOUT WITH (FORMAT csv, DELIMITER E'\\t', HEADER true)"
+        )
+
+
+def _jsonl_copy_sql(query: str) -> str:
+    """COPY statement streaming `query` as one JSON document per line."""
+    # row_to_json escapes control characters inside strings, so with quote
+    # and delimiter characters that can never appear, csv mode emits each
+    # document verbatim (text mode would backslash-escape it). Raw line
+    # breaks can only be whitespace kept from json columns, and become
+    # spaces so every document stays on one line.
+    return (
+        f"COPY (SELECT translate(row_to_json(_q)::text, E'\\n\\r', '  ') "
+        f"FROM ({query}) _q) TO STDOUT "
+        "WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')"
+    )
+
+
+class JsonlWriter(ExportWriter):
+    def copy_sql(self, query: str) -> str:
+        return _jsonl_copy_sql(query)
+
+
+# PostgreSQL type code -> pyarrow type factory name, everything else is exported as text.
+# Dates and floats are sent as JSON strings and cast after parsing: the JSON
+# reader can't parse dates, and NaN/Infinity aren't JSON numbers.
+_ARROW_TYPES = {
+    16: "bool_",
+    20: "int64",
+    21: "int16",
+    23: "int32",
+    700: "float32",
+    701: "float64",
+    1082: "date32",
+    1114: "timestamp",
+    1184: "timestamp",
+}
+
+
+class ParquetWriter(ExportWriter):
+    """Columnar export through pyarrow (optional dependency).
+
+    The query is streamed as JSON lines and converted to Parquet row groups
+    of EXPORT_PARQUET_BATCH_ROWS rows, with a schema taken from the query's
+    result columns so every row group agrees.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise RuntimeError(
+                "Parquet export needs pyarrow, install it with `uv add pyarrow`."
+            )
+        self._pending = bytearray()
+        self._lines = 0
+
+    def copy_sql(self, query: str) -> str:
+        import pyarrow as pa
+
+        description, _, _ = db.executeSQL(f"SELECT * FROM ({query}) _q LIMIT 0")
+        fields, read_fields, projection = [], [], []
+        for col in description:
+            ident = pgsql.Identifier(col.name).as_string(db.conn)
+            factory = _ARROW_TYPES.get(col.type_code)
+            if factory == "timestamp":
+                tz = "UTC" if col.type_code == 1184 else None
+                field = pa.field(col.name, pa.timestamp("us", tz=tz))
+                # ±infinity has no Parquet equivalent
+                projection.append(
+                    f"CASE WHEN isfinite({ident}) THEN {ident} END AS {ident}"
+                )
+            elif factory == "date32":
+                field = pa.field(col.name, pa.date32())
+                read_fields.append(pa.field(col.name, pa.string()))
+                projection.append(
+                    f"CASE WHEN isfinite({ident}) THEN {ident}::text END AS {ident}"
+                )
+            elif factory in ("float32", "float64"):
+                field = pa.field(col.name, getattr(pa, factory)())
+                read_fields.append(pa.field(col.name, pa.string()))
+                projection.append(f"{ident}::text AS {ident}")
+            elif factory:
+                field = pa.field(col.name, getattr(pa, factory)())
+                projection.append(ident)
+            else:
+                field = pa.field(col.name, pa.string())
+                projection.append(f"{ident}::text AS {ident}")
+            fields.append(field)
+            if len(read_fields) < len(fields):
+                read_fields.append(field)
+        self.schema = pa.schema(fields)
+        # What the JSON reader parses, cast to self.schema afterwards
+        self.read_schema = pa.schema(read_fields)
+
+        select = f"SELECT {', '.join(projection)} FROM ({query}) _q"
+        return _jsonl_copy_sql(select)
+
+    def open(self) -> None:
+        import pyarrow.parquet as pq
+
+        self.file = pq.ParquetWriter(self.path, self.schema)
+
+    def write(self, data: bytes) -> None:
+        self._pending += data
+        lines = data.count(b"\n")
+        self._lines += lines
+        self.rows += lines
+        if self._lines >= EXPORT_PARQUET_BATCH_ROWS:
+            self._flush()
+
+    def _flush(self) -> None:
+        from pyarrow import json as pa_json
+
+        if not self._pending:
+            return
+        table = pa_json.read_json(
+            io.BytesIO(bytes(self._pending)),
+            parse_options=pa_json.ParseOptions(explicit_schema=self.read_schema),
+        )
+        self.file.write_table(table.select(self.schema.names).cast(self.schema))
+        self._pending.clear()
+        self._lines = 0
+
+    def close(self) -> None:
+        try:
+            self._flush()
+        finally:
+            self.file.close()
+
+    def abort(self) -> None:
+        self._pending.clear()
+        self.file.close()
+
+
+# File extension -> writer; register new formats here
+WRITERS: dict[str, type[ExportWriter]] = {
+    ".csv": CsvWriter,
+    ".tsv": TsvWriter,
+    ".jsonl": JsonlWriter,
+    ".ndjson": JsonlWriter,
+    ".parquet": ParquetWriter,
+}
+
+
+class _ProgressSink:
+    """File-like object handed to copy_expert, reporting progress as data flows."""
+
+    def __init__(self, writer: ExportWriter, status):
+        self.writer = writer
+        self.status = status
+        self.bytes = 0
+        self.started = time.monotonic()
+        self._last_update = 0.0
+
+    def write(self, data) -> int:
+        if isinstance(data, str):
+            data = data.encode()
+        self.writer.write(data)
+        self.bytes += len(data)
+        now = time.monotonic()
+        if now - self._last_update > 0.2:
+            self._last_update = now
+            rate = self.bytes / max(now - self.started, 1e-6)
+            self.status.update(
+                f"Exporting to {self.writer.path}: ~{self.writer.rows:,} rows, "
+                f"{human_bytes(self.bytes)} ({human_bytes(rate)}/s)"
+            )
+        return len(data)
+
+
+def export(path: str, query: str) -> str:
+    """Stream the result of `query` into `path`, the format picked by extension."""
+    query = query.strip().rstrip(";")
+    ext = os.path.splitext(path)[1].lower()
+    writer_cls = WRITERS.get(ext)
+    if writer_cls is None:
+        raise ValueError(
+            f"Unsupported export format '{ext}', use one of: {', '.join(WRITERS)}"
+        )
+
+    writer = writer_cls(path)
+    copy_sql = writer.copy_sql(query)
+    writer.open()
+    started = time.monotonic()
+    try:
+        with console.status(f"Exporting to {path}...") as status:
+            sink = _ProgressSink(writer, status)
+            rows = db.copy_to(copy_sql, sink)
+        writer.close()
+    except BaseException:
+        # Don't leave a truncated file behind that looks like a finished export
+        try:
+            writer.abort()
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+    elapsed = time.monotonic() - started
+    return (
+        f"Exported {rows:,} rows to {path} "
+        f"({human_bytes(os.path.getsize(path))} in {elapsed:.1f}s)"
+    )
+
+
+def run_export_command(command: str) -> str:
+    """Handle ``\\export <file> <query>``."""
+    parts = command.split(None, 2)
+    if len(parts) < 3:
+        raise ValueError("Usage: \\export <file.csv|.tsv|.jsonl|.parquet> <query>")
+    return export(parts[1], parts[2])
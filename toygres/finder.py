@@ -0,0 +1,256 @@
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+import psycopg2
+from psycopg2 import sql
+from rich.console import Console
+from rich.markup import escape
+
+from . import db
+from .constants import (
+    COMPACT_VALUE_CHARS,
+    FIND_MAX_ROWS_PER_TABLE,
+    FIND_TABLE_TIMEOUT,
+    FIND_WORKERS,
+    RESET,
+    YELLOW,
+)
+
+console = Console()
+
+# Every column of the public tables, whether an index starts with it, and
+# the table's estimated size; partitions are searched through their parent
+_COLUMNS_SQL = """
+    SELECT c.relname, a.attname, t.typname,
+           EXISTS (SELECT 1 FROM pg_index i
+                   WHERE i.indrelid = c.oid AND i.indkey[0] = a.attnum),
+           c.reltuples
+    FROM pg_class c
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    JOIN pg_type t ON t.oid = a.atttypid
+    WHERE c.relnamespace = 'public'::regnamespace
+      AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+    ORDER BY c.relname, a.attnum
+"""
+
+_PRIMARY_KEYS_SQL = """
+    SELECT c.relname, array_agg(a.attname ORDER BY array_position(i.indkey::int2[], a.attnum))
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indrelid
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = ANY(i.indkey)
+    WHERE i.indisprimary AND c.relnamespace = 'public'::regnamespace
+    GROUP BY c.relname
+"""
+
+_TEXT_TYPES = {"text", "varchar", "bpchar", "citext", "name"}
+_INT_RANGES = {"int2": 2**15, "int4": 2**31, "int8": 2**63}
+_DECIMAL_TYPES = {"numeric", "float4", "float8", "money"}
+_TIMESTAMP_TYPES = {"timestamp", "timestamptz"}
+
+
+def _parse(value: str, parser):
+    try:
+        return parser(value)
+    except (ValueError, InvalidOperation):
+        return None
+
+
+def compatible(typname: str, value: str) -> bool:
+    """Whether `value` is a valid literal of the column type, so comparing
+    with it neither fails nor needs a cast that would skip the index."""
+    if typname in _TEXT_TYPES:
+        return True
+    if typname in _INT_RANGES:
+        limit = _INT_RANGES[typname]
+        return bool(re.fullmatch(r"-?\d+", value)) and -limit <= int(value) < limit
+    if typname in _DECIMAL_TYPES:
+        number = _parse(value, Decimal)
+        return number is not None and number.is_finite()
+    if typname == "uuid":
+        return _parse(value, uuid.UUID) is not None
+    if typname == "date":
+        return _parse(value, date.fromisoformat) is not None
+    if typname in _TIMESTAMP_TYPES:
+        return _parse(value, datetime.fromisoformat) is not None
+    return False
+
+
+def _condition(column: str, typname: str, value: str) -> sql.Composable:
+    ident = sql.Identifier(column)
+    if typname in _TIMESTAMP_TYPES and _parse(value, date.fromisoformat):
+        # A bare date finds the whole day, not just its midnight
+        return sql.SQL("({c} >= %(value)s::date AND {c} < %(value)s::date + 1)").format(
+            c=ident
+        )
+    # Left untyped, the literal takes the column's type and can use its index
+    return sql.SQL("{} = %(value)s").format(ident)
+
+
+def plan_searches(cur, value: str) -> tuple[list[dict], dict[str, list[str]]]:
+    """One search per table and kind of column: indexed columns of every table
+    first, then the columns that need a scan, smallest tables first."""
+    cur.execute(_COLUMNS_SQL)
+    tables = {}
+    for table, column, typname, indexed, estimate in cur.fetchall():
+        if not compatible(typname, value):
+            continue
+        entry = tables.setdefault(table, {"estimate": estimate, True: [], False: []})
+        entry[indexed].append((column, typname))
+    cur.execute(_PRIMARY_KEYS_SQL)
+    primary_keys = dict(cur.fetchall())
+
+    searches = [
+        {
+            "table": table,
+            "columns": entry[indexed],
+            "indexed": indexed,
+            "estimate": entry["estimate"],
+        }
+        for indexed in (True, False)
+        for table, entry in tables.items()
+        if entry[indexed]
+    ]
+    searches.sort(key=lambda s: (not s["indexed"], s["estimate"]))
+    return searches, primary_keys
+
+
+def search_query(search: dict, primary_key: list[str], value: str) -> sql.Composed:
+    """Rows of one table where any of the search's columns equals `value`,
+    with which columns matched, the row's key and a preview cut server-side."""
+    conditions = [_condition(c, t, value) for c, t in search["columns"]]
+    key = (
+        sql.SQL("concat_ws(', ', {})").format(
+            sql.SQL(", ").join(sql.Identifier(c) for c in primary_key)
+        )
+        if primary_key
+        else sql.SQL("ctid::text")
+    )
+    return sql.SQL(
+        "SELECT ARRAY[{}], {}, left(row_to_json(_t)::text, {}) "
+        "FROM {} _t WHERE {} LIMIT {}"
+    ).format(
+        sql.SQL(", ").join(
+            sql.SQL("coalesce({}, false)").format(c) for c in conditions
+        ),
+        key,
+        sql.Literal(COMPACT_VALUE_CHARS),
+        sql.Identifier(search["table"]),
+        sql.SQL(" OR ").join(conditions),
+        sql.Literal(FIND_MAX_ROWS_PER_TABLE + 1),
+    )
+
+
+def print_hit(search: dict, primary_key: list[str], matched, key, preview) -> None:
+    columns = [c for (c, _), hit in zip(search["columns"], matched) if hit]
+    key_name = ", ".join(primary_key) if primary_key else "ctid"
+    if len(preview) >= COMPACT_VALUE_CHARS:
+        preview += "..."
+    console.print(
+        f"[bold]{escape(search['table'])}[/bold].{escape(', '.join(columns))}  "
+        f"[cyan]{escape(key_name)}={escape(key)}[/cyan]  [dim]{escape(preview)}[/dim]",
+        no_wrap=True,
+        overflow="ellipsis",
+    )
+
+
+def find_value(value: str, workers: int = FIND_WORKERS) -> None:
+    """Search every type compatible column of every table for `value`.
+
+    The searches run on a few read-only connections, each statement capped at
+    FIND_TABLE_TIMEOUT; matches are printed as soon as their table is done.
+    Ctrl+C cancels the searches still running.
+    """
+    searches, primary_keys = plan_searches(db.conn.cursor(), value)
+    if not searches:
+        print(f"{YELLOW}No column can hold {value!r}.{RESET}")
+        return
+
+    size = min(workers, len(searches))
+    # Opened inside the try below, so a failed open still closes the others
+    connections, idle = [], []
+
+    def run(search):
+        connection = idle.pop()
+        try:
+            with connection.cursor() as cur:
+                cur.execute(
+                    search_query(search, primary_keys.get(search["table"]), value),
+                    {"value": value},
+                )
+                return cur.fetchall()
+        finally:
+            idle.append(connection)
+
+    hits, timed_out, done = 0, [], 0
+    started = time.monotonic()
+    pool = ThreadPoolExecutor(max_workers=size)
+    try:
+        for _ in range(size):
+            connection = db.open_connection(db.DBNAME, read_only=True)
+            connections.append(connection)
+            connection.set_session(readonly=True, autocommit=True)
+            with connection.cursor() as cur:
+                cur.execute("SET statement_timeout = %s", (FIND_TABLE_TIMEOUT,))
+        idle.extend(connections)
+        with console.status(f"Searching {len(searches)} tables...") as status:
+            futures = {pool.submit(run, s): s for s in searches}
+            for future in as_completed(futures):
+                search = futures[future]
+                done += 1
+                try:
+                    rows = future.result()
+                except psycopg2.errors.QueryCanceled:
+                    timed_out.append(search["table"])
+                    rows = []
+                except psycopg2.Error as e:
+                    print(f"{YELLOW}Searching {search['table']} failed: {e}{RESET}")
+                    rows = []
+                primary_key = primary_keys.get(search["table"])
+                for row in rows[:FIND_MAX_ROWS_PER_TABLE]:
+                    print_hit(search, primary_key, *row)
+                if len(rows) > FIND_MAX_ROWS_PER_TABLE:
+                    console.print(
+                        f"[dim]  more matches in {escape(search['table'])} "
+                        f"not shown[/dim]"
+                    )
+                hits += len(rows[:FIND_MAX_ROWS_PER_TABLE])
+                status.update(
+                    f"Searching... {done}/{len(searches)} searches, {hits} match(es), "
+                    f"{time.monotonic() - started:.1f}s"
+                )
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        for connection in connections:
+            connection.cancel()
+        print(f"{YELLOW}Search cancelled after {done}/{len(searches)} searches.{RESET}")
+        return
+    finally:
+        pool.shutdown(wait=True)
+        for connection in connections:
+            connection.close()
+
+    tables = len({s["table"] for s in searches})
+    columns = sum(len(s["columns"]) for s in searches)
+    print(
+        f"{YELLOW}{hits} match(es) in {tables} tables, {columns} columns "
+        f"({time.monotonic() - started:.2f}s).{RESET}"
+    )
+    if timed_out:
+        print(
+            f"{YELLOW}Timed out after {FIND_TABLE_TIMEOUT}: "
+            f"{', '.join(sorted(set(timed_out)))}.{RESET}"
+        )
+
+
+def run_find_command(command: str) -> None:
+    """Handle ``\\find <value>``; quotes around the value are optional."""
+    value = command.rstrip(";").partition(" ")[2].strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+        value = value[1:-1]
+    if not value:
+        raise ValueError("Usage: \\find <value>")
+    find_value(value)
@@ -0,0 +1,267 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from rich import box
+from rich.console import Console
+from rich.table import Table
+
+from .costs import model_prices
+
+console = Console()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY,
+    ts TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    model TEXT NOT NULL,
+    database TEXT,
+    input_tokens INTEGER NOT NULL,
+    cached_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    latency_ms REAL NOT NULL,
+    cost_usd REAL
+);
+CREATE INDEX IF NOT EXISTS calls_ts ON calls (ts);
+"""
+
+_lock = threading.Lock()
+
+
+class BudgetExceededError(RuntimeError):
+    pass
+
+
+def ledger_path() -> str:
+    """SQLite file holding every API call, under the user's config dir."""
+    path = os.getenv("TOYGRES_LEDGER_PATH")
+    if path:
+        return path
+    config_home = os.getenv("XDG_CONFIG_HOME") or os.path.join(
+        os.path.expanduser("~"), ".config"
+    )
+    return os.path.join(config_home, "toygres", "ledger.sqlite3")
+
+
+@contextmanager
+def _connect():
+    """Open the ledger, commit on success and always close it."""
+    path = ledger_path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with _lock:
+        ledger = sqlite3.connect(path, timeout=5)
+        try:
+            ledger.executescript(_SCHEMA)
+            yield ledger
+            ledger.commit()
+        finally:
+            ledger.close()
+
+
+def call_cost(
+    model: str, input_tokens: int, cached_tokens: int, output_tokens: int
+) -> float | None:
+    """USD cost of one call, cached input billed at CACHED_INPUT_COST_PER_MILLION_TOKEN."""
+    prices = model_prices(model)
+    if prices is None:
+        return None
+    in_cost, out_cost = prices
+    try:
+        cached_cost = float(os.getenv("CACHED_INPUT_COST_PER_MILLION_TOKEN", in_cost))
+    except ValueError:
+        cached_cost = in_cost
+    return (
+        (input_tokens - cached_tokens) * in_cost
+        + cached_tokens * cached_cost
+        + output_tokens * out_cost
+    ) / 1_000_000
+
+
+def record_call(
+    feature: str,
+    model: str,
+    database: str | None,
+    input_tokens: int,
+    cached_tokens: int,
+    output_tokens: int,
+    latency: float,
+) -> None:
+    """Append one API call to the ledger. Never fails the caller."""
+    cost = call_cost(model, input_tokens, cached_tokens, output_tokens)
+    try:
+        with _connect() as ledger:
+            ledger.execute(
+                "INSERT INTO calls (ts, feature, model, database, input_tokens,"
+                " cached_tokens, output_tokens, latency_ms, cost_usd)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    datetime.now().isoformat(timespec="seconds"),
+                    feature,
+                    model,
+                    database,
+                    input_tokens,
+                    cached_tokens,
+                    output_tokens,
+                    latency * 1000,
+                    cost,
+                ),
+            )
+    except (sqlite3.Error, OSError):
+        # Losing a ledger row is better than losing the user's answer
+        pass
+
+
+def record_usage(feature: str, model: str, database, usage, latency: float) -> None:
+    """Record an OpenAI Responses API ``usage`` object."""
+    details = getattr(usage, "input_tokens_details", None)
+    cached = getattr(details, "cached_tokens", 0) or 0
+    record_call(
+        feature,
+        model,
+        database,
+        usage.input_tokens,
+        cached,
+        usage.output_tokens,
+        latency,
+    )
+
+
+def spend_since(since: datetime) -> tuple[float, int]:
+    """USD spent since `since`, and how many calls had no known price (their
+    cost_usd is NULL, so they aren't in the total)."""
+    try:
+        with _connect() as ledger:
+            total, unpriced = ledger.execute(
+                "SELECT coalesce(sum(cost_usd), 0), count(*) - count(cost_usd)"
+                " FROM calls WHERE ts >= ?",
+                (since.isoformat(timespec="seconds"),),
+            ).fetchone()
+    except (sqlite3.Error, OSError):
+        return 0.0, 0
+    return total, unpriced
+
+
+def _budget(name: str) -> float | None:
+    value = os.getenv(name)
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _budgets():
+    """(label, limit, spent, unpriced calls) of every configured budget."""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    week_start = today - timedelta(days=today.weekday())
+    for label, env, since in (
+        ("daily", "TOYGRES_DAILY_BUDGET_USD", today),
+        ("weekly", "TOYGRES_WEEKLY_BUDGET_USD", week_start),
+    ):
+        limit = _budget(env)
+        if limit is not None:
+            yield label, limit, *spend_since(since)
+
+
+_warned_unpriced = False
+
+
+def budget_exceeded() -> str | None:
+    """Return a message if the daily or weekly budget is used up, else None.
+
+    Calls of models without a known price have no cost and can't count
+    toward a budget; that is warned about once per process.
+    """
+    global _warned_unpriced
+    exceeded = None
+    for label, limit, spent, unpriced in _budgets():
+        if unpriced and not _warned_unpriced:
+            _warned_unpriced = True
+            console.print(
+                f"[yellow]{unpriced} AI call(s) have no known price and don't "
+                f"count toward the {label} budget; set MODEL_PRICES or "
+                "INPUT_/OUTPUT_COST_PER_MILLION_TOKEN.[/yellow]"
+            )
+        if spent >= limit and exceeded is None:
+            exceeded = f"{label} AI budget exceeded (${spent:.4f} of ${limit:.4f})"
+    return exceeded
+
+
+def budget_action() -> str:
+    """What ChatSession.ask does over budget: 'refuse' or 'downgrade'."""
+    action = os.getenv("TOYGRES_BUDGET_ACTION", "refuse").lower()
+    return action if action in ("refuse", "downgrade") else "refuse"
+
+
+def _report_table(title: str, period_sql: str, since: datetime) -> Table:
+    table = Table(box=box.ROUNDED, title=title, header_style="bold #ECE7D1")
+    for col in ("period", "feature", "model", "calls", "input", "cached", "output"):
+        is_text = col in ("period", "feature", "model")
+        table.add_column(col, justify="left" if is_text else "right", no_wrap=is_text)
+    table.add_column("avg latency", justify="right")
+    table.add_column("cost", justify="right")
+
+    with _connect() as ledger:
+        rows = ledger.execute(
+            f"SELECT {period_sql} AS period, feature, model, count(*),"
+            " sum(input_tokens), sum(cached_tokens), sum(output_tokens),"
+            " avg(latency_ms), sum(cost_usd), count(*) - count(cost_usd)"
+            " FROM calls WHERE ts >= ?"
+            " GROUP BY period, feature, model ORDER BY period DESC, feature, model",
+            (since.isoformat(timespec="seconds"),),
+        ).fetchall()
+
+    for (
+        period,
+        feature,
+        model,
+        calls,
+        inp,
+        cached,
+        out,
+        latency,
+        cost,
+        unpriced,
+    ) in rows:
+        # Calls of models without a known price have no cost, and aren't summed
+        cost_text = f"${cost:.4f}" if cost is not None else "-"
+        if unpriced:
+            cost_text += f" [yellow]({unpriced} unpriced)[/yellow]"
+        table.add_row(
+            period,
+            feature,
+            model,
+            str(calls),
+            str(inp),
+            str(cached),
+            str(out),
+            f"{latency / 1000:.2f}s",
+            cost_text,
+        )
+    return table
+
+
+def print_report(days: int = 7, weeks: int = 4) -> None:
+    """Print daily and weekly spend from the ledger, plus budget status."""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    console.print(
+        _report_table(
+            f"Daily spend (last {days} days)",
+            "substr(ts, 1, 10)",
+            today - timedelta(days=days - 1),
+        )
+    )
+    week_start = today - timedelta(days=today.weekday())
+    console.print(
+        _report_table(
+            f"Weekly spend (last {weeks} weeks)",
+            "strftime('%Y-W%W', ts)",
+            week_start - timedelta(weeks=weeks - 1),
+        )
+    )
+    exceeded = budget_exceeded()
+    if exceeded:
+        console.print(f"[red]{exceeded}[/red]")
+    console.print(f"[dim]Ledger: {ledger_path()}[/dim]")
@@ -1,3 +1,4 @@
+import argparse
 import re
 from toygres.models import AiMessage
 from . import db
@@ -6,9 +7,9 @@ from . import execute_meta
 from . import ai as execute_ai
 from .ai import ChatSession
 from .art import print_logo, print_shortcuts
-from .constants import YELLOW, RESET
+from .constants import YELLOW, RESET, PROFILE_EXPORT_PATH
 from .autocomplete import HistoryCompleter
-from .models import OutputData
+from .models import OutputData, SqlResult
 from prompt_toolkit import PromptSession
 from prompt_toolkit.history import FileHistory
 from questionary import Choice
@@ -19,7 +20,18 @@ from .execute_sql import parse_sql_output
 from .execute_meta import parse_meta_output
 from .utils import clean_history
 from .observer import run_observer_workflow
+from .export import run_export_command
+from .seed import run_seed_command
+from .synth import run_synth_command
+from .script import execute_script, run_include_command, split_statements
+from .plan import run_plan_command, run_plan_diff_command
+from .advisor import run_advise_command
+from .activity import run_locks_command, run_with_lock_monitor
+from .finder import run_find_command
+from .dbdiff import run_diff_command
 from toygres.costs import session_costs
+from .profiler import tracer
+from . import migrations
 
 
 class SmartHistory(FileHistory):
@@ -45,7 +57,7 @@ class SmartHistory(FileHistory):
 history = SmartHistory(".toygres_history")
 
 
-def parse_ai_sql_and_output(data: OutputData) -> None:
+def parse_ai_sql_and_output(data: OutputData | SqlResult) -> None:
     """Render an AI SQL OutputData model to the terminal."""
     console = Console()
     # Show the sql that AI executed
@@ -75,7 +87,7 @@ def parse_ai_text(data: OutputData) -> None:
         )
 
 
-def render_output(data: OutputData) -> None:
+def render_output(data: OutputData | SqlResult) -> None:
     """Unified output layer — routes an OutputData model to the right renderer."""
     match data.type:
         case "sql":
@@ -86,12 +98,12 @@ def render_output(data: OutputData) -> None:
             parse_ai_text(data)
 
 
-def run_and_track(ai_session: ChatSession, runner, query: str) -> OutputData:
+def run_and_track(
+    ai_session: ChatSession, runner, query: str
+) -> OutputData | SqlResult:
     """Execute a query/command, logging it (and any error) into the AI session."""
     print(f"query is {query}")
-    ai_session._add_message_to_history(
-        AiMessage(role="user", content=f"Ran the query: {query}")
-    )
+    ai_session.record_query(query)
     try:
         return runner(query)
     except Exception as e:
@@ -165,6 +177,16 @@ def main():
                     value="➕ Create a new database",
                 )
             ]
+            + (
+                [
+                    Choice(
+                        [("fg:yellow bold", "➕ Create from migrations")],
+                        value="➕ Create from migrations",
+                    )
+                ]
+                if migrations.is_configured()
+                else []
+            )
             + [
                 questionary.Separator("\n"),
                 Choice([("bold", "--- Baseline DBs ---")], disabled=""),
@@ -200,13 +222,37 @@ def main():
             if not new_db:
                 continue
 
+            ephemeral = questionary.confirm(
+                "Make it ephemeral? (unlogged tables, async commit: much faster writes, lost on a server crash)",
+                default=False,
+            ).ask()
+            if ephemeral is None:
+                continue
+
             try:
-                db.create_database(new_db)
+                db.create_database(new_db, ephemeral=ephemeral)
                 selected_db = new_db
                 print(f"Database '{new_db}' created successfully.")
             except Exception as e:
                 print(f"Failed to create database '{new_db}': {e}")
                 continue
+        elif selected_db == "➕ Create from migrations":
+            new_db = questionary.text("Enter new database name:").ask()
+            if not new_db:
+                continue
+            ephemeral = questionary.confirm(
+                "Make it ephemeral? (unlogged tables, async commit: much faster writes, lost on a server crash)",
+                default=False,
+            ).ask()
+            if ephemeral is None:
+                continue
+
+            try:
+                print(migrations.create_from_migrations(new_db, ephemeral=ephemeral))
+                selected_db = new_db
+            except Exception as e:
+                print(f"Failed to create '{new_db}' from migrations: {e}")
+                continue
         elif selected_db == "➕ Create new baseline":
             if not normal_dbs:
                 print("No normal databases available to baseline. Create one first.")
@@ -275,7 +321,12 @@ def main():
         else:
             operation_mode = questionary.select(
                 "Select operation mode:",
-                choices=["Start AI/SQL Chat", "Deploy Observer Agent", "Explore Data"],
+                choices=[
+                    "Start AI/SQL Chat",
+                    "Deploy Observer Agent",
+                    "Explore Data",
+                    "Performance Dashboard",
+                ],
             ).ask()
 
         if operation_mode == "Deploy Observer Agent":
@@ -289,7 +340,8 @@ def main():
                 observer_session = PromptSession(multiline=True)
                 track_prompt = observer_session.prompt("> ")
                 if track_prompt.strip():
-                    run_observer_workflow(track_prompt)
+                    with tracer.action("observer"):
+                        run_observer_workflow(track_prompt)
             except KeyboardInterrupt:
                 pass  # Nothing to do here, continue below will bring us back to main menu
             continue
@@ -300,6 +352,13 @@ def main():
             explore_database()
             continue
 
+        elif operation_mode == "Performance Dashboard":
+            from .dashboard import run_dashboard
+
+            with tracer.action("dashboard"):
+                run_dashboard()
+            continue
+
         elif operation_mode == "Start AI/SQL Chat":
             print_shortcuts(is_baseline)
 
@@ -336,7 +395,9 @@ def main():
                                     host, user, port, new_dbname = (
                                         db.establish_all_connections(target_db)
                                     )
-                                    db.drop_database(dbname)
+                                    run_with_lock_monitor(
+                                        lambda: db.drop_database(dbname), dbname
+                                    )
                                     dbname = new_dbname
                                     is_baseline = False
                                     print(
@@ -362,7 +423,7 @@ def main():
 
                         if confirm:
                             try:
-                                msg = db.reset_db()
+                                msg = run_with_lock_monitor(db.reset_db, dbname)
                                 print(f"\n{YELLOW}{msg}{RESET}\n")
                             except Exception as e:
                                 print(f"{YELLOW}Failed to reset DB: {e}{RESET}")
@@ -407,11 +468,16 @@ def main():
                             try:
                                 if nuke_type.startswith("Recreate"):
                                     baseline_name = nuke_type.split(": ")[1]
-                                    msg = db.recreate_from_baseline(
-                                        dbname, baseline_name
+                                    msg = run_with_lock_monitor(
+                                        lambda: db.recreate_from_baseline(
+                                            dbname, baseline_name
+                                        ),
+                                        dbname,
                                     )
                                 else:
-                                    msg = db.reset_public_schema()
+                                    msg = run_with_lock_monitor(
+                                        db.reset_public_schema, dbname
+                                    )
                                 print(f"\n{YELLOW}☢️  {msg} ☢️{RESET}\n")
                             except Exception as e:
                                 print(f"{YELLOW}Failed to nuke DB: {e}{RESET}")
@@ -422,15 +488,124 @@ def main():
                     elif cmd_lower in ("exit", "quit"):
                         print(f"\n{YELLOW}Bye! ʕ·ᴥ·ʔ{RESET}\n")
                         return
+                    elif cmd_lower == "\\timing":
+                        tracer.enabled = not tracer.enabled
+                        state = "on" if tracer.enabled else "off"
+                        print(f"{YELLOW}Timing is {state}.{RESET}")
+                    elif cmd_lower == "\\compact":
+                        execute_sql.compact = not execute_sql.compact
+                        state = "on" if execute_sql.compact else "off"
+                        print(f"{YELLOW}Compact output is {state}.{RESET}")
+                    elif cmd_lower.startswith("\\full"):
+                        with tracer.action("full"):
+                            try:
+                                execute_sql.show_full_value(query)
+                            except Exception as e:
+                                print(f"{YELLOW}Could not fetch value: {e}{RESET}")
+                    elif cmd_lower.startswith("\\export"):
+                        with tracer.action("export"):
+                            try:
+                                msg = run_export_command(query)
+                                print(f"{YELLOW}{msg}{RESET}")
+                            except KeyboardInterrupt:
+                                print(f"\n{YELLOW}Export cancelled.{RESET}")
+                            except Exception as e:
+                                print(f"{YELLOW}Export failed: {e}{RESET}")
+                    elif cmd_lower.startswith("\\seed"):
+                        with tracer.action("seed"):
+                            try:
+                                msg = run_seed_command(query)
+                                print(f"{YELLOW}{msg}{RESET}")
+                                print(
+                                    f"{YELLOW}Use 'menu' → Create new baseline to snapshot it.{RESET}"
+                                )
+                            except KeyboardInterrupt:
+                                print(f"\n{YELLOW}Seeding cancelled.{RESET}")
+                            except Exception as e:
+                                print(f"{YELLOW}Seeding failed: {e}{RESET}")
+                    elif cmd_lower.startswith("\\synth"):
+                        with tracer.action("synth"):
+                            try:
+                                msg = run_synth_command(query)
+                                print(f"{YELLOW}{msg}{RESET}")
+                            except KeyboardInterrupt:
+                                print(f"\n{YELLOW}Generation cancelled.{RESET}")
+                            except Exception as e:
+                                print(f"{YELLOW}Generation failed: {e}{RESET}")
+                    elif cmd_lower.startswith("\\i "):
+                        with tracer.action("script"):
+                            try:
+                                ai_session.record_query(query)
+                                run_include_command(query)
+                            except KeyboardInterrupt:
+                                print(f"\n{YELLOW}Script cancelled.{RESET}")
+                            except Exception as e:
+                                print(f"{YELLOW}Script failed: {e}{RESET}")
+                    elif cmd_lower.startswith("\\locks"):
+                        with tracer.action("locks"):
+                            try:
+                                run_locks_command(query)
+                            except Exception as e:
+                                print(f"{YELLOW}Lock monitor failed: {e}{RESET}")
+                    elif cmd_lower.startswith("\\find"):
+                        with tracer.action("find"):
+                            try:
+                                run_find_command(query)
+                            except KeyboardInterrupt:
+                                print(f"\n{YELLOW}Search cancelled.{RESET}")
+                            except Exception as e:
+                                print(f"{YELLOW}Search failed: {e}{RESET}")
+                    elif cmd_lower.startswith("\\diff"):
+                        with tracer.action("diff"):
+                            try:
+                                run_diff_command(query)
+                            except KeyboardInterrupt:
+                                print(f"\n{YELLOW}Diff cancelled.{RESET}")
+                            except Exception as e:
+                                print(f"{YELLOW}Diff failed: {e}{RESET}")
+                    elif cmd_lower.startswith("\\advise"):
+                        with tracer.action("advise"):
+                            try:
+                                # Newest last, like the session's own queries
+                                saved = reversed(list(history.load_history_strings()))
+                                run_advise_command(
+                                    query, ai_session.queries.values(), saved
+                                )
+                            except KeyboardInterrupt:
+                                print(f"\n{YELLOW}Index advice cancelled.{RESET}")
+                            except Exception as e:
+                                print(f"{YELLOW}Index advice failed: {e}{RESET}")
+                    elif cmd_lower.startswith("\\plandiff"):
+                        with tracer.action("plandiff"):
+                            try:
+                                ai_session.record_query(query)
+                                run_plan_diff_command(query)
+                            except KeyboardInterrupt:
+                                print(f"\n{YELLOW}Plan comparison cancelled.{RESET}")
+                            except Exception as e:
+                                print(f"{YELLOW}Plan comparison failed: {e}{RESET}")
+                    elif cmd_lower.startswith("\\plan"):
+                        with tracer.action("plan"):
+                            try:
+                                ai_session.record_query(query)
+                                run_plan_command(query)
+                            except KeyboardInterrupt:
+                                print(f"\n{YELLOW}Plan cancelled.{RESET}")
+                            except Exception as e:
+                                print(f"{YELLOW}Plan failed: {e}{RESET}")
                     elif query.startswith("\\"):
-                        output = run_and_track(
-                            ai_session, execute_meta.run, query.rstrip(";")
-                        )
-                        render_output(output)
+                        with tracer.action("meta"):
+                            output = run_and_track(
+                                ai_session, execute_meta.run, query.rstrip(";")
+                            )
+                            render_output(output)
                     elif query.startswith("??"):
                         question = query[2:].strip().rstrip(";")
                         if question:
-                            with console.status("Processing...", spinner="pong"):
+                            with (
+                                tracer.action("ai"),
+                                console.status("Processing...", spinner="pong"),
+                            ):
                                 ai_output = execute_ai.run(ai_session, question)
                             if ai_output.type in ("ai-sql", "ai-meta"):
                                 console.print(
@@ -441,11 +616,23 @@ def main():
                                 next_default = ai_output.command
                             else:
                                 render_output(ai_output)
+                    elif len(split_statements(query)) > 1:
+                        with tracer.action("script"):
+                            run_and_track(ai_session, execute_script, query)
+
+                        if not is_baseline:
+                            handle_cascade_operations(query)
                     else:
-                        output = run_and_track(
-                            ai_session, execute_sql.run, query.rstrip(";")
-                        )
-                        render_output(output)
+                        with tracer.action("sql"):
+                            output = run_and_track(
+                                ai_session, execute_sql.run, query.rstrip(";")
+                            )
+                            render_output(output)
+                            if execute_sql.last_query:
+                                console.print(
+                                    "[dim]Compact output: wide values are cut by the server, "
+                                    "\\full <row> <column> shows one in full.[/dim]"
+                                )
 
                         # For normal dbs look out for renames and drops and cascade them to baselines
                         if not is_baseline:
@@ -464,8 +651,75 @@ def main():
                 break
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(prog="toygres")
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="answer the natural language questions in FILE (one per line) non-interactively",
+    )
+    parser.add_argument("--db", help="database to run the batch against")
+    parser.add_argument(
+        "--report",
+        action="store_true",
+        help="print daily and weekly AI spend from the persistent ledger and exit",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print a timing breakdown of every action and export a session histogram",
+    )
+    parser.add_argument(
+        "--out",
+        default="batch_results.jsonl",
+        help="where batch results are written as JSONL (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="number of concurrent AI sessions in batch mode (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--bench-ephemeral",
+        action="store_true",
+        help="measure write throughput and reset time of ephemeral vs durable databases and exit",
+    )
+    args = parser.parse_args()
+    if args.batch and not args.db:
+        parser.error("--batch requires --db")
+    return args
+
+
+def run_batch_mode(args) -> None:
+    """Non-interactive batch of natural language questions against one database."""
+    from .batch import run_batch
+
+    db.establish_all_connections(args.db)
+    run_batch(args.batch, args.out, workers=args.workers)
+
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.report:
+        from .ledger import print_report
+
+        print_report()
+        raise SystemExit(0)
+    if args.bench_ephemeral:
+        from .benchmark import benchmark_ephemeral
+
+        benchmark_ephemeral()
+        raise SystemExit(0)
+
+    tracer.enabled = args.profile
     try:
-        main()
+        if args.batch:
+            run_batch_mode(args)
+        else:
+            main()
     finally:
         session_costs.print_costs()
+        tracer.print_summary()
+        if tracer.export(PROFILE_EXPORT_PATH):
+            print(f"{YELLOW}Timing histogram written to {PROFILE_EXPORT_PATH}{RESET}")
@@ -0,0 +1,172 @@
+import hashlib
+import os
+import re
+import subprocess
+import time
+
+from . import db
+from .constants import MIGRATION_CACHE_KEEP, MIGRATION_CACHE_PREFIX
+
+
+def migrations_dir() -> str | None:
+    return os.getenv("TOYGRES_MIGRATIONS_DIR") or None
+
+
+def migrations_cmd() -> str | None:
+    return os.getenv("TOYGRES_MIGRATIONS_CMD") or None
+
+
+def is_configured() -> bool:
+    # A command alone can't be cached: nothing tells when its migrations change
+    return bool(migrations_dir())
+
+
+def _natural_key(name: str):
+    """Sort 2_x.sql before 10_x.sql."""
+    return [int(p) if p.isdigit() else p for p in re.split(r"(\d+)", name)]
+
+
+def migration_files(path: str) -> list[str]:
+    """Forward migrations in apply order; ``*.down.sql`` files are skipped."""
+    names = [
+        f
+        for f in os.listdir(path)
+        if f.endswith(".sql") and not f.endswith(".down.sql")
+    ]
+    return [os.path.join(path, f) for f in sorted(names, key=_natural_key)]
+
+
+def tool_files(path: str) -> list[str]:
+    """Every file under `path` for a migration tool, whatever its format
+    (SQL, Python, YAML...), in a stable order. Hidden entries and Python
+    caches are skipped."""
+    found = []
+    for root, dirs, names in os.walk(path):
+        dirs[:] = sorted(
+            d for d in dirs if not d.startswith(".") and d != "__pycache__"
+        )
+        found.extend(
+            os.path.join(root, n) for n in sorted(names) if not n.startswith(".")
+        )
+    return found
+
+
+def chain_hashes(files: list[str], seed: str = "") -> list[str]:
+    """Hash of every prefix of `files`: hashes[i] covers the first i files.
+
+    Each hash chains the previous one with the next file's name and
+    content, so a cached database for hashes[i] is exactly the state after
+    applying files[:i], whatever comes after.
+    """
+    digest = hashlib.sha256(seed.encode()).hexdigest()
+    hashes = [digest]
+    for path in files:
+        h = hashlib.sha256(digest.encode())
+        h.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            h.update(f.read())
+        digest = h.hexdigest()
+        hashes.append(digest)
+    return hashes
+
+
+def cache_name(digest: str) -> str:
+    return f"{MIGRATION_CACHE_PREFIX}{digest[:16]}"
+
+
+def _run_command(dbname: str) -> None:
+    """Run TOYGRES_MIGRATIONS_CMD against `dbname`.
+
+    The target is passed as DATABASE_URL and the usual PG* variables, which
+    most migration tools pick up.
+    """
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"postgresql://{db.USER}@{db.HOST}:{db.PORT}/{dbname}",
+        PGHOST=db.HOST,
+        PGPORT=str(db.PORT),
+        PGUSER=db.USER,
+        PGDATABASE=dbname,
+    )
+    result = subprocess.run(
+        migrations_cmd(), shell=True, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(
+            result.stderr.strip() or result.stdout.strip() or "migration command failed"
+        )
+
+
+def _prune_cache(keep: str) -> None:
+    """Drop the oldest cached schemas beyond MIGRATION_CACHE_KEEP."""
+    cached = [d for d in db.get_template_databases(MIGRATION_CACHE_PREFIX) if d != keep]
+    for name in cached[: max(0, len(cached) - (MIGRATION_CACHE_KEEP - 1))]:
+        db.set_template(name, False)
+        db.drop_database(name)
+
+
+def _build_cache(files: list[str], hashes: list[str], log) -> str:
+    """Create the cache database for the full migration set, reusing the
+    longest cached prefix and applying only the migrations after it."""
+    target = cache_name(hashes[-1])
+    cached = set(db.get_template_databases(MIGRATION_CACHE_PREFIX))
+    applied = next(
+        (i for i in range(len(files) - 1, 0, -1) if cache_name(hashes[i]) in cached),
+        0,
+    )
+
+    if applied:
+        log(f"Reusing cached schema after {applied}/{len(files)} migrations")
+        db.create_database(target, template=cache_name(hashes[applied]))
+    else:
+        log("No cached prefix, applying every migration")
+        db.create_database(target)
+
+    try:
+        if migrations_cmd():
+            # The tool knows which migrations the clone already has
+            log(f"Running {migrations_cmd()}")
+            _run_command(target)
+        else:
+            for i, path in enumerate(files[applied:], start=applied + 1):
+                log(f"[{i}/{len(files)}] {os.path.basename(path)}")
+                db.run_sql_file(target, path)
+        db.set_template(target)
+    except BaseException:
+        db.drop_database(target)
+        raise
+
+    _prune_cache(keep=target)
+    return target
+
+
+def create_from_migrations(new_dbname: str, ephemeral: bool = False, log=print):
+    """Create `new_dbname` at the current migration state.
+
+    A cached template database keyed by the migrations' hash makes this a
+    plain CREATE DATABASE ... TEMPLATE clone; on a cache miss only the
+    migrations missing from the longest cached prefix are applied.
+    """
+    started = time.perf_counter()
+    path = migrations_dir()
+    if not path:
+        raise ValueError(
+            "Set TOYGRES_MIGRATIONS_DIR to the migrations (with "
+            "TOYGRES_MIGRATIONS_CMD, the directory your tool reads them from)"
+        )
+    # A tool's migrations are hashed whole, together with the command itself
+    files = tool_files(path) if migrations_cmd() else migration_files(path)
+    hashes = chain_hashes(files, seed=migrations_cmd() or "")
+
+    cache = cache_name(hashes[-1])
+    hit = cache in db.get_template_databases(MIGRATION_CACHE_PREFIX)
+    if not hit:
+        cache = _build_cache(files, hashes, log)
+
+    db.create_database(new_dbname, ephemeral=ephemeral, template=cache)
+    elapsed = time.perf_counter() - started
+    state = "cache hit" if hit else "cache rebuilt"
+    return (
+        f"Created '{new_dbname}' at migration hash {hashes[-1][:12]} "
+        f"({len(files)} migrations, {state}) in {elapsed:.1f}s"
+    )
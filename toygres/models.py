@@ -24,6 +24,54 @@ class OutputData(BaseModel):
     output: str = ""  # actual text output (meta result, AI text response)
 
 
+class ResultColumn:
+    """Column metadata of a SqlResult, same fields as ColumnMeta without validation."""
+
+    __slots__ = ("name", "type_code")
+
+    def __init__(self, name: str, type_code: int):
+        self.name = name
+        self.type_code = type_code
+
+
+class SqlResult:
+    """Result of a SQL query, for the hot path between the driver and the renderers.
+
+    Offers the same attributes as OutputData but skips pydantic validation and
+    keeps the driver's row tuples as they are instead of copying every row
+    into a list. Large results therefore cost no extra memory or CPU before
+    rendering starts.
+    """
+
+    __slots__ = ("type", "description", "rows", "status", "command", "output")
+
+    def __init__(
+        self,
+        description: list[ResultColumn],
+        rows: list[tuple],
+        status: str = "",
+        type: OutputType = "sql",
+        command: str = "",
+        output: str = "",
+    ):
+        self.type = type
+        self.description = description
+        self.rows = rows
+        self.status = status
+        self.command = command
+        self.output = output
+
+    @classmethod
+    def from_cursor(cls, description, rows, status) -> "SqlResult":
+        """Wrap what db.executeSQL returned, without touching the rows."""
+        columns = (
+            [ResultColumn(col.name, col.type_code) for col in description]
+            if description
+            else []
+        )
+        return cls(columns, rows if rows else [], status or "")
+
+
 # ---------------------------------------------------------------------------
 # AI structured response — what OpenAI is asked to return
 # ---------------------------------------------------------------------------
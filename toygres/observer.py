@@ -1,6 +1,7 @@
 from toygres.db import executeSQL, connect_to_observer_db
 from .models import ObserverAiResponse
 from . import db
+from . import ledger
 from openai import OpenAI
 import os
 import dotenv
@@ -9,8 +10,10 @@ from datetime import datetime
 from rich.console import Console
 from rich.panel import Panel
 import select
+import time
 
 from toygres.costs import session_costs
+from toygres.profiler import tracer
 
 dotenv.load_dotenv()
 
@@ -124,8 +127,9 @@ class ObserverAgent:
     def start(self, ai_response: ObserverAiResponse):
         console = Console()
         try:
-            self._create_trigger(ai_response.creation_command)
-            self._attach_trigger(ai_response.attach_command)
+            with tracer.span("observer.attach"):
+                self._create_trigger(ai_response.creation_command)
+                self._attach_trigger(ai_response.attach_command)
         except Exception as e:
             console.print(f"[red]Failed to attach triggers: {e}[/red]")
             return
@@ -218,27 +222,35 @@ def run_observer_workflow(user_text: str):
 
         client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+        model = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
         with console.status("Generating Observer SQL...", spinner="dots"):
-            resp = client.responses.create(
-                model=os.getenv("OPENAI_MODEL", "gpt-4.1-mini"),
-                input=[
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": user_text},
-                ],
-                text={
-                    "format": {
-                        "type": "json_schema",
-                        "name": "ObserverAiResponse",
-                        "schema": ObserverAiResponse.model_json_schema(),
-                        "strict": True,
-                    }
-                },
-            )
+            started = time.perf_counter()
+            with tracer.span("observer.openai"):
+                resp = client.responses.create(
+                    model=model,
+                    input=[
+                        {"role": "system", "content": prompt},
+                        {"role": "user", "content": user_text},
+                    ],
+                    text={
+                        "format": {
+                            "type": "json_schema",
+                            "name": "ObserverAiResponse",
+                            "schema": ObserverAiResponse.model_json_schema(),
+                            "strict": True,
+                        }
+                    },
+                )
 
             if resp.usage:
+                latency = time.perf_counter() - started
                 session_costs.add_tokens(
-                    resp.usage.input_tokens, resp.usage.output_tokens
+                    resp.usage.input_tokens,
+                    resp.usage.output_tokens,
+                    model=model,
+                    latency=latency,
                 )
+                ledger.record_usage("observer", model, dbname, resp.usage, latency)
 
             ai_response = ObserverAiResponse.model_validate_json(resp.output_text)
 
@@ -0,0 +1,374 @@
+import shutil
+import sys
+from collections import OrderedDict
+
+from prompt_toolkit.application import Application
+from prompt_toolkit.buffer import Buffer
+from prompt_toolkit.filters import Condition
+from prompt_toolkit.key_binding import KeyBindings
+from prompt_toolkit.layout import (
+    ConditionalContainer,
+    HSplit,
+    Layout,
+    VSplit,
+    Window,
+)
+from prompt_toolkit.layout.controls import BufferControl, FormattedTextControl
+
+from .constants import (
+    PAGER_BATCH_SIZE,
+    PAGER_CACHED_BATCHES,
+    PAGER_FROZEN_COLUMNS,
+    PAGER_WIDTH_SAMPLE_SIZE,
+    PG_TYPES,
+)
+
+# Type codes rendered right aligned
+_NUMERIC_TYPES = {20, 21, 23, 26, 700, 701, 1700}
+_SEPARATOR = " │ "
+_NULL = "NULL"
+
+
+def _column_width(name: str, type_name: str, sample: list, max_len: int) -> int:
+    width = max(len(name), len(type_name))
+    for val in sample:
+        width = max(width, len(_NULL) if val is None else len(str(val)))
+    return min(width, max_len)
+
+
+def _make_formatter(width: int, numeric: bool):
+    """Build a per-column formatter: stringify, middle-truncate and pad to `width`."""
+    half = (width - 3) // 2
+    tail = width - 3 - half
+    pad = str.rjust if numeric else str.ljust
+
+    def fmt(val) -> str:
+        if val is None:
+            return pad(_NULL, width)
+        s = str(val)
+        if len(s) > width:
+            s = s[:half] + "..." + s[-tail:]
+        # Embedded newlines would break the one-row-per-line layout
+        if "\n" in s:
+            s = s.replace("\n", "↵")
+        return pad(s, width)
+
+    return fmt
+
+
+class RowFormatter:
+    """Formats rows into fixed width cells lazily, one batch at a time.
+
+    Column widths come from a sample of the result instead of every value,
+    and only the batches actually shown are ever formatted.
+    """
+
+    def __init__(self, description, rows, max_len: int):
+        self.rows = rows
+        step = max(1, len(rows) // PAGER_WIDTH_SAMPLE_SIZE)
+        sample_rows = rows[::step][:PAGER_WIDTH_SAMPLE_SIZE]
+
+        self.headers = []
+        self.types = []
+        self.widths = []
+        self.formatters = []
+        for i, col in enumerate(description):
+            type_name = PG_TYPES.get(col.type_code, f"oid:{col.type_code}")
+            width = _column_width(
+                col.name, type_name, [r[i] for r in sample_rows], max_len
+            )
+            self.headers.append(col.name.ljust(width)[:width])
+            self.types.append(type_name.ljust(width)[:width])
+            self.widths.append(width)
+            self.formatters.append(
+                _make_formatter(width, col.type_code in _NUMERIC_TYPES)
+            )
+        self._batches: OrderedDict[int, list[list[str]]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _batch(self, index: int) -> list[list[str]]:
+        batch = self._batches.get(index)
+        if batch is not None:
+            self._batches.move_to_end(index)
+            return batch
+
+        start = index * PAGER_BATCH_SIZE
+        formatters = self.formatters
+        batch = [
+            [f(v) for f, v in zip(formatters, row)]
+            for row in self.rows[start : start + PAGER_BATCH_SIZE]
+        ]
+        self._batches[index] = batch
+        # Keep memory bounded no matter how far the user scrolls
+        if len(self._batches) > PAGER_CACHED_BATCHES:
+            self._batches.popitem(last=False)
+        return batch
+
+    def cells(self, row: int) -> list[str]:
+        return self._batch(row // PAGER_BATCH_SIZE)[row % PAGER_BATCH_SIZE]
+
+    def matches(self, row: int, pattern: str) -> bool:
+        """Whether any raw value of `row` contains the lowercase `pattern`.
+
+        Searches the values themselves, not the cells: those are cut to the
+        column width, and searching would churn the batch cache.
+        """
+        return any(
+            pattern in (_NULL if v is None else str(v)).lower() for v in self.rows[row]
+        )
+
+    def lines(self):
+        """Yield every formatted row, batch by batch."""
+        for index in range((len(self.rows) + PAGER_BATCH_SIZE - 1) // PAGER_BATCH_SIZE):
+            start = index * PAGER_BATCH_SIZE
+            formatters = self.formatters
+            for row in self.rows[start : start + PAGER_BATCH_SIZE]:
+                yield _SEPARATOR.join([f(v) for f, v in zip(formatters, row)])
+
+
+class Pager:
+    """Full screen pager with frozen header and key columns.
+
+    Keys: ↑/↓ j/k scroll, PgUp/PgDn/space page, g/G top/bottom, ←/→ h/l scroll
+    columns, / search, n/N next/previous match, : jump to row, q quit.
+    """
+
+    def __init__(self, formatter: RowFormatter, title: str = ""):
+        self.fmt = formatter
+        self.title = title
+        self.top = 0
+        self.col_offset = 0
+        self.pattern = ""
+        self.message = ""
+        self.input_mode = None  # "search" | "jump" while the input line is open
+        self.input_buffer = Buffer(multiline=False)
+        self.app = Application(
+            layout=self._layout(),
+            key_bindings=self._bindings(),
+            full_screen=True,
+        )
+
+    # -- layout -------------------------------------------------------
+
+    def _page_height(self) -> int:
+        return max(1, shutil.get_terminal_size().lines - 5)
+
+    def _visible_columns(self) -> list[int]:
+        """Frozen columns plus as many scrolled columns as fit on screen."""
+        total_width = shutil.get_terminal_size().columns - 8
+        n = len(self.fmt.widths)
+        frozen = list(range(min(PAGER_FROZEN_COLUMNS, n)))
+        columns, used = [], 0
+        for i in frozen + list(range(len(frozen) + self.col_offset, n)):
+            used += self.fmt.widths[i] + len(_SEPARATOR)
+            if columns and used > total_width:
+                break
+            columns.append(i)
+        return columns
+
+    def _join(self, cells: list[str], columns: list[int]) -> str:
+        return _SEPARATOR.join(cells[i] for i in columns)
+
+    def _header_text(self):
+        columns = self._visible_columns()
+        return [
+            ("bold", self._join(self.fmt.headers, columns) + "\n"),
+            ("class:dim", self._join(self.fmt.types, columns) + "\n"),
+            ("", "─" * min(shutil.get_terminal_size().columns, 400)),
+        ]
+
+    def _body_text(self):
+        columns = self._visible_columns()
+        width = len(str(len(self.fmt)))
+        out = []
+        end = min(len(self.fmt), self.top + self._page_height())
+        for row in range(self.top, end):
+            line = self._join(self.fmt.cells(row), columns)
+            out.append(("class:dim", f"{row + 1:>{width}} "))
+            if self.pattern and self.fmt.matches(row, self.pattern):
+                out.append(("reverse", line))
+            else:
+                out.append(("", line))
+            out.append(("", "\n"))
+        return out
+
+    def _status_text(self):
+        end = min(len(self.fmt), self.top + self._page_height())
+        hidden = len(self.fmt.widths) - len(self._visible_columns())
+        parts = [f" {self.title}" if self.title else ""]
+        parts.append(f" rows {self.top + 1}-{end} of {len(self.fmt)}")
+        if self.col_offset or hidden:
+            parts.append(f" │ columns +{self.col_offset} ({hidden} off screen)")
+        if self.pattern:
+            parts.append(f" │ /{self.pattern}")
+        if self.message:
+            parts.append(f" │ {self.message}")
+        parts.append(" │ / search  : row  ←→ columns  q quit")
+        return [("reverse", "".join(parts))]
+
+    def _layout(self) -> Layout:
+        self.body = Window(FormattedTextControl(self._body_text, focusable=True))
+        prompt = Window(
+            FormattedTextControl(lambda: "/" if self.input_mode == "search" else ":"),
+            width=1,
+        )
+        return Layout(
+            HSplit(
+                [
+                    Window(FormattedTextControl(self._header_text), height=3),
+                    self.body,
+                    Window(FormattedTextControl(self._status_text), height=1),
+                    ConditionalContainer(
+                        VSplit([prompt, Window(BufferControl(self.input_buffer))]),
+                        filter=Condition(lambda: self.input_mode is not None),
+                    ),
+                ]
+            ),
+            focused_element=self.body,
+        )
+
+    # -- navigation ---------------------------------------------------
+
+    def scroll_to(self, row: int) -> None:
+        last_top = max(0, len(self.fmt) - self._page_height())
+        self.top = max(0, min(row, last_top))
+
+    def find(self, start: int, step: int) -> None:
+        """Move to the next row (in `step` direction) containing the pattern."""
+        if not self.pattern:
+            return
+        row = start
+        while 0 <= row < len(self.fmt):
+            if self.fmt.matches(row, self.pattern):
+                self.scroll_to(row)
+                self.message = f"match at row {row + 1}"
+                return
+            row += step
+        self.message = "no more matches"
+
+    def _accept_input(self) -> None:
+        text = self.input_buffer.text.strip()
+        mode, self.input_mode = self.input_mode, None
+        self.input_buffer.reset()
+        self.app.layout.focus(self.body)
+        if mode == "search":
+            self.pattern = text.lower()
+            self.find(self.top, 1)
+        elif mode == "jump" and text:
+            try:
+                self.scroll_to(int(text) - 1)
+                self.message = ""
+            except ValueError:
+                self.message = f"not a row number: {text}"
+
+    def _bindings(self) -> KeyBindings:
+        kb = KeyBindings()
+        browsing = Condition(lambda: self.input_mode is None)
+        typing = Condition(lambda: self.input_mode is not None)
+
+        @kb.add("q", filter=browsing)
+        @kb.add("escape", filter=browsing)
+        @kb.add("c-c")
+        def _(event):
+            event.app.exit()
+
+        @kb.add("down", filter=browsing)
+        @kb.add("j", filter=browsing)
+        def _(event):
+            self.scroll_to(self.top + 1)
+
+        @kb.add("up", filter=browsing)
+        @kb.add("k", filter=browsing)
+        def _(event):
+            self.scroll_to(self.top - 1)
+
+        @kb.add("pagedown", filter=browsing)
+        @kb.add("space", filter=browsing)
+        def _(event):
+            self.scroll_to(self.top + self._page_height())
+
+        @kb.add("pageup", filter=browsing)
+        @kb.add("b", filter=browsing)
+        def _(event):
+            self.scroll_to(self.top - self._page_height())
+
+        @kb.add("g", filter=browsing)
+        @kb.add("home", filter=browsing)
+        def _(event):
+            self.scroll_to(0)
+
+        @kb.add("G", filter=browsing)
+        @kb.add("end", filter=browsing)
+        def _(event):
+            self.scroll_to(len(self.fmt))
+
+        @kb.add("right", filter=browsing)
+        @kb.add("l", filter=browsing)
+        def _(event):
+            scrollable = len(self.fmt.widths) - PAGER_FROZEN_COLUMNS
+            self.col_offset = min(self.col_offset + 1, max(0, scrollable - 1))
+
+        @kb.add("left", filter=browsing)
+        @kb.add("h", filter=browsing)
+        def _(event):
+            self.col_offset = max(0, self.col_offset - 1)
+
+        @kb.add("/", filter=browsing)
+        def _(event):
+            self.input_mode = "search"
+            event.app.layout.focus(self.input_buffer)
+
+        @kb.add(":", filter=browsing)
+        def _(event):
+            self.input_mode = "jump"
+            event.app.layout.focus(self.input_buffer)
+
+        @kb.add("n", filter=browsing)
+        def _(event):
+            self.find(self.top + 1, 1)
+
+        @kb.add("N", filter=browsing)
+        def _(event):
+            self.find(self.top - 1, -1)
+
+        @kb.add("enter", filter=typing)
+        def _(event):
+            self._accept_input()
+
+        @kb.add("escape", filter=typing)
+        def _(event):
+            self.input_mode = None
+            self.input_buffer.reset()
+            event.app.layout.focus(self.body)
+
+        return kb
+
+    def run(self) -> None:
+        self.app.run()
+
+
+def render_fast(data, max_len: int | None, title: str = "") -> None:
+    """Render a large result without Rich.
+
+    Interactive terminals get the pager; pipes and redirects get the rows
+    streamed as plain fixed width text in batches.
+    """
+    formatter = RowFormatter(data.description, data.rows, max_len or 120)
+    if sys.stdout.isatty() and sys.stdin.isatty():
+        Pager(formatter, title=title).run()
+        return
+
+    write = sys.stdout.write
+    write(_SEPARATOR.join(formatter.headers) + "\n")
+    write(_SEPARATOR.join(formatter.types) + "\n")
+    batch = []
+    for line in formatter.lines():
+        batch.append(line)
+        if len(batch) >= PAGER_BATCH_SIZE:
+            write("\n".join(batch) + "\n")
+            batch.clear()
+    if batch:
+        write("\n".join(batch) + "\n")
+    sys.stdout.flush()
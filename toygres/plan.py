@@ -0,0 +1,434 @@
+import os
+import statistics
+from contextlib import closing
+from dataclasses import dataclass, field
+from itertools import zip_longest
+
+from rich import box
+from rich.console import Console
+from rich.markup import escape
+from rich.table import Table
+from rich.tree import Tree
+
+from . import db
+from .script import split_statements
+from .constants import (
+    PLAN_HOT_NODES,
+    PLAN_HUGE_LOOPS,
+    PLAN_LARGE_SEQ_SCAN_ROWS,
+    PLAN_MISESTIMATE_FACTOR,
+    PLAN_DIFF_RUNS,
+    PLAN_REGRESSION_THRESHOLD,
+)
+from .baselines import pick_baseline
+from .utils import one_line
+
+console = Console()
+
+# EXPLAIN ANALYZE reports times rounded to microseconds; differences below
+# this are noise
+_TIMER_RESOLUTION_MS = 0.05
+
+
+@dataclass
+class PlanNode:
+    """One node of an ``EXPLAIN (ANALYZE, FORMAT JSON)`` plan.
+
+    Postgres reports per-loop averages and times that include the children;
+    ``total_ms`` and ``self_ms`` are multiplied out over all loops, and the
+    buffer counts are this node's own share.
+    """
+
+    raw: dict
+    children: list["PlanNode"] = field(default_factory=list)
+    total_ms: float = 0.0
+    self_ms: float = 0.0
+    shared_hit: int = 0
+    shared_read: int = 0
+    flags: list[str] = field(default_factory=list)
+
+    @property
+    def node_type(self) -> str:
+        return self.raw["Node Type"]
+
+    @property
+    def loops(self) -> int:
+        return self.raw.get("Actual Loops", 1) or 0
+
+    @property
+    def estimated_rows(self) -> float:
+        return self.raw.get("Plan Rows", 0)
+
+    @property
+    def actual_rows(self) -> float:
+        return self.raw.get("Actual Rows", 0)
+
+    @property
+    def label(self) -> str:
+        """Node type plus what it works on, e.g. ``Index Scan using x on orders o``."""
+        raw = self.raw
+        parts = [raw["Node Type"]]
+        if raw.get("Join Type") and raw["Node Type"] != "Hash":
+            parts.insert(0, raw["Join Type"])
+        if (
+            raw.get("Strategy") not in (None, "Plain")
+            and raw["Node Type"] == "Aggregate"
+        ):
+            parts.insert(0, raw["Strategy"])
+        if raw.get("Index Name"):
+            parts.append(f"using {raw['Index Name']}")
+        if raw.get("Relation Name"):
+            parts.append(f"on {raw['Relation Name']}")
+            if raw.get("Alias") and raw["Alias"] != raw["Relation Name"]:
+                parts.append(raw["Alias"])
+        elif raw.get("CTE Name"):
+            parts.append(f"on {raw['CTE Name']}")
+        elif raw.get("Function Name"):
+            parts.append(f"on {raw['Function Name']}")
+        return " ".join(parts)
+
+    def signature(self) -> tuple:
+        """Shape of the plan below this node, ignoring costs and timings."""
+        return (self.label, tuple(c.signature() for c in self.children))
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+def build_tree(raw: dict, parallel: bool = False, limited: bool = False) -> PlanNode:
+    """Turn the JSON plan into PlanNodes with self times, buffers and flags.
+
+    Below a Gather the loops are parallel workers running side by side, so
+    their per-loop time is already wall clock time. Below a Limit, nodes stop
+    early and returning fewer rows than estimated is expected.
+    """
+    parallel = parallel or raw["Node Type"] in ("Gather", "Gather Merge")
+    children = [
+        build_tree(child, parallel, limited or raw["Node Type"] == "Limit")
+        for child in raw.get("Plans", [])
+    ]
+    node = PlanNode(raw, children)
+    node.total_ms = raw.get("Actual Total Time", 0.0) * (1 if parallel else node.loops)
+    # CTE and init plans can make children "longer" than the parent
+    node.self_ms = max(0.0, node.total_ms - sum(c.total_ms for c in children))
+    node.shared_hit = max(
+        0,
+        raw.get("Shared Hit Blocks", 0)
+        - sum(c.raw.get("Shared Hit Blocks", 0) for c in children),
+    )
+    node.shared_read = max(
+        0,
+        raw.get("Shared Read Blocks", 0)
+        - sum(c.raw.get("Shared Read Blocks", 0) for c in children),
+    )
+    node.flags = _flags(node, limited)
+    return node
+
+
+def _flags(node: PlanNode, limited: bool) -> list[str]:
+    raw = node.raw
+    flags = []
+    if node.node_type == "Seq Scan":
+        scanned = (node.actual_rows + raw.get("Rows Removed by Filter", 0)) * node.loops
+        if scanned >= PLAN_LARGE_SEQ_SCAN_ROWS:
+            flags.append(f"seq scan over {scanned:,.0f} rows")
+    if raw.get("Sort Space Type") == "Disk":
+        flags.append(f"sort spilled to disk ({raw.get('Sort Space Used', 0):,} kB)")
+    if raw.get("Hash Batches", 1) > 1:
+        flags.append(f"hash spilled to disk ({raw['Hash Batches']} batches)")
+    if node.node_type == "Nested Loop" and len(node.children) > 1:
+        inner_loops = node.children[1].loops
+        if inner_loops >= PLAN_HUGE_LOOPS:
+            flags.append(f"nested loop runs its inner side {inner_loops:,} times")
+    if node.loops:
+        estimated, actual = max(node.estimated_rows, 1), max(node.actual_rows, 1)
+        factor = (
+            actual / estimated
+            if limited
+            else max(estimated / actual, actual / estimated)
+        )
+        if factor >= PLAN_MISESTIMATE_FACTOR:
+            flags.append(f"rows misestimated {factor:,.0f}x")
+    return flags
+
+
+def analyze_query(query: str, connection=None) -> tuple[dict, PlanNode]:
+    """Run the query under EXPLAIN ANALYZE (rolled back) and build its tree."""
+    result = db.explain_analyze(query.strip().rstrip(";"), connection)
+    return result, build_tree(result["Plan"])
+
+
+def render(result: dict, root: PlanNode) -> Tree:
+    """Rich tree of the plan, hottest nodes (by self time) highlighted."""
+    nodes = list(root.walk())
+    total = root.total_ms or 1e-9
+    hot = sorted(nodes, key=lambda n: n.self_ms, reverse=True)[:PLAN_HOT_NODES]
+    hot_ids = {id(n) for n in hot if n.self_ms > 0}
+
+    def label(node: PlanNode) -> str:
+        style = "bold red" if id(node) in hot_ids else "bold"
+        text = f"[{style}]{escape(node.label)}[/{style}]"
+        if not node.loops:
+            return text + " [dim](never executed)[/dim]"
+        text += (
+            f"  self [bold]{node.self_ms:.2f}ms[/bold] ({node.self_ms / total:.0%})"
+            f" [dim]total {node.total_ms:.2f}ms[/dim]"
+        )
+        text += (
+            f"\n[dim]rows est {node.estimated_rows:,.0f} → actual "
+            f"{node.actual_rows:,.0f}"
+        )
+        if node.loops > 1:
+            text += f" × {node.loops:,} loops"
+        if node.shared_hit or node.shared_read:
+            text += f"  buffers hit {node.shared_hit:,} read {node.shared_read:,}"
+        text += "[/dim]"
+        for flag in node.flags:
+            text += f"\n[yellow]⚠ {escape(flag)}[/yellow]"
+        return text
+
+    tree = Tree(
+        f"[bold]Execution {result.get('Execution Time', 0):.2f}ms[/bold] "
+        f"[dim](planning {result.get('Planning Time', 0):.2f}ms)[/dim]"
+    )
+
+    def add(parent, node: PlanNode) -> None:
+        branch = parent.add(label(node))
+        for child in node.children:
+            add(branch, child)
+
+    add(tree, root)
+    return tree
+
+
+def show_plan(query: str) -> None:
+    """``\\plan <query>``: visualize EXPLAIN ANALYZE of a query."""
+    result, root = analyze_query(query)
+    console.print(render(result, root))
+    problems = sum(len(n.flags) for n in root.walk())
+    if problems:
+        console.print(f"[yellow]{problems} potential problem(s) flagged.[/yellow]")
+    console.print("[dim]The query ran inside a transaction that was rolled back.[/dim]")
+
+
+def run_plan_command(command: str) -> None:
+    parts = command.split(None, 1)
+    if len(parts) < 2:
+        raise ValueError("Usage: \\plan <query>")
+    show_plan(parts[1])
+
+
+@dataclass
+class QueryComparison:
+    """Repeated EXPLAIN ANALYZE runs of one query on the current and baseline DB."""
+
+    query: str
+    current_ms: list[float]
+    baseline_ms: list[float]
+    current_plan: PlanNode
+    baseline_plan: PlanNode
+
+    @property
+    def plan_changed(self) -> bool:
+        return self.current_plan.signature() != self.baseline_plan.signature()
+
+    @property
+    def delta(self) -> float:
+        """Relative change of the mean execution time, positive is slower."""
+        base = statistics.mean(self.baseline_ms) or 1e-9
+        return statistics.mean(self.current_ms) / base - 1
+
+    @property
+    def regressed(self) -> bool:
+        """Slower by more than the threshold and by more than the run to run noise."""
+        noise = 2 * max(_stdev(self.current_ms), _stdev(self.baseline_ms))
+        gap = statistics.mean(self.current_ms) - statistics.mean(self.baseline_ms)
+        return self.delta > PLAN_REGRESSION_THRESHOLD and gap > max(
+            noise, _TIMER_RESOLUTION_MS
+        )
+
+
+def _stdev(values: list[float]) -> float:
+    return statistics.stdev(values) if len(values) > 1 else 0.0
+
+
+def _median_plan(runs: list[tuple[float, PlanNode]]) -> PlanNode:
+    """Plan of the median run, so one noisy run doesn't drive the per-node times."""
+    return sorted(runs, key=lambda r: r[0])[len(runs) // 2][1]
+
+
+def compare_query(query: str, baseline_conn, runs: int) -> QueryComparison:
+    """Run `query` on both databases, alternating, after one warm-up each."""
+    current, baseline = [], []
+    for i in range(runs + 1):
+        for connection, samples in ((db.conn, current), (baseline_conn, baseline)):
+            result, root = analyze_query(query, connection)
+            if i:
+                samples.append((result["Execution Time"], root))
+    return QueryComparison(
+        query,
+        [ms for ms, _ in current],
+        [ms for ms, _ in baseline],
+        _median_plan(current),
+        _median_plan(baseline),
+    )
+
+
+def _delta(current: float, baseline: float) -> str:
+    if abs(current - baseline) < _TIMER_RESOLUTION_MS:
+        return "[dim]±0%[/dim]"
+    if not baseline:
+        return "[dim]new[/dim]" if current else "[dim]±0%[/dim]"
+    change = current / baseline - 1
+    if change > PLAN_REGRESSION_THRESHOLD:
+        return f"[red]+{change:.0%}[/red]"
+    if change < -PLAN_REGRESSION_THRESHOLD:
+        return f"[green]{change:.0%}[/green]"
+    return f"[dim]{change:+.0%}[/dim]"
+
+
+def render_diff(comparison: QueryComparison) -> Tree:
+    """Both plans merged into one tree, matched by position.
+
+    Nodes only in the current plan are marked +, nodes only in the baseline
+    plan -, and nodes that changed type or access path show what they were.
+    """
+
+    def label(cur: PlanNode | None, base: PlanNode | None) -> str:
+        if base is None:
+            return (
+                f"[green]+ {escape(cur.label)}[/green]  self {cur.self_ms:.2f}ms"
+                f" [dim]rows {cur.actual_rows:,.0f}[/dim]"
+            )
+        if cur is None:
+            return (
+                f"[red]- {escape(base.label)}[/red]  [dim]was self "
+                f"{base.self_ms:.2f}ms rows {base.actual_rows:,.0f}[/dim]"
+            )
+        if cur.label == base.label:
+            text = f"[bold]{escape(cur.label)}[/bold]"
+        else:
+            text = (
+                f"[bold yellow]{escape(cur.label)}[/bold yellow] "
+                f"[dim](was {escape(base.label)})[/dim]"
+            )
+        text += (
+            f"  self {cur.self_ms:.2f}ms vs {base.self_ms:.2f}ms "
+            f"{_delta(cur.self_ms, base.self_ms)}"
+            f"\n[dim]rows {cur.actual_rows:,.0f} vs {base.actual_rows:,.0f}"
+        )
+        if cur.loops > 1 or base.loops > 1:
+            text += f", loops {cur.loops:,} vs {base.loops:,}"
+        text += "[/dim]"
+        for flag in cur.flags:
+            if flag not in base.flags:
+                text += f"\n[yellow]⚠ {escape(flag)}[/yellow]"
+        return text
+
+    def add(parent, cur: PlanNode | None, base: PlanNode | None) -> None:
+        # A node added or removed above an otherwise unchanged subtree, e.g.
+        # a Sort that is no longer needed, shouldn't shift everything below
+        if cur and base and cur.label != base.label:
+            if len(cur.children) == 1 and cur.children[0].label == base.label:
+                add(parent.add(label(cur, None)), cur.children[0], base)
+                return
+            if len(base.children) == 1 and base.children[0].label == cur.label:
+                add(parent.add(label(None, base)), cur, base.children[0])
+                return
+        branch = parent.add(label(cur, base))
+        for c, b in zip_longest(
+            cur.children if cur else [], base.children if base else []
+        ):
+            add(branch, c, b)
+
+    c = comparison
+    tree = Tree(
+        f"[bold]{escape(one_line(c.query, 70))}[/bold]\n"
+        f"current {statistics.mean(c.current_ms):.2f}ms vs baseline "
+        f"{statistics.mean(c.baseline_ms):.2f}ms {_delta(statistics.mean(c.current_ms), statistics.mean(c.baseline_ms))}"
+    )
+    add(tree, c.current_plan, c.baseline_plan)
+    return tree
+
+
+def print_comparisons(comparisons: list[QueryComparison], baseline: str) -> None:
+    table = Table(
+        box=box.ROUNDED,
+        title=f"Current vs {baseline}",
+        header_style="bold #ECE7D1",
+    )
+    table.add_column("#", justify="right", no_wrap=True)
+    table.add_column("query", no_wrap=True)
+    table.add_column("baseline ms", justify="right", no_wrap=True)
+    table.add_column("current ms", justify="right", no_wrap=True)
+    table.add_column("delta", justify="right", no_wrap=True)
+    table.add_column("plan", no_wrap=True)
+    width = max(20, min(60, console.width - 70))
+    for i, c in enumerate(comparisons, start=1):
+        table.add_row(
+            str(i),
+            one_line(c.query, width),
+            f"{statistics.mean(c.baseline_ms):.2f} ± {_stdev(c.baseline_ms):.2f}",
+            f"{statistics.mean(c.current_ms):.2f} ± {_stdev(c.current_ms):.2f}",
+            _delta(statistics.mean(c.current_ms), statistics.mean(c.baseline_ms)),
+            "[yellow]changed[/yellow]" if c.plan_changed else "[dim]same[/dim]",
+            style="bold red" if c.regressed else None,
+        )
+    runs = len(comparisons[0].current_ms)
+    table.caption = f"mean ± stdev of {runs} runs after a warm-up"
+    console.print(table)
+
+    # A single query always gets its tree, a set only where something moved
+    for c in comparisons:
+        if len(comparisons) == 1 or c.plan_changed or c.regressed:
+            console.print(render_diff(c))
+
+    regressed = sum(1 for c in comparisons if c.regressed)
+    if regressed:
+        console.print(f"[red]{regressed} query(ies) regressed.[/red]")
+    else:
+        console.print("[green]No regressions beyond run to run noise.[/green]")
+
+
+def run_plan_diff_command(command: str) -> None:
+    """Handle ``\\plandiff [-n runs] <query | queries.sql>``.
+
+    Queries run on the current DB and its ``_baseline_for_`` sibling inside
+    rolled back transactions. A .sql file is a saved query set, one
+    statement per query.
+    """
+    parts = command.split(None, 1)
+    rest = parts[1].strip() if len(parts) > 1 else ""
+    runs = PLAN_DIFF_RUNS
+    if rest.startswith("-n"):
+        flag = rest.split(None, 2)
+        if len(flag) < 3 or not flag[1].isdigit() or int(flag[1]) < 1:
+            raise ValueError("-n expects a positive number of runs")
+        runs, rest = int(flag[1]), flag[2]
+    if not rest:
+        raise ValueError("Usage: \\plandiff [-n runs] <query | queries.sql>")
+
+    if rest.lower().endswith(".sql") and os.path.isfile(rest):
+        with open(rest, "r", encoding="utf-8") as f:
+            queries = split_statements(f.read())
+    else:
+        queries = [rest]
+    queries = [q for q in queries if not q.startswith("\\")]
+    if not queries:
+        raise ValueError(f"No queries in {rest}")
+
+    baseline = pick_baseline(db.DBNAME)
+    if not baseline:
+        raise ValueError(
+            f"'{db.DBNAME}' has no baseline, create one from the database menu"
+        )
+
+    comparisons = []
+    with closing(db.open_connection(baseline)) as baseline_conn:
+        with console.status("Comparing plans...") as status:
+            for i, query in enumerate(queries, start=1):
+                status.update(f"Comparing plans... query {i}/{len(queries)}")
+                comparisons.append(compare_query(query, baseline_conn, runs))
+    print_comparisons(comparisons, baseline)
@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from rich import box
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Tracer:
+    """Lightweight span tracer for CLI actions.
+
+    Spans are no-ops until ``enabled`` is set (``--profile`` or ``\\timing``).
+    Spans opened inside an ``action`` are printed as a breakdown when the
+    action ends; every span also feeds a session wide histogram that is
+    exported to JSON at exit.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.durations: dict[str, list[float]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _state(self):
+        state = self._local
+        if not hasattr(state, "depth"):
+            state.depth = 0
+            state.spans = None  # list of (depth, name, seconds) inside an action
+        return state
+
+    @contextmanager
+    def span(self, name: str):
+        if not self.enabled:
+            yield
+            return
+
+        state = self._state()
+        state.depth += 1
+        # Reserve the slot now so parents are listed before their children
+        slot = None
+        if state.spans is not None:
+            slot = len(state.spans)
+            state.spans.append((state.depth, name, 0.0))
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            state.depth -= 1
+            if slot is not None:
+                state.spans[slot] = (state.depth + 1, name, elapsed)
+            with self._lock:
+                self.durations.setdefault(name, []).append(elapsed)
+
+    @contextmanager
+    def action(self, label: str):
+        """Trace one user action and print its span breakdown afterwards."""
+        if not self.enabled:
+            yield
+            return
+
+        state = self._state()
+        state.spans = []
+        try:
+            with self.span(f"action.{label}"):
+                yield
+        finally:
+            spans, state.spans = state.spans, None
+            self._print_breakdown(spans)
+
+    def _print_breakdown(self, spans: list[tuple[int, str, float]]) -> None:
+        if not spans:
+            return
+        total = spans[0][2] or 1e-9
+        parts = []
+        for depth, name, seconds in spans[1:]:
+            indent = "  " * (depth - 2)
+            parts.append(
+                f"{indent}{name} [bold]{seconds * 1000:.1f}ms[/bold] "
+                f"[dim]({seconds / total:.0%})[/dim]"
+            )
+        console.print(
+            f"[dim]⏱  {spans[0][1]} took[/dim] [bold]{total * 1000:.1f}ms[/bold]"
+        )
+        for part in parts:
+            console.print(f"[dim]   ↳[/dim] {part}")
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """Per span count and p50/p95/p99/max in milliseconds."""
+        with self._lock:
+            snapshot = {name: sorted(values) for name, values in self.durations.items()}
+        return {
+            name: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50) * 1000, 3),
+                "p95_ms": round(percentile(values, 95) * 1000, 3),
+                "p99_ms": round(percentile(values, 99) * 1000, 3),
+                "max_ms": round(values[-1] * 1000, 3),
+                "total_ms": round(sum(values) * 1000, 3),
+            }
+            for name, values in sorted(snapshot.items())
+        }
+
+    def print_summary(self) -> None:
+        stats = self.summary()
+        if not stats:
+            return
+        table = Table(
+            box=box.ROUNDED,
+            title="Session timing",
+            header_style="bold #ECE7D1",
+        )
+        for col in ("span", "count", "p50 ms", "p95 ms", "p99 ms", "max ms"):
+            table.add_column(col, justify="left" if col == "span" else "right")
+        for name, s in stats.items():
+            table.add_row(
+                name,
+                str(s["count"]),
+                f"{s['p50_ms']:.1f}",
+                f"{s['p95_ms']:.1f}",
+                f"{s['p99_ms']:.1f}",
+                f"{s['max_ms']:.1f}",
+            )
+        console.print(table)
+
+    def export(self, path: str) -> str | None:
+        """Write the session histogram to `path` as JSON, if anything was traced."""
+        stats = self.summary()
+        if not stats:
+            return None
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"spans": stats}, f, indent=2)
+        return path
+
+
+# Global instance shared by every module, like session_costs
+tracer = Tracer()
@@ -0,0 +1,174 @@
+import json
+
+from psycopg2 import sql
+
+from . import db
+from .constants import COMPACT_VALUE_CHARS, EXPLAINABLE_PREFIXES
+
+# Types whose values are rewritten server-side; everything else (numbers,
+# dates, uuids, enums, ...) is small enough to send as is
+_JSON_TYPES = {"json", "jsonb"}
+_TEXT_LIKE_TYPES = {"xml", "tsvector", "hstore"}
+
+
+def table_columns(table: str) -> list[tuple[str, str, str]]:
+    """(name, type name, type category) of a table's or view's columns."""
+    cur = db.conn.cursor()
+    cur.execute(
+        """
+        SELECT a.attname, t.typname, t.typcategory
+        FROM pg_attribute a
+        JOIN pg_type t ON t.oid = a.atttypid
+        WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+        ORDER BY a.attnum
+        """,
+        (sql.Identifier(table).as_string(db.conn),),
+    )
+    return cur.fetchall()
+
+
+def is_compacted(typname: str, category: str) -> bool:
+    return (
+        category in ("S", "A")
+        or typname in _JSON_TYPES
+        or typname in _TEXT_LIKE_TYPES
+        or typname == "bytea"
+    )
+
+
+def compact_expression(column: sql.Composable, typname: str, category: str):
+    """Display sized version of `column`: at most COMPACT_VALUE_CHARS of it,
+    followed by "..." and its full size when it is longer.
+
+    JSON gets its type and key/element count in front, bytea a hex prefix,
+    so the shape of big documents is visible without transferring them.
+    """
+    n = sql.Literal(COMPACT_VALUE_CHARS)
+    if typname == "bytea":
+        half = sql.Literal(COMPACT_VALUE_CHARS // 2)
+        return sql.SQL(
+            "CASE WHEN octet_length({c}) > {half} "
+            "THEN '\\x' || encode(substring({c} FROM 1 FOR {half}), 'hex') "
+            "|| '... [' || pg_size_pretty(octet_length({c})::bigint) || ']' "
+            "ELSE '\\x' || encode({c}, 'hex') END"
+        ).format(c=column, half=half)
+
+    text = sql.SQL("{}::text").format(column)
+    if typname in _JSON_TYPES:
+        doc = sql.SQL("{}::jsonb").format(column)
+        summary = sql.SQL(
+            "CASE jsonb_typeof({doc}) "
+            "WHEN 'object' THEN (SELECT count(*) FROM jsonb_object_keys({doc})) || ' keys, ' "
+            "WHEN 'array' THEN jsonb_array_length({doc}) || ' items, ' "
+            "ELSE '' END"
+        ).format(doc=doc)
+    elif category == "A":
+        summary = sql.SQL("coalesce(cardinality({}), 0) || ' items, '").format(column)
+    else:
+        summary = sql.SQL("''")
+    return sql.SQL(
+        "CASE WHEN octet_length({t}) > {n} "
+        "THEN '[' || {summary} || pg_size_pretty(octet_length({t})::bigint) || '] ' "
+        "|| left({t}, {n}) || '...' ELSE {t} END"
+    ).format(t=text, n=n, summary=summary)
+
+
+def select_list(columns, source: str | None = None) -> sql.Composable:
+    """Projection of `columns` with wide ones compacted, keeping their names."""
+    items = []
+    for name, typname, category in columns:
+        ident = sql.Identifier(source, name) if source else sql.Identifier(name)
+        if is_compacted(typname, category):
+            expr = compact_expression(ident, typname, category)
+            items.append(sql.SQL("{} AS {}").format(expr, sql.Identifier(name)))
+        else:
+            items.append(ident)
+    return sql.SQL(", ").join(items)
+
+
+def compact_query(query: str):
+    """Rewrite a row returning query so wide columns are cut server-side.
+
+    Returns (rewritten query, original description), or None when nothing
+    needs compacting or the query can't be wrapped in a subquery (e.g. it
+    isn't a SELECT, or has duplicate column names).
+    """
+    query = query.strip().rstrip(";")
+    if query.split(None, 1)[0].lower().lstrip("(") not in EXPLAINABLE_PREFIXES:
+        return None
+    cur = db.conn.cursor()
+    try:
+        # Planned and started, but no rows are produced or sent
+        cur.execute(f"SELECT * FROM ({query}) _q LIMIT 0")
+    except Exception:
+        db.conn.rollback()
+        return None
+    description = cur.description
+    names = [col.name for col in description]
+    if len(set(names)) != len(names):
+        return None
+
+    cur.execute(
+        "SELECT oid, typname, typcategory FROM pg_type WHERE oid = ANY(%s)",
+        (list({col.type_code for col in description}),),
+    )
+    types = {oid: (typname, category) for oid, typname, category in cur.fetchall()}
+    columns = [(col.name, *types.get(col.type_code, ("", ""))) for col in description]
+    if not any(is_compacted(*c[1:]) for c in columns):
+        return None
+    wrapped = sql.SQL("SELECT {} FROM ({}) _q").format(
+        select_list(columns, "_q"), sql.SQL(query)
+    )
+    return wrapped, description
+
+
+def fetch_full_value(query: str, row: int, column: str):
+    """Full value of one cell of `query`'s result, by 1-based row position.
+
+    Positions are only stable when the query has an ORDER BY. The query runs
+    again in a read-only transaction, so nothing it calls can write.
+    """
+    cur = db.conn.cursor()
+    cur.execute("BEGIN READ ONLY")
+    try:
+        # No query parameters: the user's query may contain literal % signs
+        cur.execute(
+            sql.SQL("SELECT _q.{} FROM ({}) _q OFFSET {} LIMIT 1").format(
+                sql.Identifier(column),
+                sql.SQL(query.strip().rstrip(";")),
+                sql.Literal(row - 1),
+            )
+        )
+        found = cur.fetchone()
+    finally:
+        cur.execute("ROLLBACK")
+    if found is None:
+        raise ValueError(f"The result has no row {row}")
+    return found[0]
+
+
+def fetch_cell_by_ctid(table: str, tableoid: int, ctid: str, column: str):
+    """Full value of `column` in the row of `table` at `ctid`.
+
+    `tableoid` tells the partitions of a partitioned table apart, each has
+    its own ctids.
+    """
+    cur = db.conn.cursor()
+    cur.execute(
+        sql.SQL("SELECT {} FROM {} WHERE tableoid = %s AND ctid = %s::tid").format(
+            sql.Identifier(column), sql.Identifier(table)
+        ),
+        (tableoid, ctid),
+    )
+    found = cur.fetchone()
+    if found is None:
+        raise ValueError("The row changed since it was shown, reload the table")
+    return found[0]
+
+
+def format_full_value(value) -> str:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, indent=2, ensure_ascii=False, default=str)
+    if isinstance(value, memoryview):
+        return "\\x" + value.hex()
+    return str(value)
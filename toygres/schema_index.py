@@ -0,0 +1,260 @@
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+
+from rapidfuzz import fuzz, process
+
+from . import db
+from .utils import estimate_tokens
+
+# One row per column of every public table/view, with table and column comments
+_CATALOG_QUERY = """
+    SELECT c.relname,
+           a.attname,
+           format_type(a.atttypid, a.atttypmod),
+           coalesce(obj_description(c.oid, 'pg_class'), ''),
+           coalesce(col_description(c.oid, a.attnum), ''),
+           EXISTS (
+               SELECT 1 FROM pg_index i
+               WHERE i.indrelid = c.oid AND i.indisprimary AND a.attnum = ANY(i.indkey)
+           )
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+    ORDER BY c.relname, a.attnum
+"""
+
+# Cheap fingerprint of the catalog above, computed server side, so the index
+# is only rebuilt when a table, column, type or comment actually changed.
+_VERSION_QUERY = f"""
+    SELECT md5(coalesce(string_agg(cat::text, ',' ORDER BY cat::text), ''))
+    FROM ({_CATALOG_QUERY}) cat
+"""
+
+# BM25 parameters
+_K1 = 1.2
+_B = 0.75
+# Field weights: a hit on the table name says more than a hit on one column
+_TABLE_NAME_WEIGHT = 3
+_COMMENT_WEIGHT = 2
+# Weights of query terms that only matched the vocabulary loosely
+_PREFIX_MATCH_WEIGHT = 0.7
+_FUZZY_MATCH_WEIGHT = 0.5
+_FUZZY_MATCH_THRESHOLD = 80
+
+_STOP_WORDS = set(
+    "a all an and any are as at be by can do does for from get give have how i"
+    " in is it list many me much my of on or ran query select show tell than"
+    " that the their there this to was we what when where which who with you".split()
+)
+_WORDS = re.compile(r"[A-Z]+(?![a-z])|[A-Za-z][a-z]*|\d+")
+
+
+def _stem(word: str) -> str:
+    """Very small plural folding, so "invoices" and "invoice" meet."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("ses", "xes", "ches", "shes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> list[str]:
+    """Split identifiers and prose into stemmed lowercase terms.
+
+    Handles snake_case, camelCase and plain sentences alike, dropping
+    stop words and single characters.
+    """
+    terms = []
+    for word in _WORDS.findall(text):
+        word = word.lower()
+        if len(word) > 1 and word not in _STOP_WORDS:
+            terms.append(_stem(word))
+    return terms
+
+
+@dataclass
+class ColumnEntry:
+    name: str
+    data_type: str
+    comment: str
+    is_pk: bool
+    terms: set[str] = field(default_factory=set)
+
+    def render(self) -> str:
+        text = f"{self.name} ({self.data_type})"
+        if self.comment:
+            text += f" -- {self.comment}"
+        return text
+
+
+@dataclass
+class TableEntry:
+    name: str
+    comment: str
+    columns: list[ColumnEntry] = field(default_factory=list)
+    term_counts: Counter = field(default_factory=Counter)
+    length: int = 0
+
+
+class SchemaIndex:
+    """BM25 index over table names, column names and COMMENT ON text."""
+
+    def __init__(self, rows: list[tuple]):
+        tables: dict[str, TableEntry] = {}
+        for table, column, data_type, table_comment, column_comment, is_pk in rows:
+            entry = tables.get(table)
+            if entry is None:
+                entry = tables[table] = TableEntry(name=table, comment=table_comment)
+                for term in tokenize(table):
+                    entry.term_counts[term] += _TABLE_NAME_WEIGHT
+                for term in tokenize(table_comment):
+                    entry.term_counts[term] += _COMMENT_WEIGHT
+
+            col = ColumnEntry(column, data_type, column_comment, is_pk)
+            col.terms = set(tokenize(column)) | set(tokenize(column_comment))
+            entry.columns.append(col)
+            entry.term_counts.update(col.terms)
+
+        self.tables = tables
+        for entry in tables.values():
+            entry.length = sum(entry.term_counts.values())
+
+        doc_freq = Counter()
+        for entry in tables.values():
+            doc_freq.update(entry.term_counts.keys())
+        n = len(tables)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+        self.vocabulary = list(self.idf)
+        self.avg_length = sum(e.length for e in tables.values()) / n if n else 0
+
+    def _expand(self, term: str) -> dict[str, float]:
+        """Map a query term onto index terms: exact, then prefix, then trigram-ish fuzzy."""
+        if term in self.idf:
+            return {term: 1.0}
+
+        matches = {}
+        if len(term) >= 3:
+            for vocab_term in self.vocabulary:
+                if len(vocab_term) >= 3 and (
+                    vocab_term.startswith(term) or term.startswith(vocab_term)
+                ):
+                    matches[vocab_term] = _PREFIX_MATCH_WEIGHT
+        if matches:
+            return matches
+
+        if len(term) >= 4:
+            for vocab_term, _, _ in process.extract(
+                term,
+                self.vocabulary,
+                scorer=fuzz.ratio,
+                score_cutoff=_FUZZY_MATCH_THRESHOLD,
+                limit=3,
+            ):
+                matches[vocab_term] = _FUZZY_MATCH_WEIGHT
+        return matches
+
+    def query_terms(self, weighted_texts: list[tuple[str, float]]) -> dict[str, float]:
+        """Turn (text, weight) pairs into weighted index terms."""
+        weights: dict[str, float] = {}
+        for text, text_weight in weighted_texts:
+            for term in tokenize(text):
+                for index_term, match_weight in self._expand(term).items():
+                    w = text_weight * match_weight
+                    if w > weights.get(index_term, 0):
+                        weights[index_term] = w
+        return weights
+
+    def mentioned_tables(self, terms: dict[str, float]) -> list[str]:
+        """Return tables whose whole name appears among the query terms."""
+        return [
+            name
+            for name in self.tables
+            if (name_terms := set(tokenize(name))) and name_terms <= terms.keys()
+        ]
+
+    def rank(
+        self, terms: dict[str, float], top_k: int
+    ) -> list[tuple[TableEntry, float]]:
+        """Return the top_k tables by BM25 score for the weighted query terms."""
+        scored = []
+        for entry in self.tables.values():
+            score = 0.0
+            norm = _K1 * (1 - _B + _B * entry.length / (self.avg_length or 1))
+            for term, weight in terms.items():
+                tf = entry.term_counts.get(term)
+                if tf:
+                    score += weight * self.idf[term] * tf * (_K1 + 1) / (tf + norm)
+            if score > 0:
+                scored.append((entry, score))
+        scored.sort(key=lambda pair: pair[1], reverse=True)
+        return scored[:top_k]
+
+    def render(
+        self, terms: dict[str, float], top_k: int, token_budget: int
+    ) -> list[tuple[str, str]]:
+        """Render the most relevant tables and columns within `token_budget` tokens.
+
+        Each table lists its primary key and the columns matching the query
+        first, then as many remaining columns as the budget allows.
+        Returns (table name, prompt line) pairs, best match first.
+        """
+        lines = []
+        remaining = token_budget
+        for entry, _ in self.rank(terms, top_k):
+            header = f"  {entry.name}"
+            if entry.comment:
+                header += f" ({entry.comment})"
+            header += ": "
+
+            priority = [c for c in entry.columns if c.is_pk or c.terms & terms.keys()]
+            others = [c for c in entry.columns if c not in priority]
+
+            cost = estimate_tokens(header)
+            if cost > remaining:
+                break
+            shown = []
+            for col in priority + others:
+                col_cost = estimate_tokens(col.render()) + 1
+                if cost + col_cost > remaining:
+                    break
+                shown.append(col)
+                cost += col_cost
+            if not shown:
+                break
+
+            # Keep the original column order for readability
+            shown.sort(key=entry.columns.index)
+            line = header + ", ".join(c.render() for c in shown)
+            hidden = len(entry.columns) - len(shown)
+            if hidden:
+                line += f", ... (+{hidden} more columns)"
+            lines.append((entry.name, line))
+            remaining -= cost
+        return lines
+
+
+# Built once per catalog fingerprint and shared across sessions, keyed by database
+_index_cache: dict[str, tuple[str, SchemaIndex]] = {}
+
+
+def get_schema_index(execute=None) -> SchemaIndex:
+    """Return the schema index of the current database, rebuilding it only on change."""
+    execute = execute or db.executeSQL
+    _, rows, _ = execute(_VERSION_QUERY)
+    version = rows[0][0]
+    cached = _index_cache.get(db.DBNAME)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    _, catalog_rows, _ = execute(_CATALOG_QUERY)
+    index = SchemaIndex(catalog_rows or [])
+    _index_cache[db.DBNAME] = (version, index)
+    return index
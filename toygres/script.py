@@ -0,0 +1,348 @@
+import re
+import time
+from dataclasses import dataclass
+
+from rich import box
+from rich.console import Console
+from rich.progress import BarColumn, MofNCompleteColumn, Progress, TextColumn
+from rich.table import Table
+
+from . import db
+from .constants import (
+    EXPLAINABLE_PREFIXES,
+    SCRIPT_HIGHLIGHT_SLOWEST,
+    SCRIPT_TIMING_MAX_ROWS,
+)
+from . import execute_meta
+from .execute_meta import parse_meta_output
+from .execute_sql import _pretty_status, parse_sql_output
+from .models import OutputData, SqlResult
+from .utils import one_line
+
+console = Console()
+
+_DOLLAR_TAG = re.compile(r"\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$")
+_IDENT_CHAR = re.compile(r"[A-Za-z0-9_$]")
+# Characters that can start a quote, comment, meta-command or end a statement
+_SPECIAL = re.compile(r"[-/'\"$;\\]")
+
+
+def split_statements(text: str) -> list[str]:
+    """Split a SQL script into statements on top level semicolons.
+
+    Semicolons inside 'strings' (including E'' escapes), "identifiers",
+    $tag$ dollar quotes$tag$, -- line comments and /* nested */ comments
+    don't count. Lines starting with a backslash are psql meta-commands
+    and become statements of their own. Empty statements are dropped.
+    """
+    statements = []
+    start = 0
+    i = 0
+    n = len(text)
+
+    def flush(end: int) -> None:
+        stmt = text[start:end].strip()
+        if stmt and _has_code(stmt):
+            statements.append(stmt)
+
+    while i < n:
+        ch = text[i]
+        if ch == "\\" and text[start:i].strip() == "":
+            # psql meta-command, runs to the end of the line
+            end = text.find("\n", i)
+            end = n if end == -1 else end
+            flush(end)
+            start = i = end
+        elif ch == "-" and text.startswith("--", i):
+            end = text.find("\n", i)
+            i = n if end == -1 else end
+        elif ch == "/" and text.startswith("/*", i):
+            depth, i = 1, i + 2
+            while i < n and depth:
+                if text.startswith("/*", i):
+                    depth, i = depth + 1, i + 2
+                elif text.startswith("*/", i):
+                    depth, i = depth - 1, i + 2
+                else:
+                    i += 1
+        elif ch == "'":
+            # E'...' strings allow backslash escapes
+            escapes = (
+                i > 0
+                and text[i - 1] in "eE"
+                and (i == 1 or not _IDENT_CHAR.match(text[i - 2]))
+            )
+            i += 1
+            while i < n:
+                if escapes and text[i] == "\\":
+                    i += 2
+                elif text[i] == "'":
+                    if text.startswith("''", i):
+                        i += 2
+                    else:
+                        i += 1
+                        break
+                else:
+                    i += 1
+        elif ch == '"':
+            end = text.find('"', i + 1)
+            while end != -1 and text.startswith('""', end):
+                end = text.find('"', end + 2)
+            i = n if end == -1 else end + 1
+        elif ch == "$" and (i == 0 or not _IDENT_CHAR.match(text[i - 1])):
+            tag = _DOLLAR_TAG.match(text, i)
+            if tag:
+                end = text.find(tag.group(), tag.end())
+                i = n if end == -1 else end + len(tag.group())
+            else:
+                i += 1
+        elif ch == ";":
+            flush(i)
+            start = i = i + 1
+        else:
+            # Skip plain text in one go, the scanner only stops at specials
+            match = _SPECIAL.search(text, i + 1)
+            i = match.start() if match else n
+    flush(n)
+    return statements
+
+
+def _has_code(stmt: str) -> bool:
+    """False for chunks made only of comments."""
+    stripped = re.sub(r"--[^\n]*|/\*.*?\*/", "", stmt, flags=re.S)
+    return bool(stripped.strip())
+
+
+# Strings, quoted identifiers, dollar quotes and comments, which may contain
+# the word RETURNING without it being a clause
+_QUOTED = re.compile(
+    r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|(\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$).*?\1"
+    r"|--[^\n]*|/\*.*?\*/",
+    re.S,
+)
+_RETURNING = re.compile(r"\breturning\b", re.I)
+
+
+def _returns_rows(stmt: str) -> bool:
+    first = stmt.split(None, 1)[0].lower().lstrip("(")
+    if first in EXPLAINABLE_PREFIXES or first in ("show", "explain", "fetch"):
+        return True
+    # INSERT/UPDATE/DELETE/MERGE ... RETURNING
+    return bool(_RETURNING.search(_QUOTED.sub(" ", stmt)))
+
+
+@dataclass
+class StatementResult:
+    """One executed statement (or batch of them) of a script."""
+
+    first: int
+    last: int
+    sql: str
+    seconds: float
+    result: OutputData | SqlResult | None = None
+    error: str | None = None
+
+
+def _batches(statements: list[str], batch_size: int):
+    """Yield (first, last) index ranges; row returning statements run alone."""
+    i = 0
+    while i < len(statements):
+        j = i + 1
+        if batch_size > 1 and not _returns_rows(statements[i]):
+            while (
+                j < len(statements)
+                and j - i < batch_size
+                and not _returns_rows(statements[j])
+                and not statements[j].startswith("\\")
+            ):
+                j += 1
+        yield i, j - 1
+        i = j
+
+
+def run_script(
+    statements: list[str],
+    batch_size: int = 1,
+    stop_on_error: bool = True,
+    on_progress=None,
+) -> list[StatementResult]:
+    """Execute statements one by one (or `batch_size` at a time) with timing.
+
+    Batching sends consecutive statements that return no rows in a single
+    round trip; statements returning rows always run alone so each keeps
+    its own result set.
+    """
+    results = []
+    for first, last in _batches(statements, batch_size):
+        text = (
+            statements[first]
+            if first == last
+            else ";\n".join(statements[first : last + 1])
+        )
+        started = time.perf_counter()
+        try:
+            if text.startswith("\\"):
+                result = execute_meta.run(text)
+            else:
+                description, rows, status = db.executeSQL(text)
+                result = SqlResult.from_cursor(description, rows, status)
+            results.append(
+                StatementResult(
+                    first, last, text, time.perf_counter() - started, result
+                )
+            )
+        except Exception as e:
+            results.append(
+                StatementResult(
+                    first,
+                    last,
+                    text,
+                    time.perf_counter() - started,
+                    error=str(e).strip(),
+                )
+            )
+            if stop_on_error:
+                break
+        finally:
+            if on_progress:
+                on_progress(last + 1)
+    return results
+
+
+def print_timing(results: list[StatementResult], total_statements: int) -> None:
+    """Timing table with the slowest statements highlighted.
+
+    Long scripts only list the slowest SCRIPT_TIMING_MAX_ROWS entries, still
+    in execution order.
+    """
+    if not results:
+        return
+    total = sum(r.seconds for r in results) or 1e-9
+    by_time = sorted(results, key=lambda r: r.seconds, reverse=True)
+    slowest = {id(r) for r in by_time[:SCRIPT_HIGHLIGHT_SLOWEST]}
+    shown = {id(r) for r in by_time[:SCRIPT_TIMING_MAX_ROWS]}
+
+    table = Table(box=box.ROUNDED, header_style="bold #ECE7D1")
+    table.add_column("#", justify="right", no_wrap=True)
+    table.add_column("statement", no_wrap=True)
+    table.add_column("status", no_wrap=True)
+    table.add_column("time", justify="right", no_wrap=True)
+    table.add_column("share", justify="right", no_wrap=True)
+    # Leave room for the other columns on narrow terminals
+    width = max(20, min(60, console.width - 55))
+    for r in results:
+        if id(r) not in shown:
+            continue
+        if r.first == r.last:
+            number = str(r.first + 1)
+        else:
+            number = f"{r.first + 1}-{r.last + 1}"
+        if r.error:
+            status = f"[red]{one_line(r.error, 24)}[/red]"
+        elif r.first != r.last:
+            status = f"{r.last - r.first + 1} statements"
+        elif r.result.type == "meta":
+            status = "meta-command"
+        else:
+            status = _pretty_status(r.result.status) or ""
+        style = "bold red" if id(r) in slowest and len(results) > 1 else None
+        table.add_row(
+            number,
+            one_line(r.sql, width),
+            status,
+            f"{r.seconds * 1000:.1f}ms",
+            f"{r.seconds / total:.0%}",
+            style=style,
+        )
+
+    ran = results[-1].last + 1
+    failed = sum(1 for r in results if r.error)
+    caption = f"{ran}/{total_statements} statements in {total * 1000:.1f}ms"
+    if failed:
+        caption += f", [red]{failed} failed[/red]"
+    if len(results) > SCRIPT_TIMING_MAX_ROWS:
+        caption += f" (slowest {SCRIPT_TIMING_MAX_ROWS} shown)"
+    table.caption = caption
+    console.print(table)
+
+
+def _show_results(results: list[StatementResult]) -> None:
+    for r in results:
+        if r.result is None:
+            continue
+        if r.result.type == "meta":
+            parse_meta_output(r.result)
+        elif r.result.description:
+            console.print(f"[dim]{r.first + 1}: {one_line(r.sql, 60)}[/dim]")
+            parse_sql_output(r.result)
+
+
+def execute_script(text: str, batch_size: int = 1) -> None:
+    """Run a pasted multi-statement script, showing every result set.
+
+    The script runs in one transaction and is rolled back if a statement
+    fails, as when it was sent in a single query. Meta-commands go through
+    psql on a connection of their own and can't see uncommitted changes, so
+    a script containing any runs statement by statement instead.
+    """
+    statements = split_statements(text)
+    atomic = not any(s.startswith("\\") for s in statements)
+    if atomic:
+        db.executeSQL("BEGIN")
+    try:
+        results = run_script(statements, batch_size=batch_size)
+    except BaseException:
+        if atomic:
+            db.executeSQL("ROLLBACK")
+        raise
+    failed = next((r for r in results if r.error), None)
+    if atomic:
+        db.executeSQL("ROLLBACK" if failed else "COMMIT")
+    _show_results(results)
+    print_timing(results, len(statements))
+    if failed and atomic:
+        console.print(
+            f"[yellow]Statement {failed.first + 1} failed, "
+            "the whole script was rolled back.[/yellow]"
+        )
+    elif failed and failed.first:
+        console.print(
+            f"[yellow]Statement {failed.first + 1} failed; the {failed.first} "
+            "before it stay applied (scripts with meta-commands aren't run "
+            "in a transaction).[/yellow]"
+        )
+
+
+def include_file(path: str, batch_size: int = 1) -> None:
+    """``\\i file.sql``: run a script file with a progress bar."""
+    with open(path, "r", encoding="utf-8") as f:
+        statements = split_statements(f.read())
+    if not statements:
+        console.print(f"[yellow]No statements in {path}.[/yellow]")
+        return
+
+    with Progress(
+        TextColumn(path),
+        BarColumn(),
+        MofNCompleteColumn(),
+        TextColumn("statements"),
+        console=console,
+        transient=True,
+    ) as progress:
+        task = progress.add_task("", total=len(statements))
+        results = run_script(
+            statements,
+            batch_size=batch_size,
+            on_progress=lambda done: progress.update(task, completed=done),
+        )
+    _show_results(results)
+    print_timing(results, len(statements))
+
+
+def run_include_command(command: str) -> None:
+    """Handle ``\\i <file.sql> [batch size]``."""
+    parts = command.rstrip(";").split()
+    if len(parts) < 2:
+        raise ValueError("Usage: \\i <file.sql> [batch size]")
+    batch_size = int(parts[2]) if len(parts) > 2 else 1
+    include_file(parts[1], batch_size=batch_size)
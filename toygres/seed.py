@@ -0,0 +1,297 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from psycopg2 import sql
+from rich.console import Console
+from rich.progress import BarColumn, DownloadColumn, Progress, TextColumn
+
+from . import db
+from .constants import SEED_WORKERS
+
+console = Console()
+
+SEED_EXTENSIONS = (".csv", ".jsonl", ".ndjson")
+
+_FK_QUERY = """
+SELECT c.conrelid::regclass::text, c.confrelid::regclass::text
+FROM pg_constraint c
+JOIN pg_namespace n ON n.oid = c.connamespace
+WHERE c.contype = 'f' AND n.nspname = 'public'
+"""
+
+_TABLES_QUERY = """
+SELECT c.relname FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+"""
+
+# Non-unique indexes that don't back a constraint, and foreign keys; both
+# are dropped for the load and rebuilt afterwards. Primary keys, unique
+# constraints and unique indexes stay, so duplicate rows still fail loudly.
+_SECONDARY_INDEXES_QUERY = """
+SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid)
+FROM pg_index i
+JOIN pg_class t ON t.oid = i.indrelid
+JOIN pg_namespace n ON n.oid = t.relnamespace
+WHERE n.nspname = 'public' AND t.relname = ANY(%s)
+  AND NOT i.indisunique
+  AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+"""
+
+_FOREIGN_KEYS_QUERY = """
+SELECT c.conrelid::regclass::text, c.conname, pg_get_constraintdef(c.oid)
+FROM pg_constraint c
+JOIN pg_class t ON t.oid = c.conrelid
+JOIN pg_namespace n ON n.oid = t.relnamespace
+WHERE c.contype = 'f' AND n.nspname = 'public'
+  AND t.relname = ANY(%s)
+"""
+
+
+def _fetch(query, params=None):
+    with db.conn.cursor() as cur:
+        cur.execute(query, params)
+        return cur.fetchall()
+
+
+def collect_sources(path: str) -> dict[str, list[str]]:
+    """Map table name -> seed files.
+
+    A single file seeds the table named after it; a directory seeds one table
+    per file, so ``orders.csv`` and ``orders.2.jsonl`` both load into orders.
+    """
+    if os.path.isdir(path):
+        files = sorted(os.path.join(path, f) for f in os.listdir(path))
+    else:
+        files = [path]
+
+    sources: dict[str, list[str]] = {}
+    for file in files:
+        if not file.lower().endswith(SEED_EXTENSIONS):
+            continue
+        table = os.path.basename(file).split(".")[0]
+        sources.setdefault(table, []).append(file)
+    return sources
+
+
+def load_levels(tables) -> list[list[str]]:
+    """Group tables into FK dependency levels, parents first.
+
+    Tables in the same level don't reference each other and can be loaded
+    in parallel. Self references are ignored and tables caught in a cycle
+    end up together in the last level.
+    """
+    tables = set(tables)
+    parents = {t: set() for t in tables}
+    for child, parent in _fetch(_FK_QUERY):
+        if child in tables and parent in tables and child != parent:
+            parents[child].add(parent)
+
+    levels = []
+    remaining = dict(parents)
+    while remaining:
+        ready = sorted(
+            t for t, deps in remaining.items() if not deps & remaining.keys()
+        )
+        if not ready:
+            ready = sorted(remaining)
+        levels.append(ready)
+        for t in ready:
+            del remaining[t]
+    return levels
+
+
+@contextmanager
+def deferred_indexes(tables):
+    """Drop secondary indexes and foreign keys on `tables`, rebuild them on exit.
+
+    Rebuilding once after the load is much cheaper than maintaining every
+    index row by row, and dropping the foreign keys lets tables load in any
+    order. Everything is rebuilt even if the load fails, so the schema is
+    never left behind without its indexes.
+    """
+    tables = list(tables)
+    indexes = _fetch(_SECONDARY_INDEXES_QUERY, (tables,))
+    foreign_keys = _fetch(_FOREIGN_KEYS_QUERY, (tables,))
+    # Only what was actually dropped is restored, a drop can fail halfway
+    # (lock timeout, dependent objects)
+    dropped_indexes, dropped_keys = [], []
+
+    try:
+        for table, name, definition in foreign_keys:
+            db.executeSQL(
+                sql.SQL("ALTER TABLE {} DROP CONSTRAINT {}").format(
+                    sql.SQL(table), sql.Identifier(name)
+                )
+            )
+            dropped_keys.append((table, name, definition))
+        for index, definition in indexes:
+            db.executeSQL(sql.SQL("DROP INDEX {}").format(sql.SQL(index)))
+            dropped_indexes.append((index, definition))
+        yield
+    finally:
+        failed = []
+        with console.status(
+            f"Rebuilding {len(dropped_indexes)} indexes and "
+            f"{len(dropped_keys)} foreign keys..."
+        ):
+            for index, definition in dropped_indexes:
+                try:
+                    db.executeSQL(definition)
+                except Exception as e:
+                    failed.append(f"index {index}: {str(e).strip()}")
+            for table, name, definition in dropped_keys:
+                try:
+                    db.executeSQL(
+                        sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} {}").format(
+                            sql.SQL(table), sql.Identifier(name), sql.SQL(definition)
+                        )
+                    )
+                except Exception as e:
+                    failed.append(f"foreign key {table}.{name}: {str(e).strip()}")
+        for message in failed:
+            console.print(f"[red]Could not restore {message}[/red]")
+
+
+def analyze(tables) -> None:
+    """Refresh planner statistics after a bulk load."""
+    for table in tables:
+        db.executeSQL(sql.SQL("ANALYZE {}").format(sql.Identifier(table)))
+
+
+class _ProgressReader:
+    """File wrapper advancing a progress bar as COPY reads from it."""
+
+    def __init__(self, file, progress, task):
+        self.file = file
+        self.progress = progress
+        self.task = task
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.progress.advance(self.task, len(data))
+        return data
+
+    def readline(self, size=-1):
+        data = self.file.readline(size)
+        self.progress.advance(self.task, len(data))
+        return data
+
+
+def _copy_csv(cur, table: str, path: str, reader) -> int:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        header = next(csv.reader(f), None)
+    if not header:
+        return 0
+    columns = sql.SQL(", ").join(sql.Identifier(c.strip()) for c in header)
+    copy = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv, HEADER true)").format(
+        sql.Identifier(table), columns
+    )
+    cur.copy_expert(copy.as_string(cur), reader)
+    return cur.rowcount
+
+
+def _copy_jsonl(cur, table: str, path: str, reader) -> int:
+    # The columns are the keys of the first document, so omitted columns
+    # keep their defaults (serial ids, timestamps) instead of turning NULL
+    with open(path, "r", encoding="utf-8") as f:
+        first = f.readline().strip()
+    if not first:
+        return 0
+    keys = list(json.loads(first))
+    columns = sql.SQL(", ").join(sql.Identifier(k) for k in keys)
+    values = sql.SQL(", ").join(sql.Identifier("r", k) for k in keys)
+
+    # JSON escapes control characters, so with quote and delimiter bytes
+    # that never appear each line lands unchanged in the staging column
+    cur.execute("CREATE TEMP TABLE _toygres_seed (doc jsonb) ON COMMIT DROP")
+    cur.copy_expert(
+        "COPY _toygres_seed FROM STDIN WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')",
+        reader,
+    )
+    cur.execute(
+        sql.SQL(
+            "INSERT INTO {table} ({columns}) SELECT {values} "
+            "FROM _toygres_seed s, jsonb_populate_record(NULL::{table}, s.doc) r"
+        ).format(table=sql.Identifier(table), columns=columns, values=values)
+    )
+    rows = cur.rowcount
+    cur.execute("DROP TABLE _toygres_seed")
+    return rows
+
+
+def _load_table(table: str, files: list[str], progress, task) -> int:
+    """Load every file for `table` in one transaction on its own connection."""
+    conn = db.open_connection(db.DBNAME)
+    conn.autocommit = False
+    rows = 0
+    try:
+        with conn.cursor() as cur:
+            for path in files:
+                copy = _copy_csv if path.lower().endswith(".csv") else _copy_jsonl
+                with open(path, "r", encoding="utf-8", newline="") as f:
+                    rows += copy(cur, table, path, _ProgressReader(f, progress, task))
+        conn.commit()
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def seed(path: str, workers: int = SEED_WORKERS) -> str:
+    """Bulk load CSV/JSONL seed files into the current database with COPY."""
+    sources = collect_sources(path)
+    if not sources:
+        raise ValueError(
+            f"No seed files found at {path} (expected {', '.join(SEED_EXTENSIONS)})"
+        )
+
+    existing = {name for (name,) in _fetch(_TABLES_QUERY)}
+    missing = sorted(set(sources) - existing)
+    if missing:
+        raise ValueError(f"Seed files for unknown tables: {', '.join(missing)}")
+
+    levels = load_levels(sources)
+    started = time.monotonic()
+    loaded = {}
+    with deferred_indexes(sources):
+        with (
+            Progress(
+                TextColumn("{task.description}"),
+                BarColumn(),
+                DownloadColumn(),
+                console=console,
+            ) as progress,
+            ThreadPoolExecutor(max_workers=max(1, workers)) as pool,
+        ):
+            for level in levels:
+                futures = {}
+                for table in level:
+                    size = sum(os.path.getsize(f) for f in sources[table])
+                    task = progress.add_task(table, total=size)
+                    futures[table] = pool.submit(
+                        _load_table, table, sources[table], progress, task
+                    )
+                for table, future in futures.items():
+                    loaded[table] = future.result()
+
+    with console.status("Analyzing..."):
+        analyze(sources)
+
+    elapsed = time.monotonic() - started
+    summary = ", ".join(f"{t} ({n:,})" for t, n in loaded.items())
+    return f"Seeded {len(loaded)} tables in {elapsed:.1f}s: {summary}"
+
+
+def run_seed_command(command: str) -> str:
+    """Handle ``\\seed <file or directory>``."""
+    parts = command.split(None, 1)
+    if len(parts) < 2:
+        raise ValueError("Usage: \\seed <file.csv|file.jsonl|directory>")
+    return seed(parts[1].strip().rstrip(";"))
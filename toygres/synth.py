@@ -0,0 +1,528 @@
+import io
+import json
+import queue
+import random
+import string
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+from psycopg2 import sql
+from rich.console import Console
+from rich.progress import BarColumn, MofNCompleteColumn, Progress, TextColumn
+
+from . import db
+from .constants import (
+    SYNTH_BATCH_ROWS,
+    SYNTH_FK_SAMPLE_SIZE,
+    SYNTH_POOL_SIZE,
+    SYNTH_WORKERS,
+)
+from .seed import analyze, deferred_indexes, load_levels
+
+console = Console()
+
+# One row per insertable column of every public table. Columns the database
+# fills itself (defaults, identity, generated) are flagged so they can be
+# left out of the COPY column list.
+_COLUMNS_QUERY = """
+    SELECT c.relname,
+           a.attname,
+           t.typname,
+           CASE WHEN t.typtype = 'd' THEN bt.typname END,
+           a.atttypmod,
+           a.attnotnull,
+           a.atthasdef OR a.attidentity <> '' OR a.attgenerated <> '',
+           EXISTS (
+               SELECT 1 FROM pg_index u
+               WHERE u.indrelid = c.oid AND u.indisunique
+                 AND u.indnkeyatts = 1 AND u.indkey[0] = a.attnum
+           ),
+           (SELECT array_agg(e.enumlabel ORDER BY e.enumsortorder)
+              FROM pg_enum e WHERE e.enumtypid = t.oid),
+           (SELECT ARRAY[f.confrelid::regclass::text, pa.attname]
+              FROM pg_constraint f
+              JOIN pg_attribute pa
+                ON pa.attrelid = f.confrelid AND pa.attnum = f.confkey[1]
+             WHERE f.conrelid = c.oid AND f.contype = 'f'
+               AND f.conkey = ARRAY[a.attnum]
+             LIMIT 1)
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    JOIN pg_type t ON t.oid = a.atttypid
+    LEFT JOIN pg_type bt ON bt.oid = t.typbasetype
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+    ORDER BY c.relname, a.attnum
+"""
+
+# Keys spanning several columns: unique indexes (primary keys and unique
+# constraints included) and foreign keys. Expression columns come back NULL.
+_COMPOSITE_KEYS_QUERY = """
+    SELECT c.relname, 'unique', ic.relname,
+           array_agg(a.attname ORDER BY k.ord)
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indrelid
+    JOIN pg_class ic ON ic.oid = i.indexrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    CROSS JOIN unnest(i.indkey::int2[]) WITH ORDINALITY k(attnum, ord)
+    LEFT JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum
+    WHERE n.nspname = 'public' AND i.indisunique
+      AND (i.indnkeyatts > 1 OR i.indkey[0] = 0) AND k.ord <= i.indnkeyatts
+    GROUP BY c.relname, ic.relname
+    UNION ALL
+    SELECT c.relname, 'foreign', f.conname,
+           array_agg(a.attname ORDER BY k.ord)
+    FROM pg_constraint f
+    JOIN pg_class c ON c.oid = f.conrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    CROSS JOIN unnest(f.conkey) WITH ORDINALITY k(attnum, ord)
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum
+    WHERE n.nspname = 'public' AND f.contype = 'f' AND cardinality(f.conkey) > 1
+    GROUP BY c.relname, f.conname
+"""
+
+_NULL = "\\N"
+_WORDS = (
+    "alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima"
+    " mike november oscar papa quebec romeo sierra tango uniform victor whiskey"
+    " xray yankee zulu red green blue amber north south east west"
+).split()
+# Non-integer types _unique_generator can make unique values of
+_UNIQUE_TYPES = {"numeric", "uuid", "text", "varchar", "bpchar", "citext"}
+_INT_RANGES = {
+    "int2": (1, 32_767),
+    "int4": (1, 2_000_000_000),
+    "int8": (1, 9_000_000_000_000),
+}
+
+
+@dataclass
+class ColumnSpec:
+    name: str
+    type_name: str
+    typmod: int
+    not_null: bool
+    has_default: bool
+    unique: bool
+    enum_labels: list[str] | None
+    references: tuple[str, str] | None
+    # Part of a multi-column foreign key, left NULL so it isn't checked
+    null_only: bool = False
+
+
+@dataclass
+class TableSpec:
+    name: str
+    rows: int
+    columns: list[ColumnSpec] = field(default_factory=list)
+    # (kind, name, columns) of keys spanning several columns
+    composite_keys: list[tuple[str, str, list]] = field(default_factory=list)
+
+
+def _escape(value) -> str:
+    """Format a Python value for COPY text format."""
+    if value is None:
+        return _NULL
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def read_schema(default_rows: int, hints: dict) -> dict[str, TableSpec]:
+    """Table specs for every public table, row counts overridable by hints."""
+    tables: dict[str, TableSpec] = {}
+    with db.conn.cursor() as cur:
+        cur.execute(_COLUMNS_QUERY)
+        for (
+            table,
+            name,
+            type_name,
+            base_type,
+            typmod,
+            not_null,
+            has_default,
+            unique,
+            labels,
+            references,
+        ) in cur.fetchall():
+            rows = hints.get(table, {}).get("rows", default_rows)
+            spec = tables.setdefault(table, TableSpec(table, rows))
+            spec.columns.append(
+                ColumnSpec(
+                    name,
+                    base_type or type_name,
+                    typmod,
+                    not_null,
+                    has_default,
+                    unique,
+                    labels,
+                    tuple(references) if references else None,
+                )
+            )
+        cur.execute(_COMPOSITE_KEYS_QUERY)
+        for table, kind, name, columns in cur.fetchall():
+            if table in tables:
+                tables[table].composite_keys.append((kind, name, columns))
+    return {name: spec for name, spec in tables.items() if spec.rows > 0}
+
+
+def honor_composite_keys(spec: TableSpec, hints: dict) -> None:
+    """Make generated rows satisfy keys spanning several columns, or refuse.
+
+    A multi-column unique key holds as soon as one of its columns is unique,
+    so one generated column is made unique (a plain column if possible, else
+    a foreign key handing out each parent key once). A multi-column foreign
+    key can't be matched column by column; it is left unchecked by keeping
+    one of its nullable columns NULL.
+    """
+    table_hints = hints.get(spec.name, {}).get("columns", {})
+    by_name = {c.name: c for c in spec.columns}
+
+    def generated(column: ColumnSpec) -> bool:
+        hint = table_hints.get(column.name, {})
+        return not hint.get("skip") and (not column.has_default or bool(hint))
+
+    for kind, name, names in spec.composite_keys:
+        if any(n is None for n in names):
+            raise ValueError(
+                f"{spec.name} has a unique index on an expression ({name}), "
+                f'which synth can\'t honor; hint it with {{"rows": 0}}'
+            )
+        columns = [by_name[n] for n in names]
+        if kind == "unique":
+            if any(c.unique for c in columns):
+                continue
+            candidates = [
+                c
+                for c in columns
+                if generated(c) and "values" not in table_hints.get(c.name, {})
+            ]
+            plain = [
+                c
+                for c in candidates
+                if not c.references
+                and (c.type_name in _INT_RANGES or c.type_name in _UNIQUE_TYPES)
+            ]
+            linked = [c for c in candidates if c.references]
+            if plain or linked:
+                (plain or linked)[0].unique = True
+            elif all(generated(c) for c in columns):
+                raise ValueError(
+                    f"Can't generate unique values for {spec.name} "
+                    f"({', '.join(names)}); hint the table with {{\"rows\": 0}}"
+                )
+            # Otherwise a column the database fills (serial, identity) keeps it unique
+        else:
+            if all("values" in table_hints.get(c.name, {}) for c in columns):
+                continue
+            nullable = [c for c in columns if not c.not_null]
+            if not nullable:
+                raise ValueError(
+                    f"{spec.name} has a multi-column foreign key {name} "
+                    f"({', '.join(names)}) that synth can't match; hint its "
+                    f'columns with "values" or the table with {{"rows": 0}}'
+                )
+            nullable[0].null_only = True
+
+
+def _sample_keys(table: str, column: str) -> list[str]:
+    """Up to SYNTH_FK_SAMPLE_SIZE random keys of an already loaded parent."""
+    with db.conn.cursor() as cur:
+        cur.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", (table,))
+        (estimate,) = cur.fetchone()
+        column_id = sql.Identifier(column)
+        if estimate > SYNTH_FK_SAMPLE_SIZE * 10:
+            # Block sampling reads a fraction of a large parent instead of all of it
+            percent = min(100.0, SYNTH_FK_SAMPLE_SIZE * 200 / estimate)
+            query = sql.SQL(
+                "SELECT {c}::text FROM {t} TABLESAMPLE SYSTEM (%s) WHERE {c} IS NOT NULL"
+            ).format(c=column_id, t=sql.SQL(table))
+            cur.execute(query, (percent,))
+        else:
+            query = sql.SQL(
+                "SELECT {c}::text FROM {t} WHERE {c} IS NOT NULL ORDER BY random() LIMIT %s"
+            ).format(c=column_id, t=sql.SQL(table))
+            cur.execute(query, (SYNTH_FK_SAMPLE_SIZE,))
+        keys = [_escape(k) for (k,) in cur.fetchall()]
+    random.shuffle(keys)
+    return keys[:SYNTH_FK_SAMPLE_SIZE]
+
+
+def _next_int(table: str, column: str) -> int:
+    with db.conn.cursor() as cur:
+        cur.execute(
+            sql.SQL("SELECT coalesce(max({}), 0) + 1 FROM {}").format(
+                sql.Identifier(column), sql.Identifier(table)
+            )
+        )
+        return cur.fetchone()[0]
+
+
+def _pool(type_name: str, typmod: int, hint: dict) -> list[str] | None:
+    """Pre-formatted values to draw from, or None if the type is unknown."""
+    low, high = hint.get("min"), hint.get("max")
+    if type_name in _INT_RANGES:
+        lo, hi = _INT_RANGES[type_name]
+        lo, hi = low if low is not None else lo, high if high is not None else hi
+        return [str(random.randint(lo, hi)) for _ in range(SYNTH_POOL_SIZE)]
+    if type_name in ("numeric", "float4", "float8"):
+        lo, hi = low if low is not None else 0, high if high is not None else 10_000
+        if type_name == "numeric" and typmod > 4:
+            # numeric(p, s) must stay below 10^(p - s)
+            precision, scale = (typmod - 4) >> 16, (typmod - 4) & 0xFFFF
+            hi = min(hi, 10 ** (precision - scale) - 1)
+        return [f"{random.uniform(lo, hi):.2f}" for _ in range(SYNTH_POOL_SIZE)]
+    if type_name == "bool":
+        return ["t", "f"]
+    if type_name in ("text", "varchar", "bpchar", "name", "citext"):
+        limit = typmod - 4 if typmod > 4 else None
+        values = [
+            " ".join(random.choices(_WORDS, k=random.randint(1, 4)))
+            for _ in range(SYNTH_POOL_SIZE)
+        ]
+        return [v[:limit] for v in values] if limit else values
+    if type_name == "date":
+        start = date.fromisoformat(low) if low else date.today() - timedelta(days=730)
+        days = (date.fromisoformat(high) - start).days if high else 730
+        return [
+            (start + timedelta(days=random.randint(0, days))).isoformat()
+            for _ in range(SYNTH_POOL_SIZE)
+        ]
+    if type_name in ("timestamp", "timestamptz"):
+        start = (
+            datetime.fromisoformat(low) if low else datetime.now() - timedelta(days=730)
+        )
+        end = datetime.fromisoformat(high) if high else datetime.now()
+        span = max(1, int((end - start).total_seconds()))
+        return [
+            (start + timedelta(seconds=random.randint(0, span))).isoformat(sep=" ")
+            for _ in range(SYNTH_POOL_SIZE)
+        ]
+    if type_name == "time":
+        return [
+            f"{random.randint(0, 23):02}:{random.randint(0, 59):02}:{random.randint(0, 59):02}"
+            for _ in range(SYNTH_POOL_SIZE)
+        ]
+    if type_name == "interval":
+        return [f"{random.randint(0, 86_400)} seconds" for _ in range(SYNTH_POOL_SIZE)]
+    if type_name in ("json", "jsonb"):
+        return [
+            json.dumps({"id": i, "tag": random.choice(_WORDS)})
+            for i in range(SYNTH_POOL_SIZE)
+        ]
+    if type_name == "inet":
+        return [
+            f"10.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}"
+            for _ in range(SYNTH_POOL_SIZE)
+        ]
+    return None
+
+
+class ColumnGenerator:
+    """Produces one column of a batch at a time.
+
+    Values are drawn from a pre-formatted pool (or parent key sample) with
+    ``random.choices``, so a batch of rows costs one call per column rather
+    than one Python expression per cell. Unique columns are derived from the
+    row offset, which keeps them unique across workers without coordination.
+    """
+
+    def __init__(self, table: str, column: ColumnSpec, hint: dict, keys=None):
+        self.name = column.name
+        self.null_fraction = 0.0 if column.not_null else hint.get("null_fraction", 0)
+        self.pool = None
+        self.unique = None
+
+        if "values" in hint:
+            self.pool = [_escape(v) for v in hint["values"]]
+        elif keys is not None and column.unique:
+            # One to one: hand out each sampled parent key once
+            self.unique = lambda offset, n: keys[offset : offset + n]
+        elif keys is not None:
+            self.pool = keys
+        elif column.enum_labels:
+            self.pool = [_escape(v) for v in column.enum_labels]
+        elif column.unique or hint.get("unique"):
+            self.unique = self._unique_generator(table, column)
+        else:
+            self.pool = _pool(column.type_name, column.typmod, hint)
+
+        if self.pool is None and self.unique is None:
+            if column.not_null:
+                raise ValueError(
+                    f"Don't know how to generate {table}.{column.name} "
+                    f'({column.type_name}); add a hint with "values"'
+                )
+            self.pool = [_NULL]
+        if self.pool is not None and not self.pool:
+            raise ValueError(f"No values to generate {table}.{column.name} from")
+
+    def _unique_generator(self, table: str, column: ColumnSpec):
+        if column.type_name in _INT_RANGES or column.type_name == "numeric":
+            start = _next_int(table, column.name)
+            return lambda offset, n: [str(start + offset + i) for i in range(n)]
+        if column.type_name == "uuid":
+            return lambda offset, n: [
+                "%032x" % random.getrandbits(128) for _ in range(n)
+            ]
+        if column.type_name in ("text", "varchar", "bpchar", "citext"):
+            # A per run token keeps reruns from colliding with earlier rows
+            token = "".join(random.choices(string.ascii_lowercase, k=4))
+            prefix = f"{column.name}_{token}_"
+            if "email" in column.name:
+                return lambda offset, n: [
+                    f"user{token}{offset + i}@example.com" for i in range(n)
+                ]
+            return lambda offset, n: [f"{prefix}{offset + i}" for i in range(n)]
+        return None
+
+    def batch(self, offset: int, n: int) -> list[str]:
+        if self.unique is not None:
+            values = self.unique(offset, n)
+        else:
+            values = random.choices(self.pool, k=n)
+        if self.null_fraction:
+            for i in random.sample(range(n), int(n * self.null_fraction)):
+                values[i] = _NULL
+        return values
+
+
+def _copy_batch(
+    connection, table: str, generators: list[ColumnGenerator], offset: int, n: int
+) -> int:
+    columns = [g.batch(offset, n) for g in generators]
+    data = "\n".join(map("\t".join, zip(*columns))) + "\n"
+    copy = sql.SQL("COPY {} ({}) FROM STDIN").format(
+        sql.Identifier(table),
+        sql.SQL(", ").join(sql.Identifier(g.name) for g in generators),
+    )
+    with connection.cursor() as cur:
+        cur.copy_expert(copy.as_string(cur), io.StringIO(data))
+    return n
+
+
+def _generators(spec: TableSpec, hints: dict) -> list[ColumnGenerator]:
+    table_hints = hints.get(spec.name, {}).get("columns", {})
+    generators = []
+    for column in spec.columns:
+        hint = table_hints.get(column.name, {})
+        if hint.get("skip") or (column.has_default and not hint):
+            continue
+        if column.null_only and "values" not in hint:
+            hint = {"values": [None]}
+        keys = None
+        if column.references and "values" not in hint:
+            parent, parent_column = column.references
+            if parent == spec.name:
+                if column.not_null:
+                    raise ValueError(
+                        f"{spec.name}.{column.name} references its own table; "
+                        f'add a hint with "values"'
+                    )
+                # Self references stay NULL, there are no rows to point at yet
+                hint = {"values": [None]}
+            else:
+                keys = _sample_keys(parent, parent_column)
+                if not keys and column.not_null:
+                    raise ValueError(
+                        f"{spec.name}.{column.name} needs rows in {parent} first"
+                    )
+                keys = keys or [_NULL]
+                if column.unique:
+                    spec.rows = min(spec.rows, len(keys))
+        generators.append(ColumnGenerator(spec.name, column, hint, keys))
+    return generators
+
+
+def synthesize(rows: int, hints: dict | None = None, workers: int = SYNTH_WORKERS):
+    """Fill every public table of the current database with generated rows.
+
+    Tables load level by level in FK order so children can sample real
+    parent keys; batches of SYNTH_BATCH_ROWS are streamed through COPY by
+    `workers` connections in parallel.
+    """
+    hints = hints or {}
+    tables = read_schema(rows, hints)
+    if not tables:
+        raise ValueError("No tables to fill, create the schema first")
+    # Refuse up front rather than after other tables were filled
+    for spec in tables.values():
+        honor_composite_keys(spec, hints)
+
+    # Before deferred_indexes drops the foreign keys the order comes from
+    levels = load_levels(tables)
+    started = time.monotonic()
+    connections = [db.open_connection(db.DBNAME) for _ in range(max(1, workers))]
+    idle = queue.Queue()
+    for connection in connections:
+        idle.put(connection)
+    total = 0
+    try:
+        with (
+            deferred_indexes(tables),
+            Progress(
+                TextColumn("{task.description}"),
+                BarColumn(),
+                MofNCompleteColumn(),
+                console=console,
+            ) as progress,
+            ThreadPoolExecutor(max_workers=len(connections)) as pool,
+        ):
+
+            def run(table, generators, offset, n, task):
+                connection = idle.get()
+                try:
+                    _copy_batch(connection, table, generators, offset, n)
+                finally:
+                    idle.put(connection)
+                progress.advance(task, n)
+
+            for level in levels:
+                futures = []
+                for name in level:
+                    spec = tables[name]
+                    generators = _generators(spec, hints)
+                    task = progress.add_task(name, total=spec.rows)
+                    for offset in range(0, spec.rows, SYNTH_BATCH_ROWS):
+                        n = min(SYNTH_BATCH_ROWS, spec.rows - offset)
+                        futures.append(
+                            pool.submit(run, name, generators, offset, n, task)
+                        )
+                for future in futures:
+                    future.result()
+                # Children of this level sample keys using fresh statistics
+                analyze(level)
+                total += sum(tables[name].rows for name in level)
+    finally:
+        for connection in connections:
+            connection.close()
+
+    with console.status("Analyzing..."):
+        analyze(tables)
+    elapsed = time.monotonic() - started
+    return (
+        f"Generated {total:,} rows in {len(tables)} tables in {elapsed:.1f}s "
+        f"({total / max(elapsed, 1e-6):,.0f} rows/s)"
+    )
+
+
+def run_synth_command(command: str) -> str:
+    """Handle ``\\synth <rows per table> [hints.json]``."""
+    parts = command.rstrip(";").split()
+    if len(parts) < 2 or not parts[1].replace("_", "").isdigit():
+        raise ValueError("Usage: \\synth <rows per table> [hints.json]")
+    hints = {}
+    if len(parts) > 2:
+        with open(parts[2], "r", encoding="utf-8") as f:
+            hints = json.load(f)
+    return synthesize(int(parts[1]), hints)
@@ -1,4 +1,5 @@
 import os
+import re
 from datetime import datetime, timedelta
 
 SQL_PREFIXES = {
@@ -15,6 +16,37 @@ SQL_PREFIXES = {
 }
 
 
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local approximation of the number of model tokens in `text`.
+
+    Words are counted as one token per ~4 characters and every punctuation
+    character as its own token, which tracks BPE tokenizers closely enough
+    for budgeting without pulling in a tokenizer dependency.
+    """
+    total = 0
+    for piece in _TOKEN_PIECES.findall(text):
+        total += (len(piece) + 3) // 4
+    return total
+
+
+def one_line(text: str | None, width: int) -> str:
+    """`text` with its whitespace collapsed, cut to `width` characters."""
+    line = " ".join((text or "").split())
+    return line if len(line) <= width else line[: width - 1] + "…"
+
+
+def human_bytes(n: float) -> str:
+    """Byte count with a binary unit, e.g. ``1.5 MB``."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+
 def looks_like_sql(text: str) -> bool:
     stripped = text.strip().lower()
     if not stripped: